@@ -1,20 +1,22 @@
-import yaml
+import os
 from math import log10, ceil
 
-from .internal import argument_parser, csv_handling, plotting
+# Only lightweight modules are imported here. numpy, matplotlib and yaml take a large share of the startup time, so
+# they are imported by the subcommands which actually need them.
+from .internal import argument_parser, columnar_file, instrumentation
 from .internal import configuration as cfg
-from .internal.utils import Range
+from .internal.utils import Range, expand_input_files, read_headers
 
 
 #
 # Private helper functions for handling different subcommands
 #
 
-def __resolve_column_id(data_obj, col_id):
+def __resolve_column_id(headers, col_id):
     # First interpret col_id as header name
     try:
-        idx = data_obj.headers.index(col_id)
-        return data_obj.headers[idx]
+        idx = headers.index(col_id)
+        return headers[idx]
     except ValueError:
         pass
 
@@ -24,66 +26,211 @@ def __resolve_column_id(data_obj, col_id):
     except ValueError:
         return None
 
-    if idx >= len(data_obj.headers):
+    if idx >= len(headers):
         print(f'Given column index {idx} is out of range!')
         return None
 
-    return data_obj.headers[idx]
+    return headers[idx]
 
 
-def __handle_plot_args(args):
+def __override_config(plot_cfg, args):
+    # Update the values of a config loaded from a YAML file with the explicitly passed command line arguments
+    if 'input_file' in args and args.input_file is not None:
+        if len(args.input_file) == 0:
+            plot_cfg.input_file = None
+        else:
+            plot_cfg.input_file = args.input_file
+    if 'output_file' in args and args.output_file is not None:
+        if len(args.output_file) == 0:
+            plot_cfg.output_file = None
+        else:
+            plot_cfg.output_file = args.output_file
+    if 'region' in args and args.region is not None:
+        plot_cfg.range.start = args.region[0]
+        plot_cfg.range.end = args.region[1]
+    if 'divider' in args and args.divider is not None:
+        plot_cfg.range.divider = args.divider
+    if 'use_cache' in args and args.use_cache is not None:
+        plot_cfg.use_cache = args.use_cache
+    if 'use_index' in args and args.use_index is not None:
+        plot_cfg.use_index = args.use_index
+    if 'jobs' in args and args.jobs is not None:
+        plot_cfg.jobs = args.jobs
+    if 'downsample' in args and args.downsample is not None:
+        plot_cfg.downsample = args.downsample
+    if 'follow' in args and args.follow is not None:
+        plot_cfg.follow = args.follow
+    if 'refresh_interval' in args and args.refresh_interval is not None:
+        plot_cfg.refresh_interval = args.refresh_interval
+    if 'window' in args and args.window is not None:
+        plot_cfg.window = args.window
+    if 'streaming' in args and args.streaming is not None:
+        plot_cfg.streaming = args.streaming
+    if 'progressive' in args and args.progressive is not None:
+        plot_cfg.progressive = args.progressive
+    if 'input_mode' in args and args.input_mode is not None:
+        plot_cfg.input_mode = args.input_mode
+    if 'x_column' in args and args.x_column is not None:
+        plot_cfg.x_column = args.x_column
+    if 'x_range' in args and args.x_range is not None:
+        plot_cfg.x_range.start, plot_cfg.x_range.end = args.x_range
+    if 'render' in args and args.render is not None:
+        for subplot_cfg in plot_cfg.subplots:
+            subplot_cfg.render = args.render
+
+
+def __plot_input_files(plot_cfg, input_files):
+    # Plot the concatenated or overlaid rows of several input files
+    from .internal import csv_handling, multi_file, plotting
+
+    if plot_cfg.follow or plot_cfg.streaming:
+        raise ValueError('Several input files can neither be followed nor streamed!')
+    if plot_cfg.progressive:
+        print('Several input files are not loaded progressively!')
+
+    columns = csv_handling.get_needed_columns(plot_cfg)
+    multi_file.check_headers(input_files, columns, plot_cfg.input_mode)
+    if plot_cfg.input_mode == 'overlay':
+        data_obj = multi_file.load_overlaid(plot_cfg, input_files, columns)
+    else:
+        if plot_cfg.x_range.start is not None or plot_cfg.x_range.end is not None:
+            raise ValueError('A range of X values is not supported for concatenated input files!')
+        data_obj, plot_cfg.range = multi_file.load_concatenated(plot_cfg, input_files, columns)
+    if data_obj.size == 0:
+        return
+
+    plotting.plot_csv_data(data_obj, plot_cfg)
+
+
+def __handle_batch_args(args):
+    from .internal import batch
+    import yaml
+
+    if args.output_file is not None or len(args.columns) > 0:
+        raise ValueError('Output files and columns are given by the configs in batch mode!')
+
+    plot_cfgs = []
+    for filename in batch.expand_config_files(args.batch_configs):
+        try:
+            with open(filename, 'r') as f:
+                plot_cfg = cfg.PlotConfig.from_obj(yaml.safe_load(f))
+        except (OSError, yaml.YAMLError) as ex:
+            print(f'Failed to load config file "{filename}": {ex}')
+            continue
+        __override_config(plot_cfg, args)
+
+        if plot_cfg.input_file is not None:
+            input_files = expand_input_files(plot_cfg.input_file)
+            if len(input_files) > 1:
+                print(f'Skip config file "{filename}", since several input files are not supported in batch mode!')
+                continue
+            plot_cfg.input_file = input_files[0]
+        if plot_cfg.input_file is None or plot_cfg.output_file is None:
+            print(f'Skip config file "{filename}", since it does not specify an input and output file!')
+            continue
+        plot_cfgs.append(plot_cfg)
+
+    failed = batch.render(plot_cfgs, args.workers)
+    print(f'Rendered {len(plot_cfgs) - failed} of {len(plot_cfgs)} figures')
+
+
+def __plot_on_server(plot_cfg, input_files, socket_path):
+    # Let the plot server render the figure and store the received image. Returns False if the figure has to be
+    # plotted locally instead.
+    from .internal import plot_client
+
+    if plot_cfg.output_file is None or len(input_files) > 1 or plot_cfg.streaming:
+        print('Only figures of a single input file stored to an output file are rendered by the plot server!')
+        return False
+
+    socket_path = socket_path or plot_client.get_default_socket()
+    # The server resolves relative paths against its own working directory
+    plot_cfg.input_file = os.path.abspath(plot_cfg.input_file)
+    try:
+        response = plot_client.request(socket_path, 'plot', config=plot_cfg.to_obj())
+    except OSError as ex:
+        print(f'No plot server reachable on {socket_path} ({ex}), plot locally')
+        return False
+
+    image = plot_client.handle_response(response)
+    if image is not None:
+        with open(plot_cfg.output_file, 'wb') as f:
+            f.write(image)
+    return True
+
+
+def __statistics_on_server(args, rng):
+    # Let the plot server compute the statistics. Returns the formatted statistics or None if no server is reachable.
+    from .internal import plot_client
+
+    socket_path = args.socket or plot_client.get_default_socket()
+    try:
+        response = plot_client.request(socket_path, 'stats', input_file=os.path.abspath(args.input_file),
+                                       columns=args.columns if len(args.columns) > 0 else None,
+                                       rng=[rng.start, rng.end, rng.divider],
+                                       percentiles=args.percentiles)
+    except OSError as ex:
+        print(f'No plot server reachable on {socket_path} ({ex}), compute statistics locally')
+        return None
+    return plot_client.handle_response(response)
+
+
+def __create_plot_config(args):
+    # Construct the config of a single plot from the command line arguments. Returns the config and its input files
+    # or None if the config file cannot be loaded.
     if 'yaml_config' in args and args.yaml_config is not None:
+        import yaml
+
         # Construct config from YAML file and update values with command line arguments
         try:
-            with open(args.yaml_config, 'r') as f:
+            with instrumentation.stage('load_config'), open(args.yaml_config, 'r') as f:
                 yaml_config = yaml.safe_load(f)
         except yaml.YAMLError as ex:
             print(f'Failed to load config file "{args.yaml_config}": {ex}')
-            return
+            return None
 
         plot_cfg = cfg.PlotConfig.from_obj(yaml_config)
-
-        if 'input_file' in args and args.input_file is not None:
-            if len(args.input_file) == 0:
-                plot_cfg.input_file = None
-            else:
-                plot_cfg.input_file = args.input_file
-        if 'output_file' in args and args.output_file is not None:
-            if len(args.output_file) == 0:
-                plot_cfg.output_file = None
-            else:
-                plot_cfg.output_file = args.output_file
-        if 'region' in args and args.region is not None:
-            plot_cfg.range.start = args.region[0]
-            plot_cfg.range.end = args.region[1] + \
-                1 if args.region[1] is not None else None
-        if 'divider' in args and args.divider is not None:
-            plot_cfg.range.divider = args.divider
+        __override_config(plot_cfg, args)
 
     else:
         # Construct config from command line arguments
         plot_cfg = cfg.PlotConfig.from_obj({
             'input_file': args.input_file,
             'output_file': args.output_file,
-            'range_start': args.region[0] if args.region is not None else None,
-            'range_end': args.region[1] if args.region is not None else None,
+            'xlim': list(args.region) if args.region is not None else None,
             'divider': args.divider,
+            'cache': args.use_cache,
+            'index': args.use_index,
+            'jobs': args.jobs,
+            'downsample': args.downsample,
+            'follow': args.follow,
+            'refresh_interval': args.refresh_interval,
+            'window': args.window,
+            'streaming': args.streaming,
+            'progressive': args.progressive,
+            'input_mode': args.input_mode,
+            'x_column': args.x_column,
+            'x_range': list(args.x_range) if args.x_range is not None else None,
         })
 
     # Validity checks
     if plot_cfg.input_file is None or len(plot_cfg.input_file) == 0:
         raise ValueError(f'No input file is specified!')
+    if plot_cfg.x_column is None and (plot_cfg.x_range.start is not None or plot_cfg.x_range.end is not None):
+        raise ValueError('A range of X values requires an X column!')
 
-    # Load data into RAM
-    data_obj = csv_handling.CsvData.from_file(plot_cfg)
-    if data_obj.size == 0:
-        return
+    # Glob patterns and lists may select several input files, column identifiers refer to the first one
+    input_files = expand_input_files(plot_cfg.input_file)
+    plot_cfg.input_file = input_files[0]
 
     # Resolve column identifiers given as command line arguments and add the constructed subplot
     if len(args.columns) > 0:
+        headers = read_headers(plot_cfg.input_file)
         subplot_cfg = cfg.SubplotConfig()
+        if args.render is not None:
+            subplot_cfg.render = args.render
         for col_id in args.columns:
-            col_name = __resolve_column_id(data_obj, col_id)
+            col_name = __resolve_column_id(headers, col_id)
             if col_name is None:
                 print(f'Unable to resolve column "{col_id}"! '
                       'Make sure you either pass a column name or an index!')
@@ -91,6 +238,69 @@ def __handle_plot_args(args):
 
             subplot_cfg.add_column(cfg.ColumnConfig(col_name))
         plot_cfg.add_subplot(subplot_cfg)
+    return plot_cfg, input_files
+
+
+def __handle_plot_args(args):
+    if 'batch_configs' in args and args.batch_configs is not None:
+        __handle_batch_args(args)
+        return
+
+    created = __create_plot_config(args)
+    if created is None:
+        return
+    plot_cfg, input_files = created
+
+    # Neither the data nor matplotlib are loaded by this process if the plot server renders the figure
+    if args.server and __plot_on_server(plot_cfg, input_files, args.socket):
+        return
+
+    from .internal import csv_handling, plotting, row_index, streaming
+
+    if len(input_files) > 1:
+        __plot_input_files(plot_cfg, input_files)
+        return
+
+    # Negative bounds of the region count from the end of the file
+    plot_cfg.range = row_index.resolve_range(plot_cfg.input_file, plot_cfg.range)
+    if plot_cfg.x_column is not None:
+        # Locate the rows of the range of X values, so only these rows are loaded
+        from .internal import value_index
+        with instrumentation.stage('find_x_range'):
+            plot_cfg.range = value_index.select_rows(plot_cfg)
+
+    if plot_cfg.follow and plot_cfg.output_file is None:
+        # Read all rows written so far and keep track of the file afterwards
+        print(f'Follow file: {plot_cfg.input_file}')
+        follower = csv_handling.CsvFollower(plot_cfg, csv_handling.get_needed_columns(plot_cfg), plot_cfg.window)
+        follower.poll()
+        plotting.plot_csv_data(follower.data_obj, plot_cfg, follower)
+        return
+
+    if plot_cfg.streaming and columnar_file.is_columnar_file(plot_cfg.input_file):
+        print('Columnar files are memory mapped instead of streamed!')
+    elif plot_cfg.streaming:
+        # Aggregate the samples per pixel column without keeping them in RAM
+        data_obj = streaming.BinnedData.from_file(plot_cfg, csv_handling.get_needed_columns(plot_cfg),
+                                                  plotting.get_nr_of_bins())
+        plotting.plot_csv_data(data_obj, plot_cfg)
+        return
+
+    if plot_cfg.progressive and plot_cfg.output_file is None:
+        # Open the plot window with the first loaded rows and refine it while the rest of the file is loaded
+        loader = csv_handling.ProgressiveLoader(plot_cfg, csv_handling.get_needed_columns(plot_cfg))
+        loader.start()
+        if not loader.finished:
+            plotting.plot_csv_data(loader.data_obj, plot_cfg, loader=loader)
+            return
+        if loader.error is not None:
+            raise loader.error
+        data_obj = loader.result
+    else:
+        # Load only the columns which are actually plotted into RAM
+        data_obj = csv_handling.CsvData.from_file(plot_cfg, csv_handling.get_needed_columns(plot_cfg))
+    if data_obj.size == 0:
+        return
 
     # Plot data
     plotting.plot_csv_data(data_obj, plot_cfg)
@@ -98,21 +308,122 @@ def __handle_plot_args(args):
 
 def __handle_util_args(args):
     if args.list_headers:
-        headers = csv_handling.read_headers(args.input_file)
+        headers = read_headers(args.input_file)
         print(f'Column headers found: {len(headers)}')
         idx_width = ceil(log10(len(headers)))
         for i, header in enumerate(headers):
             print(f'  {i:{idx_width}} : {header}')
 
+    if args.cache_info or args.purge_cache:
+        from .internal import column_cache
+    if args.build_index:
+        from .internal import decompression, row_index
+
+    if args.cache_info:
+        cache_dir = column_cache.get_cache_dir(args.input_file)
+        entries = column_cache.list_entries(cache_dir)
+        total_size = sum(e['entry_size'] for e in entries)
+        print(f'Cache directory {cache_dir} contains {len(entries)} entries '
+              f'({total_size / 1024**2:.1f} MiB of {column_cache.MAX_CACHE_SIZE / 1024**2:.1f} MiB)')
+        for e in entries:
+            print(f'  {e["key"]["path"]}: {len(e["columns"])} columns, {e["entry_size"] / 1024**2:.1f} MiB')
+
+    if args.purge_cache:
+        column_cache.purge(column_cache.get_cache_dir(args.input_file), args.input_file)
+        print(f'Removed cached columns of {args.input_file}')
+
+    if args.stats:
+        rng = Range(*args.region, args.divider) if args.region is not None else Range(divider=args.divider)
+        report = __statistics_on_server(args, rng) if args.server else None
+        if report is None:
+            from .internal import column_statistics
+            from .internal import row_index
+            rng = row_index.resolve_range(args.input_file, rng)
+            stats = column_statistics.compute_statistics(args.input_file, rng, args.columns if len(args.columns) > 0
+                                                         else None)
+            report = column_statistics.format_report(rng, stats,
+                                                         args.percentiles or column_statistics.DEFAULT_PERCENTILES)
+        print(report)
+
+    if args.convert_file is not None:
+        from .internal import csv_handling
+        convert_cfg = cfg.PlotConfig.from_obj({'input_file': args.input_file, 'jobs': args.jobs})
+        headers, rows, columns, invalid = csv_handling.CsvData.read_full_columns(
+            convert_cfg, args.columns if len(args.columns) > 0 else None)
+        columnar_file.write(args.convert_file, headers, rows, columns, invalid)
+        print(f'Stored {len(headers)} columns of {rows} rows in {args.convert_file}')
+
+    if args.transform_file is not None:
+        from .internal import transform
+        # Columns are resolved against the headers of the transformed file, which may have a different delimiter
+        headers = transform.read_headers(args.input_file, args.skip_lines, args.delimiter)
+        column_indices = None
+        if len(args.columns) > 0:
+            col_names = [__resolve_column_id(headers, col_id) for col_id in args.columns]
+            if None in col_names:
+                raise ValueError(f'Unable to resolve column "{args.columns[col_names.index(None)]}"! '
+                                 'Make sure you either pass a column name or an index!')
+            column_indices = [headers.index(col_name) for col_name in col_names]
+        rng = Range(*args.region, args.divider) if args.region is not None else Range(divider=args.divider)
+        headers, rows = transform.transform(args.input_file, args.transform_file, column_indices, rng, args.skip_lines,
+                                            args.drop_lines, args.delimiter, args.output_delimiter)
+        print(f'Stored {len(headers)} columns of {rows} rows in {args.transform_file}')
+
+    if args.build_index and decompression.is_compressed(args.input_file):
+        print('A row index is not supported for compressed files, since they cannot be read from arbitrary offsets!')
+    elif args.build_index and columnar_file.is_columnar_file(args.input_file):
+        print('A row index is not needed for columnar files, since their rows are accessed directly!')
+    elif args.build_index:
+        index = row_index.RowIndex.build(args.input_file)
+        index.save(args.input_file)
+        print(f'Stored index of {index.rows} rows in {row_index.get_index_file(args.input_file)}')
+
+
+def __handle_server_args(args):
+    from .internal import plot_client
+
+    socket_path = args.socket or plot_client.get_default_socket()
+    if args.info or args.stop:
+        try:
+            response = plot_client.request(socket_path, 'stop' if args.stop else 'info')
+        except OSError as ex:
+            print(f'No plot server reachable on {socket_path} ({ex})')
+            return
+        print(plot_client.handle_response(response))
+        return
+
+    from .internal import plot_server
+    plot_server.PlotServer(socket_path, args.memory * 1024**2).serve()
+
+
+def __run_plot_instrumented(args):
+    # Run the plot command with optional profiling and report the recorded stage statistics afterwards
+    if args.profile is not None:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.runcall(__handle_plot_args, args)
+        profiler.dump_stats(args.profile)
+        print(f'Stored profile in {args.profile} (inspect it e.g. with "python -m pstats {args.profile}")')
+    else:
+        __handle_plot_args(args)
+
+    stats = instrumentation.get_current()
+    if args.stats:
+        print(stats.summary())
+    if args.stats_json is not None:
+        stats.to_json(args.stats_json)
+
 
 #
 # Public function which serve as application entrypoints
 #
 
 def plot():
-    parser = argument_parser.create_plot_parser()
-    args = parser.parse_args()
-    __handle_plot_args(args)
+    instrumentation.reset()
+    with instrumentation.stage('parse_arguments'):
+        parser = argument_parser.create_plot_parser()
+        args = parser.parse_args()
+    __run_plot_instrumented(args)
 
 
 def util():
@@ -121,14 +432,24 @@ def util():
     __handle_util_args(args)
 
 
-def combined():
-    parser = argument_parser.create_combined_parser()
+def server():
+    parser = argument_parser.create_server_parser()
     args = parser.parse_args()
+    __handle_server_args(args)
+
+
+def combined():
+    instrumentation.reset()
+    with instrumentation.stage('parse_arguments'):
+        parser = argument_parser.create_combined_parser()
+        args = parser.parse_args()
 
     chosen_command = args.chosen_command
     del args.chosen_command
 
     if chosen_command == 'plot':
-        __handle_plot_args(args)
+        __run_plot_instrumented(args)
     elif chosen_command == 'util':
         __handle_util_args(args)
+    elif chosen_command == 'server':
+        __handle_server_args(args)
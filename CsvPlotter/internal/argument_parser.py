@@ -1,12 +1,13 @@
 import argparse
+import codecs
 
 
 #
 # Argument type checkers
 #
 
-def __divide_check(v):
-    # Only positive integers are allowed as a divider.
+def __positive_int_check(v):
+    # Only positive integers are allowed e.g. as a divider or number of jobs.
 
     error = True
     try:
@@ -20,8 +21,8 @@ def __divide_check(v):
 
 def __region_check(v):
     # The region of samples to be plotted should be given in the form START:END.
-    # Negative values for either of START or END represent the first resp. the last sample (i.e. a value of None for END
-    # sets END to the index of the last sample).
+    # Negative values for either of START or END count from the end of the file like Python slices, e.g. '-1000:'
+    # selects the last 1000 samples.
     # Omitting either of the values will set its value to default (0 for START and None for END).
 
     if v is None:
@@ -36,11 +37,6 @@ def __region_check(v):
         start = int(region[0]) if len(region[0]) > 0 else 0
         end = int(region[1]) if len(region[1]) > 0 else None
 
-        if start < 0:
-            start = 0
-        if end < 0:
-            end = None
-
         error = False
     finally:
         if error:
@@ -49,12 +45,48 @@ def __region_check(v):
     return (start, end)
 
 
+def __value_range_check(v):
+    # A range of X values should be given in the form START:END, where either value may be omitted.
+
+    error = True
+    try:
+        region = str(v).split(':')
+        if len(region) != 2:
+            raise argparse.ArgumentError()
+        start = float(region[0]) if len(region[0]) > 0 else None
+        end = float(region[1]) if len(region[1]) > 0 else None
+
+        error = False
+    finally:
+        if error:
+            raise argparse.ArgumentTypeError(
+                'Range of values of the form \'[START]:[END]\' expected')
+    return (start, end)
+
+
+def __delimiter_check(v):
+    # Delimiters are single characters. Escape sequences like '\t' are accepted, since tabs are hard to pass.
+
+    error = True
+    try:
+        v = codecs.decode(str(v), 'unicode_escape')
+        error = len(v) != 1 or v in '"\r\n'
+    finally:
+        if error:
+            raise argparse.ArgumentTypeError('Single character (other than a quote or newline) expected')
+    return v
+
+
 #
 # Private helpler functions
 #
 
 def __create_common_parser():
     parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--socket', type=str,
+                        help='Unix socket of the plot server (Default: $CSV_PLOTTER_SOCKET or a socket in '
+                             '$XDG_RUNTIME_DIR resp. a directory of the current user in the temporary directory).',
+                        required=False)
     return parser
 
 
@@ -67,22 +99,85 @@ def create_plot_parser(generate_help=True):
                                      parents=[__create_common_parser()], add_help=generate_help)
 
     parser.add_argument('-i', '--input-file',
-                        help='CSV data file', required=False)
+                        help='CSV data file. A glob pattern like \'run.csv.*\' selects several files, which are'
+                             ' combined according to --input-mode.', required=False)
+    parser.add_argument('--input-mode', choices=['concat', 'overlay'],
+                        help='Combine several input files by concatenating their rows in order of their (natural'
+                             ' sorted) names or by overlaying them as separate series of each column'
+                             ' (Default: concat).', required=False)
     parser.add_argument('columns', type=str, nargs='*',
                         help='A list of columns that should be plotted. Both the column name and index are valid.', default=[])
     parser.add_argument('-o', '--output-file', type=str,
                         help='If specified, stores the plot in a file and prevents opening a plot window.\nThe file '
                              'format is determined using the default behaviour of matplotlib.pyplot.savefig!', required=False)
-    parser.add_argument('-d', '--divider',      type=__divide_check,
+    parser.add_argument('-d', '--divider',      type=__positive_int_check,
                         help='Divides the input data to only take each nth packet', required=False)
     parser.add_argument('-r', '--region',       type=__region_check,     help='Specifies the desired data range in format \'START:END\' (inclusive START but exclusive END). '
                                                                               'START and END (or both) my be omitted to specify an open range '
-                                                                              'e.g. use \'100:\' to plot all data from the 100th sample until the last one.', required=False)
+                                                                              'e.g. use \'100:\' to plot all data from the 100th sample until the last one. '
+                                                                              'Negative values count from the end of the file, e.g. use \'-1000:\' to plot the last 1000 samples.', required=False)
+    parser.add_argument('-x', '--x-column', type=str,
+                        help='Use the values of the given (monotonically increasing) column as X axis instead of the'
+                             ' sample indices.', required=False)
+    parser.add_argument('--x-range', type=__value_range_check,
+                        help='Only plot the samples whose X values lie in the range \'START:END\' (inclusive START'
+                             ' and END). The rows are located by binary search over the X column, which uses a'
+                             ' sparse index of the column together with --index.', required=False)
     parser.add_argument('-c', '--config', dest='yaml_config',  type=str,
                         help='Specifies a YAML plot configuration file to be used. This file is able to set all other settings'
                              ' like range and divider settings as well as the input and output files if desired.\nIf a configuration'
                              ' file is specified, passing additional columns plot them in a separate subplot. Explicitely passing'
                              ' other arguments to the script will override their values set in the configuration file.', required=False)
+    parser.add_argument('-b', '--batch', dest='batch_configs', type=str, nargs='+',
+                        help='Render the figures of many YAML plot configuration files (or glob patterns like'
+                             ' \'plots/*.yaml\') to their output files. Configs with the same input file share a'
+                             ' single load of it. Other arguments override the values of all configs.', required=False)
+    parser.add_argument('-w', '--workers', type=__positive_int_check,
+                        help='Number of processes rendering the figures of --batch (Default: number of CPUs).',
+                        required=False)
+    parser.add_argument('--cache', dest='use_cache', action='store_true', default=None,
+                        help='Store the parsed columns in a binary cache beside the input file and reuse them as long'
+                             ' as the input file does not change.', required=False)
+    parser.add_argument('--index', dest='use_index', action='store_true', default=None,
+                        help='Use a row offset index stored beside the input file to seek directly to the start of the'
+                             ' region. The index is built if it does not exist yet.', required=False)
+    parser.add_argument('-j', '--jobs', type=__positive_int_check,
+                        help='Number of processes used to parse the input file in parallel.', required=False)
+    parser.add_argument('--downsample', choices=['minmax', 'lttb', 'none'],
+                        help='Reduce each series to a number of points depending on the plot width in pixels before'
+                             ' plotting. \'minmax\' keeps the extremes of each pixel column, \'lttb\' uses the'
+                             ' Largest-Triangle-Three-Buckets algorithm. An explicit method replaces the level of'
+                             ' detail handling of interactive plot windows.', required=False)
+    parser.add_argument('--render', choices=['lines', 'density'],
+                        help='Draw each sample of the subplots (\'lines\') or the number of samples per pixel as'
+                             ' an image (\'density\'), whose render time and file size do not depend on the number'
+                             ' of samples (Default: lines).', required=False)
+    parser.add_argument('-f', '--follow', action='store_true', default=None,
+                        help='Keep the plot window open and append rows which are written to the input file after'
+                             ' it has been loaded.', required=False)
+    parser.add_argument('--refresh', dest='refresh_interval', type=float,
+                        help='Interval in seconds in which a followed file is checked for new rows (Default: 1).',
+                        required=False)
+    parser.add_argument('--window', type=__positive_int_check,
+                        help='Only keep (and plot) the last N samples of a followed file.', required=False)
+    parser.add_argument('-s', '--streaming', action='store_true', default=None,
+                        help='Stream the input file through per pixel aggregators instead of loading all samples.'
+                             ' This allows plotting files which are larger than the available memory. Without a row'
+                             ' index (see --index), the rows up to the end of the region are counted in a first pass.',
+                        required=False)
+    parser.add_argument('--progressive', action='store_true', default=None,
+                        help='Open the plot window as soon as the first rows are loaded and refine the plot while the'
+                             ' rest of the input file is loaded in the background.', required=False)
+    parser.add_argument('--server', action='store_true', default=False,
+                        help='Let a running plot server (see csv_plot_server) render the figure to the output file.'
+                             ' The server keeps the parsed input file in memory for subsequent renders. Without a'
+                             ' server, the figure is rendered locally.', required=False)
+    parser.add_argument('--stats', action='store_true', default=False,
+                        help='Print the wall time and memory growth of each processing stage.', required=False)
+    parser.add_argument('--stats-json', type=str,
+                        help='Write the statistics of each processing stage as JSON to the given file.', required=False)
+    parser.add_argument('--profile', type=str,
+                        help='Profile the run with cProfile and store the results in the given file.', required=False)
     return parser
 
 
@@ -90,18 +185,80 @@ def create_utility_parser(generate_help=True):
     parser = argparse.ArgumentParser(description='Provide utilities to process a CSV file in different ways.',
                                      parents=[__create_common_parser()], add_help=generate_help)
 
-    parser.add_argument('input-file', help='CSV data file')
+    parser.add_argument('input_file', metavar='input-file', help='CSV data file')
+    parser.add_argument('columns', type=str, nargs='*',
+                        help='Columns used by --stats, --convert and --transform (Default: all columns). --transform'
+                             ' also accepts column indices.', default=[])
     parser.add_argument('-l', '--list-headers', action='store_true',
                         help='List all column headers found (all entries of the first row).', default=False)
+    parser.add_argument('--cache-info', action='store_true',
+                        help='List all entries of the column cache beside the input file.', default=False)
+    parser.add_argument('--purge-cache', action='store_true',
+                        help='Remove the cached columns of the input file.', default=False)
+    parser.add_argument('--index', dest='build_index', action='store_true',
+                        help='Build a row offset index beside the input file which allows plotting regions without'
+                             ' reading all preceding rows.', default=False)
+    parser.add_argument('--convert', dest='convert_file', type=str,
+                        help='Convert the input file to a columnar binary file, which can be plotted like a CSV file'
+                             ' but is memory mapped instead of parsed.', required=False)
+    parser.add_argument('-t', '--transform', dest='transform_file', type=str,
+                        help='Stream the selected columns of the rows in the region (see -r, -d, --skip-lines and'
+                             ' --drop-lines) to a new CSV file, or to a columnar file if the name ends with .csvc.'
+                             ' The input file is never loaded completely.', required=False)
+    parser.add_argument('--skip-lines', type=int, default=0,
+                        help='Number of lines in front of the header line, which are ignored by --transform.',
+                        required=False)
+    parser.add_argument('--drop-lines', type=int, default=0,
+                        help='Number of lines at the end of the file, which are ignored by --transform.',
+                        required=False)
+    parser.add_argument('--delimiter', type=__delimiter_check, default=',',
+                        help='Delimiter of the input file read by --transform (Default: \',\').', required=False)
+    parser.add_argument('--output-delimiter', type=__delimiter_check, default=',',
+                        help='Delimiter of the CSV file written by --transform (Default: \',\').', required=False)
+    parser.add_argument('-j', '--jobs', type=__positive_int_check, default=1,
+                        help='Number of processes used to parse the input file in parallel (used by --convert).',
+                        required=False)
+    parser.add_argument('-s', '--stats', action='store_true',
+                        help='Print count, NaN and invalid count, min, max, mean, standard deviation and percentiles of'
+                             ' each column. The file is streamed once with constant memory usage.', default=False)
+    parser.add_argument('--server', action='store_true', default=False,
+                        help='Let a running plot server (see csv_plot_server) compute --stats from the columns it'
+                             ' keeps in memory. Without a server, the statistics are computed locally.',
+                        required=False)
+    parser.add_argument('-p', '--percentiles', type=float, nargs='+',
+                        help='Percentiles printed by --stats (Default: 1 5 25 50 75 95 99).', required=False)
+    parser.add_argument('-d', '--divider', type=__positive_int_check, default=1,
+                        help='Only take each nth row into account (used by --stats and --transform).', required=False)
+    parser.add_argument('-r', '--region', type=__region_check,
+                        help='Only take the rows in the region \'START:END\' into account (used by --stats and'
+                             ' --transform).',
+                        required=False)
+    return parser
+
+
+def create_server_parser(generate_help=True):
+    parser = argparse.ArgumentParser(description='Keep parsed CSV files in memory and render figures for clients'
+                                                 ' (csv_plot --server and csv_util --server).',
+                                     parents=[__create_common_parser()], add_help=generate_help)
+
+    parser.add_argument('-m', '--memory', type=__positive_int_check, default=1024,
+                        help='Memory budget in MiB for the parsed columns. The least recently used files are evicted'
+                             ' once it is exceeded (Default: 1024).', required=False)
+    parser.add_argument('--info', action='store_true', default=False,
+                        help='Print the files kept in memory by the running server.', required=False)
+    parser.add_argument('--stop', action='store_true', default=False,
+                        help='Stop the running server.', required=False)
     return parser
 
 
 def create_combined_parser():
     plot_parser = create_plot_parser(False)
     util_parser = create_utility_parser(False)
+    server_parser = create_server_parser(False)
 
     parser = argparse.ArgumentParser()
     sub_parsers = parser.add_subparsers(dest='chosen_command')
     sub_parsers.add_parser('plot', parents=[plot_parser])
     sub_parsers.add_parser('util', parents=[util_parser])
+    sub_parsers.add_parser('server', parents=[server_parser])
     return parser
@@ -0,0 +1,223 @@
+import copy
+import gc
+import glob
+import os
+from math import ceil, gcd
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from . import columnar_file, csv_handling, plotting, row_index, value_index
+from .utils import Range
+
+
+# Batch mode renders the figures of many plot configs. Configs with the same input file are grouped, so each file is
+# loaded only once with the union of the columns needed by the group. The loaded columns are copied into shared
+# memory blocks, which the rendering processes attach to by name, so the arrays are neither pickled nor copied per
+# figure. Loading the next group overlaps with rendering the figures of the previous one.
+#
+# If the configs of a group select different rows, the union of their rows is loaded and each config selects its rows
+# by an offset into the loaded rows and a range relative to it.
+
+
+def expand_config_files(patterns):
+    # Expand glob patterns into the sorted list of matching files. Plain file names are kept as they are.
+    files = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if any(c in pattern for c in '*?[') else [pattern]
+        if len(matches) == 0:
+            print(f'No config file matches "{pattern}"!')
+        files += [f for f in matches if f not in files]
+    return files
+
+
+def read_full_columns(config, columns, rng=None):
+    # Returns the headers, the number of rows, the full length columns and the indices of their invalid rows. If a range
+    # is given, only its rows are returned and the indices refer to them.
+    if columnar_file.is_columnar_file(config.input_file):
+        container = columnar_file.ColumnarFile(config.input_file)
+        headers = [h for h in container.headers if h in columns]
+        loaded = [container.load_column(h) for h in headers]
+        if rng is None:
+            return headers, container.rows, [col for col, _ in loaded], [inv for _, inv in loaded]
+        # The columns are memory mapped, so slicing them does not read any other rows
+        selected = rng.to_slice(container.rows)
+        return headers, len(range(container.rows)[selected]), [col[selected] for col, _ in loaded], \
+            [_select_indices(inv, selected) for _, inv in loaded]
+    return csv_handling.CsvData.read_full_columns(config, columns, rng)
+
+
+#
+# Private helper functions
+#
+
+def _resolve_rows(config):
+    # Translate relative regions and ranges of X values into the rows to be plotted, like for a single plot
+    config.range = row_index.resolve_range(config.input_file, config.range)
+    if config.x_column is not None:
+        config.range = value_index.select_rows(config)
+
+
+def _select_indices(indices, selected):
+    # Translate sorted row indices into the ones of the rows selected by a slice
+    start, stop, step = selected.start, max(selected.start, selected.stop), selected.step
+    kept = indices[(indices >= start) & (indices < stop) & ((indices - start) % step == 0)]
+    return (kept - start) // step
+
+
+def _get_union_range(ranges):
+    # The smallest range containing the rows of all given ranges, which are either all absolute or all relative to
+    # the end of the file. Its divider is the greatest common divisor, so each of the dividers is a multiple of it.
+    divider = 0
+    for rng in ranges:
+        divider = gcd(divider, rng.divider)
+    start = min(rng.start if rng.start is not None else 0 for rng in ranges)
+    end = None if any(rng.end is None for rng in ranges) else max(rng.end for rng in ranges)
+    return Range(start, end, divider)
+
+
+def _get_selection(rng, union):
+    # Return the offset into the rows of the union range and the range relative to it, which select the rows of rng
+    first = int(ceil(float(union.start) / union.divider) * union.divider)
+    start = int(ceil(float(max(rng.start if rng.start is not None else 0, first)) / rng.divider) * rng.divider)
+    offset = (start - first) // union.divider
+    end = None
+    if rng.end is not None:
+        end = max(int(ceil(float(rng.end - first) / union.divider)) - offset, 0)
+    return offset, Range(0, end, rng.divider // union.divider)
+
+
+def _group_by_input_file(configs):
+    groups = {}
+    for config in configs:
+        groups.setdefault(os.path.realpath(config.input_file), []).append(config)
+    return list(groups.values())
+
+
+def _load_group(configs):
+    # Load the columns needed by all configs of the group. Returns the headers, the number of rows, the columns and
+    # their invalid rows as well as the offset and range each config has to select from these columns.
+    columns = []
+    for config in configs:
+        columns += [c for c in csv_handling.get_needed_columns(config) if c not in columns]
+
+    ranges = {(c.range.start, c.range.end, c.range.divider) for c in configs}
+    if len({c.range.is_relative for c in configs}) > 1:
+        # The dividers of ranges relative to the end of the file refer to negative data indices, so they cannot be
+        # combined with absolute ranges without knowing the number of rows
+        print(f'Extract all rows from file: {configs[0].input_file}')
+        headers, rows, full_columns, invalid = read_full_columns(configs[0], columns)
+        return headers, rows, full_columns, invalid, [(0, c.range) for c in configs]
+    if len(ranges) > 1:
+        # The configs select different rows, which are sliced from the union of their rows by each rendering process
+        union = _get_union_range([c.range for c in configs])
+        print(f'Extract rows {union.start}:{union.end if union.end is not None else ""} (divider {union.divider}) '
+              f'from file: {configs[0].input_file}')
+        headers, rows, loaded, invalid = read_full_columns(configs[0], columns, union)
+        return headers, rows, loaded, invalid, [_get_selection(c.range, union) for c in configs]
+
+    # All configs select the same rows, so only these are loaded. The types configured by any of the configs are
+    # applied while loading, each config converts the columns to its own types afterwards.
+    load_cfg = copy.copy(configs[0])
+    load_cfg.subplots = [subplot for config in configs for subplot in config.subplots]
+    data_obj = csv_handling.CsvData.from_file(load_cfg, columns)
+    loaded = [data_obj.data[h][:data_obj.size] for h in data_obj.headers]
+    invalid = [np.array([], dtype=np.int64)] * len(loaded)
+    return data_obj.headers, data_obj.size, loaded, invalid, [(0, Range())] * len(configs)
+
+
+def _plot(config, headers, columns, invalid, rows, selection):
+    # Returns an error message or None if the figure has been stored
+    offset, rng = selection
+    if offset > 0:
+        columns = [col[offset:] for col in columns]
+        invalid = [inv[inv >= offset] - offset for inv in invalid]
+        rows = max(rows - offset, 0)
+    data_obj = csv_handling.CsvData.from_columns(headers, columns, invalid, rows, rng,
+                                                 csv_handling.get_dtype_overrides(config))
+    if data_obj.size == 0:
+        return 'No relevant samples selected'
+    plotting.plot_csv_data(data_obj, config)
+    return None
+
+
+def _render(task):
+    # Executed by the rendering processes. Returns an error message or None if the figure has been stored.
+    config, headers, specs, invalid, rows, selection = task
+    blocks = [shared_memory.SharedMemory(name=name) for name, _ in specs]
+    columns = [np.ndarray((rows,), dtype=dtype, buffer=block.buf) for block, (_, dtype) in zip(blocks, specs)]
+
+    try:
+        error = _plot(config, headers, columns, invalid, rows, selection)
+    except Exception as ex:
+        error = f'{type(ex).__name__}: {ex}'
+
+    # A block can only be closed after all arrays referring to its memory are gone
+    del columns
+    gc.collect()
+    for block in blocks:
+        block.close()
+    return error
+
+
+def _wait_for(shared, futures):
+    failed = 0
+    try:
+        for config, future in futures:
+            error = future.result()
+            if error is not None:
+                print(f'Failed to render output file {config.output_file}: {error}')
+                failed += 1
+    finally:
+        shared.release()
+    return failed
+
+
+class SharedColumns(object):
+    # Copies of columns in shared memory blocks, which are removed again by release()
+
+    def __init__(self, columns):
+        self.blocks = []
+        self.specs = []
+        for column in columns:
+            block = shared_memory.SharedMemory(create=True, size=max(column.nbytes, 1))
+            np.ndarray(column.shape, dtype=column.dtype, buffer=block.buf)[:] = column
+            self.blocks.append(block)
+            self.specs.append((block.name, column.dtype.str))
+
+    def release(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+
+def render(configs, workers=None):
+    # Render the figures of all configs, which have to specify an output file. Returns the number of failed configs.
+    failed = 0
+    pending = None
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for group in _group_by_input_file(configs):
+            try:
+                for config in group:
+                    _resolve_rows(config)
+                headers, rows, columns, invalid, selections = _load_group(group)
+            except (OSError, ValueError) as ex:
+                print(f'Failed to load file "{group[0].input_file}": {ex}')
+                failed += len(group)
+                continue
+
+            shared = SharedColumns(columns)
+            del columns
+            futures = [(config, executor.submit(_render, (config, headers, shared.specs, invalid, rows, selection)))
+                       for config, selection in zip(group, selections)]
+
+            # While the figures of this group are rendered, the next group is loaded
+            if pending is not None:
+                failed += _wait_for(*pending)
+            pending = (shared, futures)
+
+        if pending is not None:
+            failed += _wait_for(*pending)
+    return failed
@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+
+CACHE_DIR_NAME = '.csv_plotter_cache'
+MANIFEST_NAME = 'manifest.json'
+MAX_CACHE_SIZE = 4 * 1024**3
+FINGERPRINT_BLOCK_SIZE = 1024 * 1024
+
+
+#
+# Private helper functions
+#
+
+def _fingerprint(filename, size):
+    # Hashing the whole file would take about as long as parsing it, so only its head and tail are hashed.
+    # Together with the file size and modification time this is enough to detect stale cache entries.
+    h = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        h.update(f.read(FINGERPRINT_BLOCK_SIZE))
+        if size > FINGERPRINT_BLOCK_SIZE:
+            f.seek(max(FINGERPRINT_BLOCK_SIZE, size - FINGERPRINT_BLOCK_SIZE))
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def _file_key(filename):
+    path = os.path.abspath(filename)
+    st = os.stat(path)
+    return {
+        'path': path,
+        'size': st.st_size,
+        'mtime_ns': st.st_mtime_ns,
+        'hash': _fingerprint(path, st.st_size),
+    }
+
+
+def _read_manifest(entry_dir):
+    try:
+        with open(os.path.join(entry_dir, MANIFEST_NAME), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_manifest(entry_dir, manifest):
+    tmp_file = os.path.join(entry_dir, MANIFEST_NAME + '.tmp')
+    with open(tmp_file, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_file, os.path.join(entry_dir, MANIFEST_NAME))
+
+
+def _entry_size(entry_dir):
+    return sum(e.stat().st_size for e in os.scandir(entry_dir) if e.is_file())
+
+
+#
+# Public cache functions
+#
+
+def get_cache_dir(filename):
+    # The cache lives in a hidden directory beside the CSV file
+    return os.path.join(os.path.dirname(os.path.abspath(filename)), CACHE_DIR_NAME)
+
+
+def list_entries(cache_dir):
+    # Return the manifests of all cache entries together with their size on disk, most recently used first
+    entries = []
+    if not os.path.isdir(cache_dir):
+        return entries
+
+    for e in os.scandir(cache_dir):
+        if not e.is_dir():
+            continue
+        manifest = _read_manifest(e.path)
+        if manifest is None:
+            manifest = {'key': {'path': None}, 'columns': {}, 'last_used': 0}
+        manifest['entry_dir'] = e.path
+        manifest['entry_size'] = _entry_size(e.path)
+        entries.append(manifest)
+    return sorted(entries, key=lambda m: m['last_used'], reverse=True)
+
+
+def purge(cache_dir, filename=None):
+    # Remove the cache entry of the given file or the whole cache directory if no file is given
+    if filename is not None:
+        entry_dir = ColumnCache.get_entry_dir(filename)
+        if os.path.isdir(entry_dir):
+            shutil.rmtree(entry_dir)
+    elif os.path.isdir(cache_dir):
+        shutil.rmtree(cache_dir)
+
+
+def enforce_limit(cache_dir, max_size=MAX_CACHE_SIZE, keep=None):
+    # Evict the least recently used entries until the cache fits into max_size bytes.
+    # The entry directory given by keep is never evicted.
+    entries = list_entries(cache_dir)
+    total_size = sum(e['entry_size'] for e in entries)
+    for e in reversed(entries):
+        if total_size <= max_size:
+            break
+        if e['entry_dir'] == keep:
+            continue
+        shutil.rmtree(e['entry_dir'], ignore_errors=True)
+        total_size -= e['entry_size']
+
+
+class ColumnCache(object):
+    def __init__(self, filename):
+        self.cache_dir = get_cache_dir(filename)
+        self.entry_dir = self.get_entry_dir(filename)
+        self.key = _file_key(filename)
+
+        manifest = _read_manifest(self.entry_dir)
+        if manifest is None or manifest['key'] != self.key:
+            if os.path.isdir(self.entry_dir):
+                print('Cache is stale and gets rebuilt')
+                shutil.rmtree(self.entry_dir)
+            manifest = {'key': self.key, 'rows': None, 'columns': {}, 'last_used': 0}
+        self.manifest = manifest
+
+    @staticmethod
+    def get_entry_dir(filename):
+        path = os.path.abspath(filename)
+        return os.path.join(get_cache_dir(path), hashlib.sha1(path.encode('utf-8')).hexdigest()[:16])
+
+    @property
+    def rows(self):
+        return self.manifest['rows']
+
+    def has_column(self, name):
+        return name in self.manifest['columns']
+
+    def load_column(self, name):
+        # Returns a read-only memory map of the column and the sorted indices of rows with invalid values
+        entry = self.manifest['columns'][name]
+        column = np.load(os.path.join(self.entry_dir, entry['file']), mmap_mode='r')
+        if entry['invalid'] is None:
+            invalid = np.array([], dtype=np.int64)
+        else:
+            invalid = np.load(os.path.join(self.entry_dir, entry['invalid']))
+        return column, invalid
+
+    def store_columns(self, rows, names, columns, invalid):
+        # Store full length columns together with the indices of their invalid rows
+        if self.rows is not None and self.rows != rows:
+            raise ValueError(f'Cached columns contain {self.rows} rows, but {rows} rows should be stored!')
+
+        os.makedirs(self.entry_dir, exist_ok=True)
+        self.manifest['rows'] = rows
+        for name, column, column_invalid in zip(names, columns, invalid):
+            idx = len(self.manifest['columns'])
+            entry = {'file': f'col{idx}.npy', 'invalid': None}
+            np.save(os.path.join(self.entry_dir, entry['file']), column)
+            if len(column_invalid) > 0:
+                entry['invalid'] = f'col{idx}.invalid.npy'
+                np.save(os.path.join(self.entry_dir, entry['invalid']), column_invalid)
+            self.manifest['columns'][name] = entry
+
+        self.touch()
+        enforce_limit(self.cache_dir, keep=self.entry_dir)
+
+    def touch(self):
+        # Mark the entry as recently used
+        self.manifest['last_used'] = time.time()
+        if os.path.isdir(self.entry_dir):
+            _write_manifest(self.entry_dir, self.manifest)
@@ -0,0 +1,157 @@
+import numpy as np
+
+from . import columnar_file, csv_parsing, decompression, row_index
+from .csv_handling import read_headers, select_columns
+
+
+DEFAULT_PERCENTILES = [1, 5, 25, 50, 75, 95, 99]
+# Number of rows of a columnar file processed at once
+BLOCK_ROWS = 1024 * 1024
+
+
+class ColumnStatistics(object):
+    # Statistics of a column which are updated block by block, so the memory usage does not depend on the number of
+    # rows. Mean and variance are merged with the parallel algorithm of Chan et al., percentiles are estimated from a
+    # uniform random sample of at most SAMPLE_SIZE values. The sample keeps the values with the smallest random keys,
+    # which makes it a uniform sample of all values seen so far.
+    SAMPLE_SIZE = 20000
+
+    def __init__(self, name, seed=0):
+        self.name = name
+        self.count = 0
+        self.nan_count = 0
+        self.invalid_count = 0
+        self.min = None
+        self.max = None
+        self.mean = 0.0
+        self.m2 = 0.0
+
+        self.random = np.random.default_rng(seed)
+        self.sample = np.array([], dtype=np.float64)
+        self.sample_keys = np.array([], dtype=np.float64)
+
+    def add(self, values, invalid):
+        # Add a block of values. Invalid values are only counted, NaN values (e.g. of missing cells) are counted
+        # separately from the valid ones.
+        self.invalid_count += int(np.count_nonzero(invalid))
+        values = values[~invalid]
+        if values.dtype.kind == 'b':
+            values = values.astype(np.int8)
+        if values.dtype.kind == 'f':
+            nan = np.isnan(values)
+            self.nan_count += int(np.count_nonzero(nan))
+            values = values[~nan]
+        if len(values) == 0:
+            return
+
+        lo, hi = values.min(), values.max()
+        self.min = lo if self.min is None else min(self.min, lo)
+        self.max = hi if self.max is None else max(self.max, hi)
+
+        values = values.astype(np.float64)
+        block_mean = values.mean()
+        block_m2 = float(np.sum((values - block_mean)**2))
+        count = self.count + len(values)
+        delta = block_mean - self.mean
+        self.mean += delta * len(values) / count
+        self.m2 += block_m2 + delta**2 * self.count * len(values) / count
+        self.count = count
+
+        self.__add_to_sample(values)
+
+    def __add_to_sample(self, values):
+        keys = self.random.random(len(values))
+        if len(self.sample) == self.SAMPLE_SIZE:
+            # Only values with a smaller key than the largest one in the sample may replace a sampled value
+            keep = keys < self.sample_keys.max()
+            values, keys = values[keep], keys[keep]
+
+        self.sample = np.concatenate((self.sample, values))
+        self.sample_keys = np.concatenate((self.sample_keys, keys))
+        if len(self.sample) > self.SAMPLE_SIZE:
+            selected = np.argpartition(self.sample_keys, self.SAMPLE_SIZE)[:self.SAMPLE_SIZE]
+            self.sample, self.sample_keys = self.sample[selected], self.sample_keys[selected]
+
+    @property
+    def std(self):
+        return np.sqrt(self.m2 / self.count) if self.count > 0 else None
+
+    def get_percentiles(self, percentiles):
+        if len(self.sample) == 0:
+            return [None] * len(percentiles)
+        return list(np.percentile(self.sample, percentiles))
+
+
+def __iter_array_blocks(columns, invalid, rows, rng, block_rows=BLOCK_ROWS):
+    # Yield the selected rows of full length columns (e.g. of a columnar file) in blocks of the same form as
+    # csv_parsing.iter_column_blocks()
+    selected = rng.to_slice(rows)
+    start, end = selected.start, selected.stop
+
+    # Blocks start at multiples of the divider, so the strided slices of all blocks continue each other
+    step = max(block_rows // rng.divider, 1) * rng.divider
+    for block_start in range(start, end, step):
+        block_end = min(block_start + step, end)
+        indices = np.arange(block_start, block_end, rng.divider)
+        yield [col[block_start:block_end:rng.divider] for col in columns], \
+            [np.isin(indices, inv) for inv in invalid], block_end
+
+
+def compute_column_statistics(headers, columns, invalid, rows, rng):
+    # Return the statistics of the rows in the given range of already loaded full length columns. invalid contains
+    # the indices of the rows with invalid values of each column.
+    stats = [ColumnStatistics(h) for h in headers]
+    for blocks, blocks_invalid, _ in __iter_array_blocks(columns, invalid, rows, rng):
+        for column_stats, column, column_invalid in zip(stats, blocks, blocks_invalid):
+            column_stats.add(column, column_invalid)
+    return stats
+
+
+def compute_statistics(filename, rng, columns=None, use_index=False):
+    # Stream all rows of the file which lie in the given range and return the statistics of the selected columns
+    file_headers = read_headers(filename)
+    column_indices = select_columns(file_headers, columns)
+    if columnar_file.is_columnar_file(filename):
+        container = columnar_file.ColumnarFile(filename)
+        headers = [file_headers[i] for i in column_indices]
+        loaded = [container.load_column(h) for h in headers]
+        return compute_column_statistics(headers, [col for col, _ in loaded], [inv for _, inv in loaded],
+                                         container.rows, rng)
+
+    stats = [ColumnStatistics(file_headers[i]) for i in column_indices]
+
+    with decompression.open_binary(filename) as f:
+        f.readline()
+        dtypes = csv_parsing.infer_dtypes(f, len(file_headers), column_indices)
+        first_index = row_index.seek_to_row(f, filename, rng.start, use_index)
+        for columns, invalid, _ in csv_parsing.iter_column_blocks(f, rng, len(file_headers), column_indices,
+                                                                  first_index, dtypes):
+            for column_stats, column, column_invalid in zip(stats, columns, invalid):
+                column_stats.add(column, column_invalid)
+    return stats
+
+
+def format_report(rng, stats, percentiles=DEFAULT_PERCENTILES):
+    # Format the statistics of the rows in the range together with a line describing the range
+    return f'Statistics of the rows {rng.start or 0}:{rng.end if rng.end is not None else ""} ' \
+        f'(divider {rng.divider}):\n' + format_statistics(stats, percentiles)
+
+
+def format_statistics(stats, percentiles=DEFAULT_PERCENTILES):
+    # Format the statistics as table with one line per column
+    def fmt(v):
+        if v is None:
+            return f'{"-":>12}'
+        if isinstance(v, (int, np.integer)):
+            return f'{v:12d}'
+        return f'{v:12.6g}'
+
+    name_width = max([len(s.name) for s in stats] + [6])
+    header = f'  {"Column":{name_width}} {"count":>10} {"NaN":>8} {"invalid":>8} ' + \
+        ' '.join(f'{h:>12}' for h in ['min', 'max', 'mean', 'std'] + [f'p{p:g}' for p in percentiles])
+    lines = [header]
+    for s in stats:
+        values = [s.min, s.max, s.mean if s.count > 0 else None, s.std] + s.get_percentiles(percentiles)
+        lines.append(f'  {s.name:{name_width}} {s.count:10} {s.nan_count:8} {s.invalid_count:8} ' +
+                     ' '.join(fmt(v) for v in values))
+    return '\n'.join(lines)
@@ -0,0 +1,193 @@
+import json
+import os
+import struct
+
+
+# A columnar file consists of the magic bytes, the length of a JSON header, the JSON header and the column data.
+# The header contains the number of rows and for each column its name, type and the offset of its data as well as of
+# the indices of its rows with invalid values. The data of each column is stored contiguously in little endian byte
+# order and starts at a multiple of ALIGNMENT, so it can be memory mapped directly.
+#
+# numpy is only imported by the functions which need it, since reading the headers should stay lightweight.
+MAGIC = b'CSVCOL\x00\x01'
+VERSION = 1
+ALIGNMENT = 64
+FILE_EXTENSION = '.csvc'
+
+_HEADER_LENGTH = struct.Struct('<Q')
+
+
+#
+# Private helper functions
+#
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _read_header(filename):
+    # Returns the parsed JSON header and the offset at which the column data starts
+    with open(filename, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'File "{filename}" is no columnar file!')
+        length, = _HEADER_LENGTH.unpack(f.read(_HEADER_LENGTH.size))
+        header = json.loads(f.read(length).decode('utf-8'))
+    if header['version'] != VERSION:
+        raise ValueError(f'Columnar file "{filename}" has the unsupported version {header["version"]}!')
+    return header, _align(len(MAGIC) + _HEADER_LENGTH.size + length)
+
+
+def _layout(headers, rows, dtypes, invalid_counts):
+    # Returns the entries of the columns, the encoded header, the offset at which the column data starts and the size
+    # of the column data
+    entries = []
+    offset = 0
+    for name, dtype, invalid_count in zip(headers, dtypes, invalid_counts):
+        dtype = dtype.newbyteorder('<')
+        entry = {'name': name, 'dtype': dtype.str, 'offset': offset, 'invalid_offset': None,
+                 'invalid_count': invalid_count}
+        offset = _align(offset + rows * dtype.itemsize)
+        if invalid_count > 0:
+            # The indices of the rows with invalid values are stored as int64
+            entry['invalid_offset'] = offset
+            offset = _align(offset + invalid_count * 8)
+        entries.append(entry)
+
+    # The offsets are relative to the start of the data, which follows the (aligned) header
+    header = json.dumps({'version': VERSION, 'rows': rows, 'columns': entries}).encode('utf-8')
+    return entries, header, _align(len(MAGIC) + _HEADER_LENGTH.size + len(header)), offset
+
+
+def _write_header(f, header):
+    f.write(MAGIC)
+    f.write(_HEADER_LENGTH.pack(len(header)))
+    f.write(header)
+
+
+#
+# Public functions
+#
+
+def is_columnar_file(filename):
+    # Columnar files are recognized by their magic bytes, independent of their extension
+    with open(filename, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def read_headers(filename):
+    return [c['name'] for c in _read_header(filename)[0]['columns']]
+
+
+def write(filename, headers, rows, columns, invalid):
+    # Store full length columns together with the sorted indices of their rows with invalid values.
+    # The file is written to a temporary file first, so an existing file is only replaced by a complete one.
+    import numpy as np
+
+    for name, column in zip(headers, columns):
+        if len(column) != rows:
+            raise ValueError(f'Column "{name}" contains {len(column)} rows, but {rows} rows should be stored!')
+    entries, header, data_start, size = _layout(headers, rows, [column.dtype for column in columns],
+                                                [len(column_invalid) for column_invalid in invalid])
+
+    tmp_file = filename + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        _write_header(f, header)
+        for entry, column, column_invalid in zip(entries, columns, invalid):
+            f.seek(data_start + entry['offset'])
+            f.write(np.ascontiguousarray(column, dtype=entry['dtype']).tobytes())
+            if entry['invalid_offset'] is not None:
+                f.seek(data_start + entry['invalid_offset'])
+                f.write(np.asarray(column_invalid, dtype='<i8').tobytes())
+        f.truncate(data_start + size)
+    os.replace(tmp_file, filename)
+
+
+class ColumnarWriter(object):
+    # Writes a columnar file block by block, so its columns never have to be in memory completely. Since the data of a
+    # column can only be placed once the number of rows is known, the blocks of each column are spooled to a temporary
+    # file first. close() copies them into place and converts them to the common type of all blocks of their column.
+
+    def __init__(self, filename, headers):
+        import tempfile
+
+        self.filename = filename
+        self.headers = headers
+        self.rows = 0
+        directory = os.path.dirname(os.path.abspath(filename))
+        self.spools = [tempfile.TemporaryFile(dir=directory) for _ in headers]
+        # Type and length of each spooled block, arrays representing the values of the blocks and the sorted indices
+        # of rows with invalid values
+        self.blocks = [[] for _ in headers]
+        self.samples = [[] for _ in headers]
+        self.invalid = [[] for _ in headers]
+
+    def get_dtypes(self):
+        # Common type of the blocks added so far of each column (None if no values have been added yet)
+        from . import data_types
+        return [data_types.get_common_dtype(samples, None) for samples in self.samples]
+
+    def add_block(self, columns, invalid):
+        # Append a block of rows given as one array per column together with the masks of their invalid values
+        import numpy as np
+
+        for i, (column, column_invalid) in enumerate(zip(columns, invalid)):
+            self.spools[i].write(np.ascontiguousarray(column).tobytes())
+            self.blocks[i].append((column.dtype, len(column)))
+            # The common type of integers depends on their range, of all other types only on the type itself
+            if len(column) > 0:
+                self.samples[i].append(np.array([column.min(), column.max()], dtype=column.dtype)
+                                       if column.dtype.kind == 'i' else column[:1])
+            self.invalid[i].append(np.flatnonzero(column_invalid) + self.rows)
+        self.rows += len(columns[0]) if len(columns) > 0 else 0
+
+    def close(self):
+        import numpy as np
+
+        invalid = [np.concatenate([np.array([], dtype=np.int64)] + i) for i in self.invalid]
+        dtypes = [dtype if dtype is not None else np.dtype(np.float32) for dtype in self.get_dtypes()]
+        entries, header, data_start, size = _layout(self.headers, self.rows, dtypes, [len(i) for i in invalid])
+
+        tmp_file = self.filename + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            _write_header(f, header)
+            for entry, spool, blocks, column_invalid in zip(entries, self.spools, self.blocks, invalid):
+                f.seek(data_start + entry['offset'])
+                spool.seek(0)
+                for dtype, count in blocks:
+                    f.write(np.fromfile(spool, dtype=dtype, count=count).astype(entry['dtype']).tobytes())
+                spool.close()
+                if entry['invalid_offset'] is not None:
+                    f.seek(data_start + entry['invalid_offset'])
+                    f.write(column_invalid.astype('<i8').tobytes())
+            f.truncate(data_start + size)
+        os.replace(tmp_file, self.filename)
+
+
+class ColumnarFile(object):
+    def __init__(self, filename):
+        self.filename = filename
+        header, self.data_start = _read_header(filename)
+        self.rows = header['rows']
+        self.columns = {c['name']: c for c in header['columns']}
+        self.headers = [c['name'] for c in header['columns']]
+
+    def has_column(self, name):
+        return name in self.columns
+
+    def load_column(self, name):
+        # Returns a read-only memory map of the column and the sorted indices of rows with invalid values
+        import numpy as np
+
+        entry = self.columns[name]
+        dtype = np.dtype(entry['dtype'])
+        if self.rows == 0:
+            column = np.array([], dtype=dtype)
+        else:
+            column = np.memmap(self.filename, dtype=dtype, mode='r', offset=self.data_start + entry['offset'],
+                               shape=(self.rows,))
+        if entry['invalid_offset'] is None:
+            invalid = np.array([], dtype=np.int64)
+        else:
+            invalid = np.fromfile(self.filename, dtype='<i8', count=entry['invalid_count'],
+                                  offset=self.data_start + entry['invalid_offset']).astype(np.int64)
+        return column, invalid
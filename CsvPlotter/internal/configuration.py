@@ -10,6 +10,11 @@ def _get_or_default(cfg_obj, key, default=None, conv=None):
     return v
 
 
+def _input_files(v):
+    # A single file (or glob pattern) is kept as string, several ones as list of strings
+    return [str(f) for f in v] if isinstance(v, list) else str(v)
+
+
 def _assign_range(rng, obj):
     if len(obj) == 0:
         rng.start = None
@@ -25,31 +30,88 @@ def _assign_range(rng, obj):
 class PlotConfig(object):
     def __init__(self):
         self.input_file = None
+        self.input_mode = 'concat'
         self.output_file = None
         self.range = Range()
         self.share_x_axis = True
+        self.use_cache = False
+        self.use_index = False
+        self.jobs = 1
+        self.downsample = 'none'
+        self.follow = False
+        self.refresh_interval = 1.0
+        self.window = None
+        self.streaming = False
+        self.progressive = False
+        # Column used as X axis instead of the sample indices and the range of its values to plot
+        self.x_column = None
+        self.x_range = Range()
         self.subplots = []
 
     @classmethod
     def from_obj(cls, cfg_obj):
 
         plot_cfg = cls()
-        plot_cfg.input_file = _get_or_default(cfg_obj, 'input_file', conv=str)
+        plot_cfg.input_file = _get_or_default(cfg_obj, 'input_file', conv=_input_files)
         plot_cfg.output_file = _get_or_default(cfg_obj, 'output_file',
                                                conv=str)
         plot_cfg.range.divider = _get_or_default(cfg_obj, 'divider',
                                                  1, conv=int)
         plot_cfg.share_x_axis = _get_or_default(cfg_obj, 'share_x_axis',
                                                 True, conv=bool)
+        plot_cfg.use_cache = _get_or_default(cfg_obj, 'cache', False,
+                                             conv=bool)
+        plot_cfg.use_index = _get_or_default(cfg_obj, 'index', False,
+                                             conv=bool)
+        plot_cfg.jobs = _get_or_default(cfg_obj, 'jobs', 1, conv=int)
+        plot_cfg.downsample = _get_or_default(cfg_obj, 'downsample', 'none',
+                                              conv=str)
+        plot_cfg.follow = _get_or_default(cfg_obj, 'follow', False, conv=bool)
+        plot_cfg.refresh_interval = _get_or_default(cfg_obj, 'refresh_interval',
+                                                    1.0, conv=float)
+        plot_cfg.window = _get_or_default(cfg_obj, 'window', conv=int)
+        plot_cfg.streaming = _get_or_default(cfg_obj, 'streaming', False,
+                                             conv=bool)
+        plot_cfg.progressive = _get_or_default(cfg_obj, 'progressive', False,
+                                               conv=bool)
+        plot_cfg.input_mode = _get_or_default(cfg_obj, 'input_mode', 'concat',
+                                              conv=str)
+
+        plot_cfg.x_column = _get_or_default(cfg_obj, 'x_column', conv=str)
 
         _assign_range(plot_cfg.range, _get_or_default(cfg_obj, 'xlim', [None, None],
                                                       conv=list))
+        _assign_range(plot_cfg.x_range, _get_or_default(cfg_obj, 'x_range', [None, None],
+                                                        conv=list))
 
         for p in _get_or_default(cfg_obj, 'plots', []):
             plot_cfg.add_subplot(SubplotConfig.from_obj(p))
 
         return plot_cfg
 
+    def to_obj(self):
+        # Counterpart of from_obj(), e.g. for sending a config to the plot server
+        return {
+            'input_file': self.input_file,
+            'output_file': self.output_file,
+            'divider': self.range.divider,
+            'share_x_axis': self.share_x_axis,
+            'cache': self.use_cache,
+            'index': self.use_index,
+            'jobs': self.jobs,
+            'downsample': self.downsample,
+            'follow': self.follow,
+            'refresh_interval': self.refresh_interval,
+            'window': self.window,
+            'streaming': self.streaming,
+            'progressive': self.progressive,
+            'input_mode': self.input_mode,
+            'x_column': self.x_column,
+            'xlim': [self.range.start, self.range.end],
+            'x_range': [self.x_range.start, self.x_range.end],
+            'plots': [subplot_cfg.to_obj() for subplot_cfg in self.subplots],
+        }
+
     def add_subplot(self, subplot_cfg):
         self.subplots.append(subplot_cfg)
 
@@ -65,6 +127,8 @@ class SubplotConfig(object):
         self.ylim = Range()
         self.alt_ylim = Range()
         self.alt_ylabel = None
+        # 'lines' draws each sample, 'density' the number of samples per pixel
+        self.render = 'lines'
         self.columns = []
 
     @classmethod
@@ -76,6 +140,8 @@ class SubplotConfig(object):
         subplot_cfg.alt_ylabel = _get_or_default(cfg_obj, 'alt_ylabel',
                                                  conv=str)
 
+        subplot_cfg.render = _get_or_default(cfg_obj, 'render', 'lines', conv=str)
+
         _assign_range(subplot_cfg.ylim, _get_or_default(cfg_obj, 'ylim', [None, None],
                                                         conv=list))
         _assign_range(subplot_cfg.alt_ylim, _get_or_default(cfg_obj, 'alt_ylim', [None, None],
@@ -86,6 +152,18 @@ class SubplotConfig(object):
 
         return subplot_cfg
 
+    def to_obj(self):
+        return {
+            'title': self.title,
+            'xlabel': self.xlabel,
+            'ylabel': self.ylabel,
+            'alt_ylabel': self.alt_ylabel,
+            'render': self.render,
+            'ylim': [self.ylim.start, self.ylim.end],
+            'alt_ylim': [self.alt_ylim.start, self.alt_ylim.end],
+            'columns': [column_cfg.to_obj() for column_cfg in self.columns],
+        }
+
     def add_column(self, column_cfg):
         self.columns.append(column_cfg)
 
@@ -94,10 +172,14 @@ class SubplotConfig(object):
 
 
 class ColumnConfig(object):
-    def __init__(self, name=None, label=None, alt_y_axis=False):
-        self.name = name
+    def __init__(self, name=None, label=None, alt_y_axis=False, dtype=None, expr=None):
+        self.name = name if name is not None else expr
         self.alt_y_axis = alt_y_axis
-        self.label = label if label is not None else name
+        self.label = label if label is not None else self.name
+        # Name of the numpy type the column is stored as, None means the type is inferred from the data
+        self.dtype = dtype
+        # Expression of a derived column, which is calculated from other columns instead of being read from the file
+        self.expr = expr
 
     @classmethod
     def from_obj(cls, cfg_obj):
@@ -106,8 +188,22 @@ class ColumnConfig(object):
         column_cfg.label = _get_or_default(cfg_obj, 'label', conv=str)
         column_cfg.alt_y_axis = _get_or_default(cfg_obj, 'alt_y_axis', False,
                                                 conv=bool)
+        column_cfg.dtype = _get_or_default(cfg_obj, 'dtype', conv=str)
+        column_cfg.expr = _get_or_default(cfg_obj, 'expr', conv=str)
+        if column_cfg.name is None:
+            column_cfg.name = column_cfg.expr
 
         return column_cfg
 
+    def to_obj(self):
+        return {
+            'name': self.name,
+            'label': self.label,
+            'alt_y_axis': self.alt_y_axis,
+            'dtype': self.dtype,
+            'expr': self.expr,
+        }
+
     def __repr__(self):
-        return f'ColumnConfig{{name={self.name!r}, label={self.label!r}, alt_y_axis={self.alt_y_axis!r}}}'
+        return f'ColumnConfig{{name={self.name!r}, label={self.label!r}, alt_y_axis={self.alt_y_axis!r}, dtype={self.dtype!r}, ' \
+            f'expr={self.expr!r}}}'
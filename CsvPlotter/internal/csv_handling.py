@@ -1,96 +1,507 @@
 import numpy as np
+import collections
 import csv
+import io
+import os
+import threading
+import time
+from math import ceil
 
-from .utils import str2bool
+from . import column_cache, columnar_file, csv_parsing, data_types, decompression, expressions, instrumentation, \
+    parallel_loading, row_index
+from .utils import Range, read_headers
 
 
-def read_headers(filename):
-    with open(filename, 'r') as f:
-        plots = csv.reader(f, delimiter=',')
-        return [str(head).strip() for head in next(plots)]
+def select_columns(headers, columns):
+    # Return the indices (in file order) of the given column names. If no names are given, all columns are selected.
+    if columns is None:
+        return list(range(len(headers)))
+
+    for col in columns:
+        if col not in headers:
+            print(f'Column "{col}" does not exist in the input file!')
+    return [i for i, h in enumerate(headers) if h in columns]
+
+
+def get_dtype_overrides(config):
+    # Collect the data types which are explicitly configured for columns. The types of derived columns are applied
+    # to the results of their expressions instead.
+    overrides = {}
+    for subplot in config.subplots:
+        for col in subplot.columns:
+            if col.dtype is not None and col.expr is None:
+                overrides[col.name] = data_types.widen(overrides.get(col.name), data_types.get_dtype(col.dtype))
+    return overrides
+
+
+def get_needed_columns(config):
+    # Collect the names of all columns which are referenced by any subplot. Derived columns need the columns their
+    # expressions refer to.
+    columns = [config.x_column] if config.x_column is not None else []
+    for subplot in config.subplots:
+        for col in subplot.columns:
+            names = expressions.Expression(col.expr).columns if col.expr is not None else [col.name]
+            columns += [name for name in names if name not in columns]
+    return columns
 
 
 class CsvData(object):
     INITIAL_CAPACITY = 10000
+    PRINT_THRESHOLD = 1000000
+    # Rows parsed at once by the row based engine
+    ROW_BATCH_SIZE = 100000
 
-    def __init__(self, headers):
+    def __init__(self, headers, dtypes=None):
+        # Columns get the narrowest type able to hold their values and are widened as needed. dtypes optionally
+        # maps headers to fixed types, to which the values of these columns are converted instead.
         self.capacity = 0
         self.size = 0
         self.headers = headers
+        self.dtypes = dtypes if dtypes is not None else {}
+        # Explicit X values of the samples, None means the sample indices are used
+        self.x = None
 
         csv_data = {}
         for h in headers:
-            csv_data[h] = np.array([], dtype=np.float32)
+            csv_data[h] = np.array([], dtype=self.dtypes.get(h, np.float32))
         self.data = csv_data
 
     def __increase_capacity(self, incr):
         self.capacity += incr
         for h in self.headers:
             self.data[h] = np.concatenate(
-                (self.data[h], np.full(incr, None, dtype=np.float32)))
+                (self.data[h], np.zeros(incr, dtype=self.data[h].dtype)))
+
+    def __reserve(self, count):
+        # Grow the buffers by doubling their capacity until count additional rows fit
+        new_capacity = self.capacity if self.capacity != 0 else self.INITIAL_CAPACITY
+        while new_capacity < self.size + count:
+            new_capacity *= 2
+        if new_capacity > self.capacity:
+            self.__increase_capacity(new_capacity - self.capacity)
 
     def add_row(self, row):
-        if self.size >= self.capacity:
-            incr = self.capacity if self.capacity != 0 else self.INITIAL_CAPACITY
-            self.__increase_capacity(incr)
-
-        for idx, col in enumerate(row):
-            h = self.headers[idx]
-            val_str = col.strip()
-            val = None
-
-            # Try parsing the given entry
-            try:
-                val = 1 if str2bool(val_str) else 0
-            except ValueError:
-                pass
-            try:
-                val = float(val_str)
-                val = int(val_str)
-            except ValueError:
-                pass
-
-            if val is None:
-                print(f'Unsupported value type of "{val_str}"!')
-                return
-
-            self.data[h][self.size] = val
-
-        self.size += 1
+        columns, invalid = csv_parsing.parse_rows([row], len(self.headers))
+        if not invalid[0][0]:
+            self.add_columns(columns)
+
+    def __get_storage_dtype(self, h, col):
+        if h in self.dtypes:
+            return self.dtypes[h]
+        if self.size == 0:
+            # Nothing is stored yet, so the buffer may even be narrowed
+            return col.dtype
+        return data_types.get_common_dtype([self.data[h][:self.size], col])
+
+    def add_columns(self, columns):
+        # Append a block of rows given as one array per header
+        count = len(columns[0]) if len(columns) > 0 else 0
+        if count == 0:
+            return
+
+        self.__reserve(count)
+        for h, col in zip(self.headers, columns):
+            dtype = self.__get_storage_dtype(h, col)
+            if dtype != self.data[h].dtype:
+                self.data[h] = self.data[h].astype(dtype)
+            self.data[h][self.size:self.size+count] = col
+        self.size += count
+
+    def drop_front(self, count):
+        # Remove the first count rows while keeping the capacity
+        count = min(count, self.size)
+        if count <= 0:
+            return
+        for h in self.headers:
+            self.data[h][:self.size-count] = self.data[h][count:self.size]
+        self.size -= count
 
     def __repr__(self):
         return f'CsvData{{size={self.size!r}, capacity={self.capacity!r}, headers={self.headers!r}, data={self.data!r}}}'
 
     @classmethod
-    def from_file(cls, config):
-        print(f'Extract data from file: {config.input_file}')
+    def from_columns(cls, headers, columns, invalid, rows, rng, dtypes=None):
+        # Construct a data object from full length columns (e.g. memory mapped arrays) by slicing them according to
+        # the given range. invalid contains the sorted indices of rows with invalid values for each column.
+        # Only columns with a fixed type in dtypes (which differs from the one of the given column) are copied.
+        selected = rng.to_slice(rows)
+        start, end = selected.start, max(selected.start, selected.stop)
 
-        PRINT_THRESHOLD = 1000000
+        drop = np.unique(np.concatenate([np.array([], dtype=np.int64)] + list(invalid)))
+        drop = drop[(drop >= start) & (drop < end) & ((drop - start) % rng.divider == 0)]
+        drop = (drop - start) // rng.divider
 
-        data_obj = cls(read_headers(config.input_file))
-
-        with open(config.input_file, 'r') as f:
-            plots = csv.reader(f, delimiter=',')
-            for i, row in enumerate(plots):
-                if i == 0:
-                    # The header is already read.
-                    continue
+        data_obj = cls(headers, dtypes)
+        for h, col in zip(headers, columns):
+            col = col[start:end:rng.divider]
+            if len(drop) > 0:
+                col = np.delete(col, drop)
+            if h in data_obj.dtypes:
+                col = col.astype(data_obj.dtypes[h], copy=False)
+            data_obj.data[h] = col
+        data_obj.size = len(range(start, end, rng.divider)) - len(drop)
+        data_obj.capacity = data_obj.size
+        return data_obj
 
-                data_index = i-1
-                if data_index % PRINT_THRESHOLD == 0 and data_index != 0:
-                    print(f'{data_index} samples read')
+    @classmethod
+    def from_file(cls, config, columns=None, progress=None):
+        # If a list of column names is given, only these columns are parsed and stored.
+        # If given, progress is called with the partially filled data object after each parsed block of a CSV file.
+        print(f'Extract data from file: {config.input_file}')
 
-                # If the end of the region has reached, exit the loop
-                if data_index not in config.range:
-                    if config.range.end is not None and data_index >= config.range.end:
-                        break
-                    else:
-                        continue
+        with instrumentation.stage('read_headers'):
+            file_headers = read_headers(config.input_file)
+        column_indices = select_columns(file_headers, columns)
+        headers = [file_headers[i] for i in column_indices]
+        overrides = get_dtype_overrides(config)
 
-                data_obj.add_row(row)
+        with instrumentation.stage('load_data') as record:
+            if columnar_file.is_columnar_file(config.input_file):
+                data_obj = cls.__from_columnar_file(config, headers, overrides)
+                nr_of_bytes = 0
+            else:
+                data_obj, nr_of_bytes = cls.__from_csv_file(config, file_headers, column_indices, overrides,
+                                                            progress)
+            record['rows'] = data_obj.size
+            record['bytes'] = nr_of_bytes
 
         if data_obj.size == 0:
             print('No relevant samples stored!')
         else:
             print(f'Finished: {data_obj.size} samples read')
         return data_obj
+
+    @classmethod
+    def read_full_columns(cls, config, columns=None, rng=None):
+        # Parse all rows of the given columns of a CSV file (e.g. for converting it). Invalid values are kept and the
+        # sorted indices of their rows are returned per column, so the data indices stay the same as in the file.
+        # If a range is given, only its rows are parsed and the indices refer to the parsed rows.
+        # Returns the headers, the number of rows, the columns and the invalid row indices.
+        file_headers = read_headers(config.input_file)
+        column_indices = select_columns(file_headers, columns)
+        with decompression.open_binary(config.input_file) as f:
+            if b'"' in f.readline():
+                raise ValueError(f'Files with quoted headers like "{config.input_file}" are not supported!')
+            dtypes = csv_parsing.infer_dtypes(f, len(file_headers), column_indices)
+            if rng is None:
+                rng, first_index = Range(), 0
+            else:
+                first_index = row_index.seek_to_row(f, config.input_file, rng.start, config.use_index)
+            rows, full_columns, invalid = cls.__parse_full_columns(
+                cls.__iter_blocks(f, config, rng, len(file_headers), column_indices, first_index, dtypes),
+                len(column_indices), first_index)
+        return [file_headers[i] for i in column_indices], rows, full_columns, invalid
+
+    @classmethod
+    def __from_csv_file(cls, config, file_headers, column_indices, overrides, progress=None):
+        # Returns the loaded data object and the number of parsed bytes
+        headers = [file_headers[i] for i in column_indices]
+        with decompression.open_binary(config.input_file) as f:
+            header_line = f.readline()
+            if not f.seekable() and (config.jobs > 1 or config.use_index):
+                print('Compressed files are always parsed serially and without row index!')
+            # Quoted headers hint at a CSV dialect with quoted (possibly multi-line) fields, which only the row based
+            # engine is able to handle.
+            quoted = b'"' in header_line
+
+            # The types inferred from the first rows serve as hints for parsing, explicitly configured types win
+            inferred = csv_parsing.infer_dtypes(f, len(file_headers), column_indices) if not quoted else \
+                [None] * len(headers)
+            hints = [overrides.get(h, dtype) for h, dtype in zip(headers, inferred)]
+
+            if quoted:
+                if config.use_cache:
+                    print('Caching is not supported for files with quoted headers!')
+                data_obj = cls(headers, overrides)
+                data_obj.__load_rows(f, config.range, len(file_headers), column_indices)
+                nr_of_bytes = f.tell() - len(header_line)
+            elif config.use_cache:
+                data_obj = cls.__from_cache(f, config, headers, len(file_headers), column_indices, inferred, overrides)
+                nr_of_bytes = 0
+            elif config.jobs > 1 and f.seekable() and not config.range.is_relative:
+                data_obj = cls(headers, overrides)
+                data_obj.__load_blocks(cls.__iter_blocks(f, config, config.range, len(file_headers), column_indices,
+                                                         dtypes=hints), progress=progress)
+                nr_of_bytes = os.fstat(f.fileno()).st_size - len(header_line)
+            else:
+                data_obj = cls(headers, overrides)
+                first_index = row_index.seek_to_row(f, config.input_file, config.range.start, config.use_index)
+                start_offset = f.tell()
+                data_obj.__load_blocks(cls.__iter_blocks(f, config, config.range, len(file_headers), column_indices,
+                                                         first_index, hints), first_index, progress)
+                nr_of_bytes = f.tell() - start_offset
+
+            return data_obj, nr_of_bytes
+
+    @classmethod
+    def __from_columnar_file(cls, config, headers, overrides):
+        # Columnar files are memory mapped, so only the selected rows of the selected columns are ever read
+        if config.use_cache or config.use_index or config.jobs > 1:
+            print('Columnar files are memory mapped, caching, row index and parallel parsing are not used!')
+        container = columnar_file.ColumnarFile(config.input_file)
+        loaded = [container.load_column(h) for h in headers]
+        return cls.from_columns(headers, [col for col, _ in loaded], [inv for _, inv in loaded], container.rows,
+                                config.range, overrides)
+
+    @classmethod
+    def __from_cache(cls, f, config, headers, nr_of_columns, column_indices, inferred, overrides):
+        # The cache stores the inferred types, configured types are only applied to the loaded data object
+        cache = column_cache.ColumnCache(config.input_file)
+
+        missing = [(h, idx, dtype) for h, idx, dtype in zip(headers, column_indices, inferred)
+                   if not cache.has_column(h)]
+        if len(missing) > 0:
+            print(f'Store {len(missing)} columns in cache {cache.entry_dir}')
+            rows, columns, invalid = cls.__parse_full_columns(
+                cls.__iter_blocks(f, config, Range(), nr_of_columns, [idx for _, idx, _ in missing],
+                                  dtypes=[dtype for _, _, dtype in missing]), len(missing))
+            cache.store_columns(rows, [h for h, _, _ in missing], columns, invalid)
+        else:
+            print(f'Load columns from cache {cache.entry_dir}')
+            cache.touch()
+
+        cached = [cache.load_column(h) for h in headers]
+        return cls.from_columns(headers, [col for col, _ in cached], [inv for _, inv in cached], cache.rows,
+                                config.range, overrides)
+
+    @classmethod
+    def __iter_blocks(cls, f, config, rng, nr_of_columns, column_indices, first_index=0, dtypes=None):
+        # Select between serial and parallel parsing of the file. Parallel parsing needs random access to the file and
+        # absolute row numbers.
+        if config.jobs > 1 and f.seekable() and not rng.is_relative:
+            return parallel_loading.iter_column_blocks(config.input_file, rng, nr_of_columns, column_indices,
+                                                       config.jobs, dtypes)
+        return csv_parsing.iter_column_blocks(f, rng, nr_of_columns, column_indices, first_index, dtypes)
+
+    @classmethod
+    def __parse_full_columns(cls, column_blocks, nr_of_columns, first_index=0):
+        # Parse all rows of the given columns. Invalid values are kept and their row indices are returned.
+        blocks = [[] for _ in range(nr_of_columns)]
+        invalid = [[np.array([], dtype=np.int64)] for _ in range(nr_of_columns)]
+        rows = 0
+        data_index = first_index
+        for columns, column_invalid, next_index in column_blocks:
+            # Without any columns each row of the blocks counts, since the whole file is parsed in that case
+            block_rows = len(columns[0]) if len(columns) > 0 else next_index - data_index
+            for i, col in enumerate(columns):
+                blocks[i].append(col)
+                invalid[i].append(np.flatnonzero(column_invalid[i]) + rows)
+            cls.__print_progress(rows, rows + block_rows)
+            rows += block_rows
+            data_index = next_index
+
+        return rows, [data_types.concatenate(b) for b in blocks], [np.concatenate(i) for i in invalid]
+
+    @classmethod
+    def __print_progress(cls, prev_index, next_index):
+        if next_index // cls.PRINT_THRESHOLD != prev_index // cls.PRINT_THRESHOLD:
+            print(f'{next_index // cls.PRINT_THRESHOLD * cls.PRINT_THRESHOLD} samples read')
+
+    def __load_rows(self, f, rng, nr_of_columns, column_indices):
+        text = io.TextIOWrapper(f)
+        plots = csv.reader(text, delimiter=',')
+        if rng.is_relative:
+            # Rows may span several lines, so the last rows are only known after reading all of them
+            tail = collections.deque(plots, maxlen=-rng.start)
+            plots = [row for data_index, row in enumerate(tail, -len(tail)) if data_index in rng]
+            rng = Range()
+        rows = []
+        # The header is already read.
+        for data_index, row in enumerate(plots):
+            if data_index % self.PRINT_THRESHOLD == 0 and data_index != 0:
+                print(f'{data_index} samples read')
+
+            # If the end of the region has reached, exit the loop
+            if data_index not in rng:
+                if rng.end is not None and data_index >= rng.end:
+                    break
+                else:
+                    continue
+
+            rows.append(row)
+            if len(rows) == self.ROW_BATCH_SIZE:
+                self.__add_rows(rows, nr_of_columns, column_indices)
+                rows = []
+        self.__add_rows(rows, nr_of_columns, column_indices)
+
+        # Keep the binary file object open for the caller
+        text.detach()
+
+    def __add_rows(self, rows, nr_of_columns, column_indices):
+        hints = [self.data[h].dtype if self.size > 0 else None for h in self.headers]
+        columns, invalid = csv_parsing.parse_rows(rows, nr_of_columns, column_indices, hints)
+        drop = csv_parsing.combine_invalid(invalid, len(rows))
+        if drop.any():
+            columns = [col[~drop] for col in columns]
+        self.add_columns(columns)
+
+    def __load_blocks(self, column_blocks, first_index=0, progress=None):
+        # The progress refers to the number of rows read, since the data indices of ranges relative to the end of
+        # the file are negative
+        rows_read = 0
+        data_index = first_index
+        for columns, invalid, next_index in column_blocks:
+            drop = csv_parsing.combine_invalid(invalid, len(columns[0]) if len(columns) > 0 else 0)
+            if drop.any():
+                columns = [col[~drop] for col in columns]
+            self.add_columns(columns)
+            if progress is not None:
+                progress(self)
+
+            self.__print_progress(rows_read, rows_read + next_index - data_index)
+            rows_read += next_index - data_index
+            data_index = next_index
+
+
+class CsvFollower(object):
+    # Keeps track of a CSV file which is still being written and appends newly completed rows to a data object.
+    # If a window is given, only the last window samples are kept.
+
+    def __init__(self, config, columns=None, window=None):
+        self.input_file = config.input_file
+        self.range = config.range
+        self.window = window
+
+        if decompression.is_compressed(self.input_file):
+            raise ValueError(f'Following the compressed file "{self.input_file}" is not supported!')
+        if columnar_file.is_columnar_file(self.input_file):
+            raise ValueError(f'Following the columnar file "{self.input_file}" is not supported!')
+
+        file_headers = read_headers(self.input_file)
+        self.nr_of_columns = len(file_headers)
+        self.column_indices = select_columns(file_headers, columns)
+        headers = [file_headers[i] for i in self.column_indices]
+        overrides = get_dtype_overrides(config)
+        self.data_obj = CsvData(headers, overrides)
+        # Type hints for parsing, the types of all other columns are derived from the rows read so far
+        self.dtypes = [overrides.get(h) for h in headers]
+
+        # Data index of the next row in the file and data index of the first stored row. Ranges relative to the end
+        # of the file start at the last rows written so far.
+        with open(self.input_file, 'rb') as f:
+            f.readline()
+            self.next_index = row_index.seek_to_tail(f, -self.range.start) if self.range.is_relative else 0
+            self.offset = f.tell()
+        self.first_index = None
+        self.finished = False
+
+    @property
+    def data_range(self):
+        # The range of data indices covered by the stored samples
+        start = self.first_index if self.first_index is not None else self.range.start
+        return Range(start, None, self.range.divider)
+
+    def poll(self):
+        # Read all rows completed since the last call. Returns the number of added samples.
+        if self.finished:
+            return 0
+
+        added = 0
+        with open(self.input_file, 'rb') as f:
+            f.seek(self.offset)
+            for lines, nr_of_bytes in csv_parsing.iter_complete_line_blocks(f):
+                self.offset += nr_of_bytes
+                selected, self.finished = csv_parsing.select_lines(lines, self.next_index, self.range)
+                if len(selected) > 0 and self.first_index is None:
+                    self.first_index = self.__first_selected_index()
+                self.next_index += len(lines)
+
+                columns, invalid = csv_parsing.parse_lines(selected, self.nr_of_columns, self.column_indices,
+                                                           self.__get_dtype_hints())
+                drop = csv_parsing.combine_invalid(invalid, len(selected))
+                if drop.any():
+                    columns = [col[~drop] for col in columns]
+                self.data_obj.add_columns(columns)
+                added += len(selected) - int(np.count_nonzero(drop))
+
+                self.__apply_window()
+                if self.finished:
+                    break
+        return added
+
+    def __get_dtype_hints(self):
+        if self.data_obj.size == 0:
+            return self.dtypes
+        return [hint if hint is not None else self.data_obj.data[h].dtype
+                for h, hint in zip(self.data_obj.headers, self.dtypes)]
+
+    def __first_selected_index(self):
+        start = self.range.start if self.range.start is not None else 0
+        start = max(start, self.next_index)
+        return int(ceil(float(start) / self.range.divider) * self.range.divider)
+
+    def __apply_window(self):
+        if self.window is None or self.data_obj.size <= self.window:
+            return
+        count = self.data_obj.size - self.window
+        self.data_obj.drop_front(count)
+        self.first_index += count * self.range.divider
+
+
+class ProgressiveLoader(object):
+    # Loads a data object in a background thread. While loading, snapshots of the rows loaded so far are published
+    # in intervals of at least PUBLISH_INTERVAL seconds. Snapshots only contain every nth row, so they consist of at
+    # most SNAPSHOT_SAMPLES samples and are cheap to create and plot. Their X values are stored in the data objects.
+    SNAPSHOT_SAMPLES = 200000
+    PUBLISH_INTERVAL = 0.5
+
+    def __init__(self, config, columns=None):
+        self.config = config
+        self.columns = columns
+        # Most recently polled snapshot
+        self.data_obj = None
+        # Completely loaded data object resp. the exception raised while loading, once finished is set
+        self.result = None
+        self.error = None
+        self.finished = False
+
+        self.__lock = threading.Lock()
+        self.__snapshot = None
+        self.__published = threading.Event()
+        self.__last_publish = None
+        self.__thread = threading.Thread(target=self.__load, daemon=True)
+
+    def start(self):
+        # Start loading and wait until either the first snapshot is published or loading has finished
+        self.__thread.start()
+        self.__published.wait()
+        self.poll()
+
+    def poll(self):
+        # Take over the latest published snapshot. Returns its number of samples or 0 if there is no new one.
+        with self.__lock:
+            snapshot, self.__snapshot = self.__snapshot, None
+        if snapshot is None:
+            return 0
+        self.data_obj = snapshot
+        return snapshot.size
+
+    def __load(self):
+        try:
+            self.result = CsvData.from_file(self.config, self.columns, self.__publish)
+        except Exception as ex:
+            self.error = ex
+        self.finished = True
+        self.__published.set()
+
+    def __publish(self, data_obj):
+        now = time.monotonic()
+        if self.__last_publish is not None and now - self.__last_publish < self.PUBLISH_INTERVAL:
+            return
+        self.__last_publish = now
+
+        # The data object keeps growing, so the snapshot has to copy the selected rows
+        stride = max(int(ceil(data_obj.size / self.SNAPSHOT_SAMPLES)), 1)
+        snapshot = CsvData(data_obj.headers, data_obj.dtypes)
+        for h in data_obj.headers:
+            snapshot.data[h] = data_obj.data[h][:data_obj.size:stride].copy()
+        snapshot.size = snapshot.capacity = len(range(0, data_obj.size, stride))
+
+        # Same X values as plotted for the completely loaded data object
+        rng = self.config.range
+        start = int(ceil(float(rng.start if rng.start is not None else 0) / rng.divider) * rng.divider)
+        snapshot.x = np.arange(start, start + data_obj.size * rng.divider, rng.divider * stride)
+
+        with self.__lock:
+            self.__snapshot = snapshot
+        self.__published.set()
@@ -0,0 +1,319 @@
+import csv
+from itertools import repeat
+from math import ceil
+
+import numpy as np
+
+from . import data_types
+from .utils import str2bool
+
+
+BLOCK_SIZE = 16 * 1024 * 1024
+# Number of bytes at the start of the data used to infer the column types
+SAMPLE_SIZE = 1024 * 1024
+
+
+#
+# Per-cell parsing (used as fallback for rows the block engine cannot handle)
+#
+
+def parse_value(val_str):
+    # Booleans are stored as 1/0, everything else has to be a valid float (which includes integers).
+    # None is returned for unsupported values.
+    try:
+        return 1 if str2bool(val_str) else 0
+    except ValueError:
+        pass
+    try:
+        return float(val_str)
+    except ValueError:
+        return None
+
+
+def parse_row(row, nr_of_columns, column_indices=None):
+    # Returns a list of values (one per entry of column_indices, or per column if no indices are given) with missing
+    # cells filled with NaN, or None if the row is invalid. Columns which are not selected are not parsed at all.
+    if len(row) > nr_of_columns:
+        print(f'Row contains {len(row)} values but only {nr_of_columns} headers exist!')
+        return None
+    if column_indices is None:
+        column_indices = range(nr_of_columns)
+
+    values = [float('nan')] * len(column_indices)
+    for i, idx in enumerate(column_indices):
+        if idx >= len(row):
+            continue
+        val_str = row[idx].strip()
+        val = parse_value(val_str)
+        if val is None:
+            print(f'Unsupported value type of "{val_str}"!')
+            return None
+        values[i] = val
+    return values
+
+
+#
+# Vectorized block parsing
+#
+
+def __convert_ints(values, hint):
+    try:
+        return data_types.fit_ints(values.astype(np.int64), hint)
+    except (ValueError, OverflowError):
+        return None
+
+
+def __convert_floats(values, hint):
+    try:
+        return data_types.fit_floats(values.astype(np.float64), hint)
+    except ValueError:
+        return None
+
+
+def __convert_bools(values, hint):
+    # Boolean columns only contain a few distinct strings, so only those have to be parsed
+    uniques, inverse = np.unique(values, return_inverse=True)
+    try:
+        mapped = np.array([str2bool(u.strip()) for u in uniques], dtype=bool)
+    except ValueError:
+        return None
+    return data_types.fit_bools(mapped[inverse.ravel()], hint)
+
+
+def __convert_vectorized(values, hint):
+    # Convert an array of strings in one go. The conversions are tried in the order suggested by the hinted type.
+    # Returns None if no conversion is able to handle all values.
+    if hint is None or hint.kind == 'i':
+        converters = (__convert_ints, __convert_floats, __convert_bools)
+    elif hint.kind == 'b':
+        converters = (__convert_bools, __convert_ints, __convert_floats)
+    else:
+        converters = (__convert_floats, __convert_bools)
+
+    for convert in converters:
+        result = convert(values, hint)
+        if result is not None:
+            return result
+    return None
+
+
+def __convert_column(values, hint=None):
+    # Convert a list of strings to an array of (at least) the hinted type in one go. Only if that fails (i.e. because
+    # of invalid values) the column is converted cell by cell. Invalid cells are marked in the returned mask.
+    invalid = np.zeros(len(values), dtype=bool)
+    result = __convert_vectorized(np.array(values), hint)
+    if result is not None:
+        return result, invalid
+
+    result = np.empty(len(values), dtype=np.float64)
+    for i, val_str in enumerate(values):
+        val_str = val_str.strip()
+        val = parse_value(val_str)
+        if val is None:
+            print(f'Unsupported value type of "{val_str}"!')
+            invalid[i] = True
+            val = float('nan')
+        result[i] = val
+    return data_types.fit_values(result, hint, invalid), invalid
+
+
+def __parse_regular_lines(lines, nr_of_columns, column_indices, dtypes):
+    # All lines are expected to contain exactly nr_of_columns fields.
+    fields = ','.join(lines).split(',')
+    columns = []
+    invalid = []
+    for c, hint in zip(column_indices, dtypes):
+        column, column_invalid = __convert_column(fields[c::nr_of_columns], hint)
+        columns.append(column)
+        invalid.append(column_invalid)
+    return columns, invalid
+
+
+def __parse_irregular_lines(lines, nr_of_columns, column_indices, dtypes):
+    return parse_rows(list(csv.reader(lines, delimiter=',')), nr_of_columns, column_indices, dtypes)
+
+
+def parse_rows(rows, nr_of_columns, column_indices=None, dtypes=None):
+    # Parse a list of already split rows cell by cell. An invalid row invalidates the values of all columns.
+    if column_indices is None:
+        column_indices = range(nr_of_columns)
+    if dtypes is None:
+        dtypes = [None] * len(column_indices)
+
+    columns = np.full((len(column_indices), len(rows)), np.nan, dtype=np.float64)
+    invalid = np.zeros(len(rows), dtype=bool)
+    for i, row in enumerate(rows):
+        values = parse_row(row, nr_of_columns, column_indices)
+        if values is None:
+            invalid[i] = True
+        else:
+            columns[:, i] = values
+    return [data_types.fit_values(column, hint, invalid) for column, hint in zip(columns, dtypes)], \
+        [invalid.copy() for _ in column_indices]
+
+
+def parse_lines(lines, nr_of_columns, column_indices=None, dtypes=None):
+    # Parse a list of CSV lines into one array per selected column (all columns if column_indices is None).
+    # dtypes optionally contains a type hint per selected column. The arrays get the narrowest type able to hold their
+    # values, but at least the hinted one.
+    # Returns the column arrays and for each column a mask of the rows which contain an invalid value. Such rows are
+    # expected to be dropped.
+    if column_indices is None:
+        column_indices = range(nr_of_columns)
+    if dtypes is None:
+        dtypes = [None] * len(column_indices)
+    if len(lines) == 0:
+        return [np.array([], dtype=hint if hint is not None else np.float64) for hint in dtypes], \
+            [np.array([], dtype=bool) for _ in column_indices]
+
+    if any('"' in line for line in lines):
+        # Quoted fields need the full CSV dialect, so leave the whole block to the csv module.
+        return __parse_irregular_lines(lines, nr_of_columns, column_indices, dtypes)
+
+    field_counts = np.fromiter(map(str.count, lines, repeat(',')), dtype=np.int64, count=len(lines)) + 1
+    regular = field_counts == nr_of_columns
+    if '' in lines:
+        # Empty lines are rows of missing cells (NaN), even if a single field per line is expected
+        regular &= np.fromiter(map(len, lines), dtype=np.int64, count=len(lines)) > 0
+    if regular.all():
+        return __parse_regular_lines(lines, nr_of_columns, column_indices, dtypes)
+
+    # Rows with a differing number of fields (e.g. empty lines) are parsed one by one.
+    parts = []
+    for mask, parse in ((regular, __parse_regular_lines), (~regular, __parse_irregular_lines)):
+        indices = np.flatnonzero(mask)
+        if len(indices) > 0:
+            parts.append((indices, *parse([lines[i] for i in indices], nr_of_columns, column_indices, dtypes)))
+
+    columns = []
+    invalid = []
+    for c in range(len(column_indices)):
+        column = np.empty(len(lines), dtype=data_types.get_common_dtype([part[1][c] for part in parts]))
+        column_invalid = np.empty(len(lines), dtype=bool)
+        for indices, part_columns, part_invalid in parts:
+            column[indices] = part_columns[c]
+            column_invalid[indices] = part_invalid[c]
+        columns.append(column)
+        invalid.append(column_invalid)
+    return columns, invalid
+
+
+def __peek(f, size):
+    # Read bytes without consuming them. Streams which are not seekable (e.g. decompressed ones) are only able to
+    # return the bytes they have buffered.
+    if f.seekable():
+        pos = f.tell()
+        raw = f.read(size)
+        f.seek(pos)
+        return raw
+    return f.peek(size)[:size]
+
+
+def infer_dtypes(f, nr_of_columns, column_indices=None, sample_size=SAMPLE_SIZE):
+    # Infer the type of each selected column from a sample of the rows at the current position of a binary file
+    # object. Columns without a clear type (e.g. due to invalid values) get None. The file position is not changed.
+    if column_indices is None:
+        column_indices = range(nr_of_columns)
+
+    raw = __peek(f, sample_size)
+    if len(raw) == sample_size:
+        raw = raw[:max(raw.rfind(b'\n'), 0)]
+    lines = [line for line in __decode_lines(raw.rstrip(b'\r\n'))
+             if '"' not in line and line.count(',') + 1 == nr_of_columns]
+    if len(lines) == 0:
+        return [None] * len(column_indices)
+
+    # Only the sample rows which are regular are used, since the other ones are parsed cell by cell anyway
+    fields = ','.join(lines).split(',')
+    dtypes = []
+    for c in column_indices:
+        column = __convert_vectorized(np.array(fields[c::nr_of_columns]), None)
+        dtypes.append(column.dtype if column is not None else None)
+    return dtypes
+
+
+def combine_invalid(invalid, size):
+    # Merge the per column masks of invalid values into one mask of rows to drop
+    combined = np.zeros(size, dtype=bool)
+    for column_invalid in invalid:
+        combined |= column_invalid
+    return combined
+
+
+#
+# Block reading
+#
+
+def __iter_raw_blocks(f, block_size):
+    # Read a binary file object in large blocks and split them at the last newline character. Yields the raw bytes of
+    # the complete lines (without the final newline) and whether they are complete. Only a trailing line without a
+    # newline character is incomplete.
+    remainder = b''
+    while True:
+        chunk = f.read(block_size)
+        if not chunk:
+            break
+        chunk = remainder + chunk
+        cut = chunk.rfind(b'\n')
+        if cut < 0:
+            remainder = chunk
+            continue
+        remainder = chunk[cut+1:]
+        yield chunk[:cut], True
+
+    if len(remainder) > 0:
+        yield remainder, False
+
+
+def iter_line_blocks(f, block_size=BLOCK_SIZE):
+    # Yield the lines of each block of a binary file object. A trailing line without a newline is returned as well.
+    for raw, _ in __iter_raw_blocks(f, block_size):
+        yield __decode_lines(raw)
+
+
+def iter_complete_line_blocks(f, block_size=BLOCK_SIZE):
+    # Yield the complete lines of each block together with the number of bytes they occupy in the file.
+    # A trailing line without a newline is not returned, since it might still be written.
+    for raw, complete in __iter_raw_blocks(f, block_size):
+        if complete:
+            yield __decode_lines(raw), len(raw) + 1
+
+
+def __decode_lines(raw):
+    text = raw.decode('utf-8')
+    if '\r' in text:
+        text = text.replace('\r\n', '\n')
+    return text.split('\n')
+
+
+def select_lines(lines, first_index, rng):
+    # Return the lines of a block (whose first line has the data index first_index) that lie in the given range.
+    # The second return value signals that the end of the range has been passed.
+    start = rng.start if rng.start is not None else 0
+    start = max(start, first_index)
+    start = int(ceil(float(start) / rng.divider) * rng.divider)
+
+    stop = first_index + len(lines)
+    finished = False
+    if rng.end is not None and rng.end <= stop:
+        stop = rng.end
+        finished = True
+
+    if start >= stop:
+        return [], finished
+    return lines[start-first_index:stop-first_index:rng.divider], finished
+
+
+def iter_column_blocks(f, rng, nr_of_columns, column_indices=None, first_index=0, dtypes=None):
+    # Parse all rows of a binary file object which lie in the given range. The file object has to be positioned at the
+    # start of the row with the data index first_index. dtypes contains optional type hints of the selected columns.
+    # Yields the parsed columns and invalid masks of each block together with the data index following the block.
+    data_index = first_index
+    for lines in iter_line_blocks(f):
+        selected, finished = select_lines(lines, data_index, rng)
+        data_index += len(lines)
+        columns, invalid = parse_lines(selected, nr_of_columns, column_indices, dtypes)
+        yield columns, invalid, data_index
+
+        if finished:
+            break
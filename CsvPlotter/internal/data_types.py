@@ -0,0 +1,154 @@
+import numpy as np
+
+
+BOOL_DTYPE = np.dtype(np.bool_)
+INT_DTYPES = [np.dtype(t) for t in (np.int8, np.int16, np.int32, np.int64)]
+FLOAT_DTYPES = [np.dtype(t) for t in (np.float32, np.float64)]
+DTYPES = {str(dtype): dtype for dtype in [BOOL_DTYPE] + INT_DTYPES + FLOAT_DTYPES}
+
+# Integers of up to 24 bits are represented exactly by float32
+FLOAT32_EXACT_INT_BITS = 24
+# Number of distinguishable values float32 has to provide within the value range of a column. Otherwise (e.g. for
+# timestamps, whose range is tiny compared to their magnitude) the column is stored as float64.
+FLOAT32_MIN_LEVELS = 10**6
+
+
+#
+# Private helper functions
+#
+
+def _get_int_dtype(lo, hi):
+    # Narrowest integer type containing the given range
+    for dtype in INT_DTYPES:
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return dtype
+    return INT_DTYPES[-1]
+
+
+def _get_float_dtype_for_ints(values):
+    # Narrowest float type representing the given integers exactly
+    if len(values) == 0 or max(-int(values.min()), int(values.max())) <= 2**FLOAT32_EXACT_INT_BITS:
+        return FLOAT_DTYPES[0]
+    return FLOAT_DTYPES[1]
+
+
+def _fit_int_range(lo, hi, hint):
+    # Type for integers in the range [lo, hi]. A float hint is only widened as far as needed for the actual values.
+    if hint is not None and hint.kind == 'f':
+        return widen(hint, _get_float_dtype_for_ints(np.array([lo, hi])))
+    return widen(hint, _get_int_dtype(lo, hi))
+
+
+def _needs_float64(values, check_resolution=True):
+    # Check whether float32 does not cover the magnitude of the values or is too coarse for their range
+    values = values[np.isfinite(values)]
+    if len(values) == 0:
+        return False
+    lo, hi = values.min(), values.max()
+    magnitude = max(abs(lo), abs(hi))
+    if magnitude > np.finfo(np.float32).max:
+        return True
+    return check_resolution and magnitude * np.finfo(np.float32).eps * FLOAT32_MIN_LEVELS > hi - lo > 0
+
+
+def _has_inexact_ints(values):
+    # Integral values beyond 24 bits (e.g. counters next to a NaN or a decimal value) are only exact in float64
+    values = values[np.isfinite(values)]
+    ints = values[values == np.round(values)]
+    return len(ints) > 0 and _get_float_dtype_for_ints(ints) == FLOAT_DTYPES[1]
+
+
+#
+# Public functions
+#
+
+def get_dtype(name):
+    if name not in DTYPES:
+        raise ValueError(f'Unknown data type "{name}"! Valid types are: {", ".join(DTYPES)}')
+    return DTYPES[name]
+
+
+def widen(a, b):
+    # Return the narrowest supported type which is able to hold the values of both given types.
+    # None represents an unknown type. Without knowing the values, only integers of up to 16 bits are assumed to be
+    # represented exactly by float32.
+    if a is None or a == b:
+        return b
+    if b is None:
+        return a
+    if a.kind == 'b':
+        return b
+    if b.kind == 'b':
+        return a
+    if a.kind == b.kind:
+        return a if a.itemsize >= b.itemsize else b
+
+    # Mixing integers and floats: large integers are only exact in float64
+    int_dtype, float_dtype = (a, b) if a.kind == 'i' else (b, a)
+    if int_dtype.itemsize > 2:
+        return FLOAT_DTYPES[-1]
+    return float_dtype
+
+
+def fit_ints(values, hint=None):
+    # Convert an int64 array to the narrowest type holding its values (but at least to the hinted type)
+    if len(values) == 0:
+        return values.astype(widen(hint, INT_DTYPES[0]))
+    return values.astype(_fit_int_range(values.min(), values.max(), hint))
+
+
+def fit_floats(values, hint=None):
+    # Convert a float64 array to float32 if its resolution suffices. The needed resolution depends on the value range
+    # of the whole column, so it is only checked without a hint (i.e. when inferring the type from a sample).
+    # Integral values have to stay exact regardless of the hint.
+    dtype = FLOAT_DTYPES[1] if _needs_float64(values, check_resolution=hint is None) or _has_inexact_ints(values) \
+        else FLOAT_DTYPES[0]
+    return values.astype(widen(hint, dtype))
+
+
+def fit_bools(values, hint=None):
+    return values.astype(widen(hint, BOOL_DTYPE))
+
+
+def fit_values(values, hint=None, invalid=None):
+    # Convert a float64 array which may contain booleans (as 1/0) or integers to the narrowest fitting type.
+    # Values marked as invalid are ignored, since their rows are dropped anyway.
+    valid = values if invalid is None else values[~invalid]
+    if np.all(np.isfinite(valid)) and np.all(valid == np.round(valid)):
+        if hint is not None and hint.kind == 'b' and np.all((valid == 0) | (valid == 1)):
+            return np.where(np.isfinite(values), values, 0).astype(BOOL_DTYPE)
+        lo, hi = (valid.min(), valid.max()) if len(valid) > 0 else (0, 0)
+        if np.iinfo(np.int64).min <= lo and hi <= np.iinfo(np.int64).max:
+            return np.where(np.isfinite(values), values, 0).astype(_fit_int_range(lo, hi, hint))
+
+    return fit_floats(values, hint)
+
+
+def get_common_dtype(arrays, default=FLOAT_DTYPES[0]):
+    # Narrowest type able to hold the values of all given arrays. Empty arrays do not contain any values which have to
+    # fit. In contrast to widen(), integers are only converted to float64 if their values require it.
+    dtype = None
+    int_arrays = []
+    for array in arrays:
+        if len(array) == 0:
+            continue
+        if array.dtype.kind == 'i':
+            int_arrays.append(array)
+        else:
+            dtype = widen(dtype, array.dtype)
+
+    for array in int_arrays:
+        if dtype is not None and dtype.kind == 'f':
+            dtype = widen(dtype, _get_float_dtype_for_ints(array))
+        else:
+            dtype = widen(dtype, array.dtype)
+    return dtype if dtype is not None else default
+
+
+def concatenate(arrays, default=FLOAT_DTYPES[0]):
+    # Concatenate arrays of possibly different types using their common type
+    dtype = get_common_dtype(arrays, default)
+    if len(arrays) == 0:
+        return np.array([], dtype=dtype)
+    return np.concatenate([array.astype(dtype, copy=False) for array in arrays])
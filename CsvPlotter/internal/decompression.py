@@ -0,0 +1,161 @@
+import bz2
+import gzip
+import io
+import lzma
+import queue
+import threading
+
+from .utils import COMPRESSION_MAGICS
+
+try:
+    import zstandard
+except ImportError:
+    # Optional dependency, which is only needed for zstd compressed files
+    zstandard = None
+
+
+# Size of the blocks decompressed by the background thread and the number of blocks it may be ahead of the consumer
+BLOCK_SIZE = 1024 * 1024
+QUEUE_SIZE = 8
+# Buffer of the returned stream, which limits the number of bytes that can be peeked at
+BUFFER_SIZE = 1024 * 1024
+
+# Files which have already been reported for a misleading extension
+_warned_files = set()
+
+
+#
+# Private helper functions
+#
+
+def _open_zstd(filename):
+    if zstandard is None:
+        raise ValueError(f'Reading the zstd compressed file "{filename}" requires the "zstandard" package!')
+    return zstandard.ZstdDecompressor().stream_reader(open(filename, 'rb'), closefd=True)
+
+
+# Magic bytes, file extensions and opener (returning a binary stream of the decompressed data) of each format
+FORMATS = {
+    'gzip': (COMPRESSION_MAGICS['gzip'], ('.gz', '.gzip'), lambda filename: gzip.open(filename, 'rb')),
+    'bz2': (COMPRESSION_MAGICS['bz2'], ('.bz2',), lambda filename: bz2.open(filename, 'rb')),
+    'xz': (COMPRESSION_MAGICS['xz'], ('.xz', '.lzma'), lambda filename: lzma.open(filename, 'rb')),
+    'zstd': (COMPRESSION_MAGICS['zstd'], ('.zst', '.zstd'), _open_zstd),
+}
+
+
+class _BackgroundDecompressor(io.RawIOBase):
+    # Raw stream returning the data of another stream, which is read (i.e. decompressed) by a background thread. The
+    # decompression libraries release the GIL, so decompression overlaps with parsing in the consuming thread. The
+    # thread is at most QUEUE_SIZE blocks ahead of the consumer.
+
+    def __init__(self, stream, block_size=BLOCK_SIZE, queue_size=QUEUE_SIZE):
+        super().__init__()
+        self.stream = stream
+        self.block_size = block_size
+        self.blocks = queue.Queue(maxsize=queue_size)
+        self.pending = memoryview(b'')
+        self.position = 0
+        self.eof = False
+
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.__decompress, daemon=True)
+        self.thread.start()
+
+    def __decompress(self):
+        # An empty block marks the end of the data, errors are passed on to the consumer
+        try:
+            while not self.stopped.is_set():
+                block = self.stream.read(self.block_size)
+                self.__put(block)
+                if not block:
+                    break
+        except Exception as ex:
+            self.__put(ex)
+
+    def __put(self, item):
+        # Wait for free space in the queue, but give up as soon as the consumer closed the stream
+        while not self.stopped.is_set():
+            try:
+                self.blocks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        view = memoryview(buffer).cast('B')
+        count = 0
+        while count < len(view):
+            if len(self.pending) == 0:
+                if self.eof:
+                    break
+                block = self.blocks.get()
+                if isinstance(block, Exception):
+                    raise block
+                if not block:
+                    self.eof = True
+                    break
+                self.pending = memoryview(block)
+
+            n = min(len(self.pending), len(view) - count)
+            view[count:count+n] = self.pending[:n]
+            self.pending = self.pending[n:]
+            count += n
+
+        self.position += count
+        return count
+
+    def tell(self):
+        # Position in the decompressed data
+        return self.position
+
+    def close(self):
+        if not self.closed:
+            self.stopped.set()
+            self.thread.join()
+            self.stream.close()
+        super().close()
+
+
+#
+# Public functions
+#
+
+def detect_compression(filename):
+    # Return the name of the compression format of a file or None for uncompressed files. The magic bytes are
+    # decisive, a file extension which does not match them only results in a warning.
+    with open(filename, 'rb') as f:
+        head = f.read(max(len(magic) for magic, _, _ in FORMATS.values()))
+    for name, (magic, _, _) in FORMATS.items():
+        if head.startswith(magic):
+            return name
+    for name, (_, extensions, _) in FORMATS.items():
+        if filename.lower().endswith(extensions) and filename not in _warned_files:
+            _warned_files.add(filename)
+            print(f'File "{filename}" is not {name} compressed despite its extension, reading it uncompressed!')
+    return None
+
+
+def is_compressed(filename):
+    return detect_compression(filename) is not None
+
+
+def open_binary(filename):
+    # Open a (possibly compressed) file for reading its data in binary mode. Compressed files are decompressed by a
+    # background thread while being read. Such streams are not seekable and their position refers to the
+    # decompressed data.
+    compression = detect_compression(filename)
+    if compression is None:
+        return open(filename, 'rb')
+    return io.BufferedReader(_BackgroundDecompressor(FORMATS[compression][2](filename)), buffer_size=BUFFER_SIZE)
+
+
+def open_text(filename):
+    # Open a (possibly compressed) file in text mode. Compressed files are decompressed on demand, so reading only
+    # the first lines does not decompress the whole file.
+    compression = detect_compression(filename)
+    if compression is None:
+        return open(filename, 'r')
+    return io.TextIOWrapper(FORMATS[compression][2](filename))
@@ -0,0 +1,119 @@
+import numpy as np
+from matplotlib.colors import to_rgb
+
+
+# Instead of drawing each sample, the series of a density subplot are binned into a grid of the pixels of their axes.
+# Each series is drawn in its own color, whose opacity grows logarithmically with the number of samples in a pixel.
+# The series of an axis are blended into a single image, so render time and output size do not depend on the number
+# of samples.
+RENDER_MODES = ['lines', 'density']
+
+# Number of samples binned at once, which bounds the memory used for temporary arrays
+CHUNK_SIZE = 4 * 1024 * 1024
+# Opacity of pixels containing a single sample, so sparse samples stay visible next to dense ones
+MIN_ALPHA = 0.2
+
+
+#
+# Private helper functions
+#
+
+def _iter_chunks(x, y):
+    # Yield chunks of the X and Y values as float64 arrays. The X values may be a range of sample indices.
+    for start in range(0, len(y), CHUNK_SIZE):
+        end = min(start + CHUNK_SIZE, len(y))
+        x_chunk = x[start:end]
+        if isinstance(x_chunk, range):
+            x_chunk = np.arange(x_chunk.start, x_chunk.stop, x_chunk.step, dtype=np.float64)
+        yield np.asarray(x_chunk, dtype=np.float64), np.asarray(y[start:end], dtype=np.float64)
+
+
+def _widen(lo, hi, keep_lo=False, keep_hi=False):
+    # A grid needs an extent larger than zero, even if all values are equal. Bounds to keep are not moved.
+    if lo != hi:
+        return lo, hi
+    if keep_lo:
+        return lo, hi + 1.0
+    if keep_hi:
+        return lo - 1.0, hi
+    return lo - 0.5, hi + 0.5
+
+
+def _get_alpha(counts):
+    alpha = np.zeros(counts.shape, dtype=np.float64)
+    filled = counts > 0
+    if filled.any():
+        alpha[filled] = MIN_ALPHA + (1 - MIN_ALPHA) * np.log1p(counts[filled]) / np.log1p(counts.max())
+    return alpha
+
+
+#
+# Public functions
+#
+
+def get_extent(series, ylim):
+    # Return the ranges of X and Y values covered by all series, which are given as (x, y, color). The bounds of ylim
+    # replace the ones of the Y values if given. Returns None if no series contains a finite sample.
+    x_lo, x_hi, y_lo, y_hi = np.inf, -np.inf, np.inf, -np.inf
+    for x, y, _ in series:
+        for x_chunk, y_chunk in _iter_chunks(x, y):
+            valid = np.isfinite(x_chunk) & np.isfinite(y_chunk)
+            if not valid.any():
+                continue
+            x_lo, x_hi = min(x_lo, x_chunk[valid].min()), max(x_hi, x_chunk[valid].max())
+            y_lo, y_hi = min(y_lo, y_chunk[valid].min()), max(y_hi, y_chunk[valid].max())
+    if x_lo > x_hi:
+        return None
+
+    # An open bound must not cross the given one, even if all values lie beyond the given bound
+    if ylim.start is not None:
+        y_lo, y_hi = ylim.start, max(y_hi, ylim.start) if ylim.end is None else ylim.end
+    elif ylim.end is not None:
+        y_lo, y_hi = min(y_lo, ylim.end), ylim.end
+    return _widen(float(x_lo), float(x_hi)), \
+        _widen(float(y_lo), float(y_hi), ylim.start is not None, ylim.end is not None)
+
+
+def compute_counts(x, y, extent, width, height):
+    # Count the samples per pixel of a grid of width x height pixels covering the extent. Row 0 contains the lowest
+    # Y values. Samples outside of the extent or with NaN values are not counted.
+    (x0, x1), (y0, y1) = extent
+    counts = np.zeros(width * height, dtype=np.int64)
+    for x_chunk, y_chunk in _iter_chunks(x, y):
+        inside = (x_chunk >= x0) & (x_chunk <= x1) & (y_chunk >= y0) & (y_chunk <= y1)
+        cols = ((x_chunk[inside] - x0) * (width / (x1 - x0))).astype(np.intp)
+        rows = ((y_chunk[inside] - y0) * (height / (y1 - y0))).astype(np.intp)
+        # Values on the upper bounds belong to the last pixel
+        np.minimum(cols, width - 1, out=cols)
+        np.minimum(rows, height - 1, out=rows)
+        counts += np.bincount(rows * width + cols, minlength=width * height)
+    return counts.reshape(height, width)
+
+
+def compose_image(layers):
+    # Blend the counts of several series, given as (counts, color), into a single RGBA image. Later series are drawn
+    # on top of earlier ones like lines would be.
+    image = np.zeros(layers[0][0].shape + (4,), dtype=np.float64)
+    for counts, color in layers:
+        alpha = _get_alpha(counts)
+        # The colors are premultiplied by their opacity while blending
+        image[..., :3] = np.array(to_rgb(color)) * alpha[..., None] + image[..., :3] * (1 - alpha[..., None])
+        image[..., 3] = alpha + image[..., 3] * (1 - alpha)
+
+    covered = image[..., 3] > 0
+    image[covered, :3] /= image[covered, 3:]
+    return image
+
+
+def plot_density(axis, series, ylim):
+    # Draw the series, given as (x, y, color), as a single image at the pixel resolution of the axis. Returns the
+    # image or None if there is nothing to draw.
+    extent = get_extent(series, ylim)
+    if extent is None:
+        return None
+
+    width = max(int(round(axis.bbox.width)), 1)
+    height = max(int(round(axis.bbox.height)), 1)
+    image = compose_image([(compute_counts(x, y, extent, width, height), color) for x, y, color in series])
+    (x0, x1), (y0, y1) = extent
+    return axis.imshow(image, extent=(x0, x1, y0, y1), origin='lower', aspect='auto', interpolation='nearest')
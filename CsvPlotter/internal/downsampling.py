@@ -0,0 +1,89 @@
+import numpy as np
+
+
+#
+# Private helper functions
+#
+
+def _first_matches(y, values, edges):
+    # Return the index of the first element of each bucket which equals the value of its bucket. Buckets whose value
+    # is not found (i.e. NaN) are skipped.
+    matches = np.flatnonzero(y == np.repeat(values, np.diff(edges)))
+    buckets = np.searchsorted(edges, matches, side='right') - 1
+    _, first = np.unique(buckets, return_index=True)
+    return matches[first]
+
+
+#
+# Downsampling algorithms
+#
+
+def minmax(x, y, nr_of_points):
+    # Keep the minimum and the maximum of each bucket (in order of appearance), so that no peak gets lost.
+    # The buckets differ in size by at most one sample, so all of them are used.
+    nr_of_buckets = max(1, min(nr_of_points // 2, len(y)))
+    edges = np.unique(np.linspace(0, len(y), nr_of_buckets + 1).astype(np.int64))
+
+    # NaN values are never selected as extremes
+    min_idx = _first_matches(y, np.fmin.reduceat(y, edges[:-1]), edges)
+    max_idx = _first_matches(y, np.fmax.reduceat(y, edges[:-1]), edges)
+    indices = np.unique(np.concatenate((min_idx, max_idx)))
+    return x[indices], y[indices]
+
+
+def lttb(x, y, nr_of_points):
+    # Largest-Triangle-Three-Buckets: select the point of each bucket which spans the largest triangle with the point
+    # selected in the previous bucket and the average of the next bucket.
+    valid = np.isfinite(y)
+    if not valid.all():
+        x, y = x[valid], y[valid]
+    if nr_of_points < 3 or len(y) <= nr_of_points:
+        return x, y
+
+    x_f = x.astype(np.float64)
+    y_f = y.astype(np.float64)
+    edges = np.linspace(1, len(y) - 1, nr_of_points - 1).astype(np.int64)
+
+    # The averages of all buckets can be computed in advance
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x_f[:-1], edges[:-1]) / counts
+    avg_y = np.add.reduceat(y_f[:-1], edges[:-1]) / counts
+    avg_x = np.append(avg_x[1:], x_f[-1])
+    avg_y = np.append(avg_y[1:], y_f[-1])
+
+    indices = np.empty(nr_of_points, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = len(y) - 1
+    prev = 0
+    for b in range(nr_of_points - 2):
+        lo, hi = edges[b], edges[b+1]
+        area = np.abs((x_f[prev] - avg_x[b]) * (y_f[lo:hi] - y_f[prev]) -
+                      (x_f[prev] - x_f[lo:hi]) * (avg_y[b] - y_f[prev]))
+        prev = lo + int(np.argmax(area))
+        indices[b+1] = prev
+    return x[indices], y[indices]
+
+
+DOWNSAMPLING_METHODS = {
+    'none': None,
+    'minmax': minmax,
+    'lttb': lttb,
+}
+
+
+def get_points_per_pixel(method):
+    # The min/max algorithm needs two points per pixel column to draw the vertical extent of a pixel
+    return 2 if method == 'minmax' else 1
+
+
+def downsample(method, x, y, nr_of_pixels):
+    # Reduce the series to a number of points suitable to be drawn on nr_of_pixels pixel columns
+    if method not in DOWNSAMPLING_METHODS:
+        raise ValueError(f'Unknown downsampling method "{method}"! '
+                         f'Valid methods are: {", ".join(DOWNSAMPLING_METHODS)}')
+
+    func = DOWNSAMPLING_METHODS[method]
+    nr_of_points = int(nr_of_pixels) * get_points_per_pixel(method)
+    if func is None or len(y) <= nr_of_points:
+        return x, y
+    return func(np.asarray(x), np.asarray(y), nr_of_points)
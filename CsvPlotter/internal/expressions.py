@@ -0,0 +1,267 @@
+import ast
+import operator
+
+import numpy as np
+
+
+# Expressions of derived columns are parsed into a Python AST which is only allowed to contain the nodes below. Names
+# refer to columns, col('name') refers to columns whose names are no valid identifiers. All operations are applied to
+# whole arrays at once.
+#
+# Constants are turned into numpy scalars, so they are subject to the same (bounded) arithmetic as the columns.
+# Otherwise Python would calculate e.g. 10**10**10 with arbitrary precision before applying it to a column.
+
+
+def _power(base, exponent):
+    # numpy refuses to raise integers to negative integer powers and silently wraps around on overflow, so the base
+    # is promoted to float in both cases
+    if np.asarray(base).dtype.kind in 'biu' and np.asarray(exponent).dtype.kind in 'biu':
+        with np.errstate(over='ignore'):
+            largest = np.power(np.float64(np.max(np.abs(base), initial=0)), np.max(exponent, initial=0))
+        if np.any(exponent < 0) or largest > np.iinfo(np.int64).max:
+            base = np.asarray(base, dtype=np.float64)
+    return np.power(base, exponent)
+
+
+_BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: _power,
+}
+
+_UNARY_OPERATORS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+
+#
+# Functions available in expressions
+#
+
+def _diff(values):
+    # Difference to the previous sample, the first sample has no predecessor
+    result = np.empty(len(values), dtype=np.result_type(values.dtype, np.float32))
+    if len(values) > 0:
+        result[0] = np.nan
+        result[1:] = np.diff(values)
+    return result
+
+
+def _rolling_mean(values, window):
+    # Mean of the last window samples. Windows which are incomplete or contain NaN values result in NaN.
+    window = int(window)
+    if window < 1:
+        raise ValueError(f'The window of rolling_mean() has to be positive, but is {window}!')
+
+    result = np.full(len(values), np.nan)
+    if len(values) < window:
+        return result
+    values = values.astype(np.float64)
+    nan = np.isnan(values)
+    sums = np.concatenate(([0.0], np.cumsum(np.where(nan, 0.0, values))))
+    nan_counts = np.concatenate(([0], np.cumsum(nan)))
+    means = (sums[window:] - sums[:-window]) / window
+    means[nan_counts[window:] - nan_counts[:-window] > 0] = np.nan
+    result[window-1:] = means
+    return result
+
+
+# Functions operating on each sample independently
+_ELEMENTWISE_FUNCTIONS = {
+    'abs': np.abs,
+    'sqrt': np.sqrt,
+    'exp': np.exp,
+    'log': np.log,
+    'log10': np.log10,
+    'sin': np.sin,
+    'cos': np.cos,
+    'tan': np.tan,
+    'arcsin': np.arcsin,
+    'arccos': np.arccos,
+    'arctan': np.arctan,
+    'arctan2': np.arctan2,
+    'degrees': np.degrees,
+    'radians': np.radians,
+    'minimum': np.minimum,
+    'maximum': np.maximum,
+    'clip': np.clip,
+}
+
+# Functions depending on preceding samples as well
+_WINDOW_FUNCTIONS = {
+    'diff': _diff,
+    'cumsum': np.cumsum,
+    'rolling_mean': _rolling_mean,
+}
+
+FUNCTIONS = {**_ELEMENTWISE_FUNCTIONS, **_WINDOW_FUNCTIONS}
+
+
+#
+# Private helper functions
+#
+
+def _to_scalar(value):
+    # Integers which do not fit into 64 bits are approximated by a float like they would be in a column
+    if isinstance(value, int) and np.iinfo(np.int64).min <= value <= np.iinfo(np.int64).max:
+        return np.int64(value)
+    return np.float64(value)
+
+
+def _get_column_name(node):
+    # Return the column name a node refers to or None if it is no column reference
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == 'col':
+        return node.args[0].value
+    return None
+
+
+def _iter_column_names(node):
+    # Yield the names of all columns referenced in the (validated) subtree, but not the names of called functions
+    name = _get_column_name(node)
+    if name is not None:
+        yield name
+    elif isinstance(node, ast.Call):
+        for arg in node.args:
+            yield from _iter_column_names(arg)
+    else:
+        for child in ast.iter_child_nodes(node):
+            yield from _iter_column_names(child)
+
+
+def _validate(node, source):
+    # Raise a ValueError for all nodes which are not supported in expressions
+    def fail(reason):
+        raise ValueError(f'Invalid expression "{source}": {reason}!')
+
+    if isinstance(node, ast.Expression):
+        _validate(node.body, source)
+    elif isinstance(node, ast.BinOp):
+        if type(node.op) not in _BINARY_OPERATORS:
+            fail(f'operator "{type(node.op).__name__}" is not supported')
+        _validate(node.left, source)
+        _validate(node.right, source)
+    elif isinstance(node, ast.UnaryOp):
+        if type(node.op) not in _UNARY_OPERATORS:
+            fail(f'operator "{type(node.op).__name__}" is not supported')
+        _validate(node.operand, source)
+    elif isinstance(node, ast.Constant):
+        if not isinstance(node.value, (int, float)) or isinstance(node.value, bool):
+            fail(f'only numeric constants are supported, but "{node.value!r}" is given')
+    elif isinstance(node, ast.Name):
+        pass
+    elif isinstance(node, ast.Call):
+        if not isinstance(node.func, ast.Name):
+            fail('only functions given by name can be called')
+        if len(node.keywords) > 0:
+            fail(f'keyword arguments of "{node.func.id}" are not supported')
+        if node.func.id == 'col':
+            if len(node.args) != 1 or not isinstance(node.args[0], ast.Constant) or \
+                    not isinstance(node.args[0].value, str):
+                fail('col() expects the name of a column as string')
+            return
+        if node.func.id not in FUNCTIONS:
+            fail(f'unknown function "{node.func.id}", valid functions are: {", ".join(["col"] + list(FUNCTIONS))}')
+        for arg in node.args:
+            _validate(arg, source)
+    else:
+        fail(f'"{type(node).__name__}" is not supported')
+
+
+#
+# Public classes
+#
+
+class Expression(object):
+    # A validated expression of a derived column
+
+    def __init__(self, source):
+        self.source = source
+        try:
+            self.tree = ast.parse(source.strip(), mode='eval')
+        except SyntaxError as ex:
+            raise ValueError(f'Invalid expression "{source}": {ex.msg}!')
+        _validate(self.tree, source)
+
+    @property
+    def columns(self):
+        # Names of all columns the expression refers to, in order of their first appearance
+        names = []
+        for name in _iter_column_names(self.tree):
+            if name not in names:
+                names.append(name)
+        return names
+
+    @property
+    def is_elementwise(self):
+        # Elementwise expressions can be evaluated on arbitrary chunks of the samples
+        return not any(isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and
+                       node.func.id in _WINDOW_FUNCTIONS for node in ast.walk(self.tree))
+
+    def __repr__(self):
+        return f'Expression{{source={self.source!r}}}'
+
+
+class ExpressionEvaluator(object):
+    # Evaluates expressions on the columns of a data dictionary with size samples each. The results of all
+    # (sub)expressions are kept, so subexpressions shared between several expressions are only computed once.
+
+    def __init__(self, data, size):
+        self.data = data
+        self.size = size
+        self.results = {}
+
+    def evaluate(self, expression):
+        result = self.__evaluate(expression.tree.body, expression.source)
+        if np.ndim(result) == 0:
+            result = np.full(self.size, result, dtype=np.result_type(result, np.float32))
+        return result
+
+    def __load_column(self, name, source):
+        if name not in self.data:
+            raise ValueError(f'Column "{name}" of expression "{source}" does not exist in the input file!')
+        column = self.data[name][:self.size]
+        # Narrow integer (and boolean) columns would overflow easily, so calculations are done with 64 bits
+        if column.dtype.kind in 'bi':
+            column = column.astype(np.int64)
+        return column
+
+    def __evaluate(self, node, source):
+        if isinstance(node, ast.Constant):
+            return _to_scalar(node.value)
+
+        key = ast.dump(node)
+        if key in self.results:
+            return self.results[key]
+
+        name = _get_column_name(node)
+        if name is not None:
+            result = self.__load_column(name, source)
+        elif isinstance(node, ast.BinOp):
+            left, right = self.__evaluate(node.left, source), self.__evaluate(node.right, source)
+            result = self.__apply(_BINARY_OPERATORS[type(node.op)], source, left, right)
+        elif isinstance(node, ast.UnaryOp):
+            result = self.__apply(_UNARY_OPERATORS[type(node.op)], source, self.__evaluate(node.operand, source))
+        else:
+            args = [self.__evaluate(arg, source) for arg in node.args]
+            try:
+                result = FUNCTIONS[node.func.id](*args)
+            except TypeError as ex:
+                raise ValueError(f'Invalid call of "{node.func.id}" in expression "{source}": {ex}!')
+
+        self.results[key] = result
+        return result
+
+    @staticmethod
+    def __apply(operation, source, *operands):
+        # Errors of the numpy arithmetic (e.g. an integer overflow converting a huge float) refer to the expression
+        try:
+            return operation(*operands)
+        except (ArithmeticError, TypeError, ValueError) as ex:
+            raise ValueError(f'Failed to evaluate expression "{source}": {ex}!')
@@ -0,0 +1,99 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, where no memory statistics are recorded
+    resource = None
+
+
+#
+# Private helper functions
+#
+
+def _get_peak_rss_mb():
+    # High-water mark of the resident set size of the whole process (reported in KiB on Linux)
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _get_rss_mb():
+    # Current resident set size, which is only available on Linux
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024**2
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class Instrumentation(object):
+    # Records the wall time and memory usage of all executed stages in order of their completion. The memory a stage
+    # keeps is the growth of the resident set size during the stage. The high-water mark of the process only tells
+    # the largest memory usage up to the end of a stage, which all later stages repeat.
+
+    def __init__(self):
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name):
+        # Values can be attached to the yielded record. If 'rows' and 'bytes' are set, the throughput is calculated.
+        record = {'name': name}
+        start_rss = _get_rss_mb()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            end_rss = _get_rss_mb()
+            record['rss_growth_mb'] = end_rss - start_rss if start_rss is not None and end_rss is not None else None
+            record['process_peak_rss_mb'] = _get_peak_rss_mb()
+            if 'rows' in record:
+                seconds = max(record['seconds'], 1e-9)
+                record['rows_per_sec'] = record['rows'] / seconds
+                record['bytes_per_sec'] = record.get('bytes', 0) / seconds
+            self.stages.append(record)
+
+    def summary(self):
+        lines = ['Stage statistics:']
+        width = max([len(s['name']) for s in self.stages] + [5])
+        for s in self.stages:
+            line = f'  {s["name"]:{width}} : {s["seconds"]:9.3f} s'
+            if s['rss_growth_mb'] is not None:
+                line += f'  {s["rss_growth_mb"]:+9.1f} MB RSS growth'
+            if s['process_peak_rss_mb'] is not None:
+                line += f'  {s["process_peak_rss_mb"]:9.1f} MB process peak RSS'
+            if 'rows_per_sec' in s:
+                line += f'  {s["rows_per_sec"]:12.0f} rows/s  {s["bytes_per_sec"] / 1024**2:8.1f} MB/s'
+            lines.append(line)
+        return '\n'.join(lines)
+
+    def to_json(self, filename):
+        with open(filename, 'w') as f:
+            json.dump({'stages': self.stages}, f, indent=2)
+
+
+# All stages of an invocation are recorded in one global object
+_current = Instrumentation()
+
+
+#
+# Public functions
+#
+
+def reset():
+    global _current
+    _current = Instrumentation()
+    return _current
+
+
+def get_current():
+    return _current
+
+
+def stage(name):
+    # Context manager which records the given stage in the current instrumentation object
+    return _current.stage(name)
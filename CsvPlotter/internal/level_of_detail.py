@@ -0,0 +1,80 @@
+import numpy as np
+
+
+#
+# Private helper functions
+#
+
+def _aggregate(y, lo_idx, hi_idx, factor):
+    # Combine groups of factor buckets into one bucket by selecting the minimum of the minima and the maximum of the
+    # maxima. Buckets are represented by the indices of their extremes in the raw data.
+    nr_of_buckets = int(np.ceil(len(lo_idx) / factor))
+    pad = nr_of_buckets * factor - len(lo_idx)
+
+    def select(idx, fill, func):
+        values = np.append(y[idx].astype(np.float64), np.full(pad, np.nan))
+        values = np.where(np.isnan(values), fill, values).reshape(nr_of_buckets, factor)
+        idx = np.append(idx, np.full(pad, idx[-1])).reshape(nr_of_buckets, factor)
+        return idx[np.arange(nr_of_buckets), func(values, axis=1)]
+
+    return select(lo_idx, np.inf, np.argmin), select(hi_idx, -np.inf, np.argmax)
+
+
+#
+# Public classes
+#
+
+class LodPyramid(object):
+    # Min/max pyramid of a series. Level k aggregates FACTOR^k raw samples per bucket, each level is computed from the
+    # one below. Levels are built until a level contains less than min_buckets buckets.
+    FACTOR = 4
+
+    def __init__(self, x, y, min_buckets):
+        self.x = np.asarray(x)
+        self.y = np.asarray(y)
+        self.levels = []
+
+        lo_idx = hi_idx = np.arange(len(self.y))
+        while len(lo_idx) > min_buckets:
+            lo_idx, hi_idx = _aggregate(self.y, lo_idx, hi_idx, self.FACTOR)
+            self.levels.append((lo_idx, hi_idx))
+
+    def get_data(self, x_min, x_max, nr_of_pixels):
+        # Return the data of the finest level which shows the visible range with at most two points per pixel
+        if np.issubdtype(self.x.dtype, np.integer):
+            # Searching float limits would convert the whole X array to float first
+            x_min, x_max = self.x.dtype.type(np.ceil(x_min)), self.x.dtype.type(np.floor(x_max))
+        start = max(int(np.searchsorted(self.x, x_min, side='left')) - 1, 0)
+        end = min(int(np.searchsorted(self.x, x_max, side='right')) + 1, len(self.x))
+
+        if end - start <= 2 * nr_of_pixels or len(self.levels) == 0:
+            return self.x[start:end], self.y[start:end]
+
+        level = 1
+        while level < len(self.levels) and (end - start) / self.FACTOR**level > nr_of_pixels:
+            level += 1
+
+        bucket_size = self.FACTOR**level
+        lo_idx, hi_idx = self.levels[level-1]
+        first, last = start // bucket_size, -(-end // bucket_size)
+        indices = np.sort(np.stack((lo_idx[first:last], hi_idx[first:last]), axis=1), axis=1).ravel()
+        return self.x[indices], self.y[indices]
+
+
+class LodController(object):
+    # Swaps the data of the lines of an axis according to its visible X range whenever the X limits change
+
+    def __init__(self, axis):
+        self.axis = axis
+        self.lines = []
+        axis.callbacks.connect('xlim_changed', self.update)
+
+    def add_line(self, line, pyramid):
+        self.lines.append((line, pyramid))
+
+    def update(self, axis=None):
+        x_min, x_max = self.axis.get_xlim()
+        nr_of_pixels = self.axis.bbox.width
+        for line, pyramid in self.lines:
+            line.set_data(*pyramid.get_data(x_min, x_max, nr_of_pixels))
+        self.axis.figure.canvas.draw_idle()
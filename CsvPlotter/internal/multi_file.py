@@ -0,0 +1,210 @@
+import contextlib
+import copy
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from . import columnar_file, csv_parsing, data_types, decompression, row_index, value_index
+from .csv_handling import CsvData, get_dtype_overrides
+from .utils import Range, read_headers
+
+
+# Several input files are either concatenated in the given order (e.g. rotated logs), so their rows form a single
+# range of data indices, or overlaid (e.g. several runs of a measurement), so each file is plotted as separate series
+# of the same columns. The files are loaded by a pool of config.jobs processes.
+INPUT_MODES = ['concat', 'overlay']
+
+
+#
+# Private helper functions
+#
+
+def _create_executor(jobs, nr_of_files):
+    # Without multiple jobs, the files are loaded one after another by this process
+    if jobs <= 1 or nr_of_files <= 1:
+        return contextlib.nullcontext()
+    return ProcessPoolExecutor(max_workers=min(jobs, nr_of_files))
+
+
+def _map(executor, func, items):
+    return executor.map(func, items) if executor is not None else map(func, items)
+
+
+def _count_rows(filename):
+    if columnar_file.is_columnar_file(filename):
+        return columnar_file.ColumnarFile(filename).rows
+    return row_index.count_rows(filename)
+
+
+def _plan_parts(files, rng, executor):
+    # Determine the files which contain rows of the range over the concatenated rows of all files. Files which lie
+    # completely outside of the range are only counted, but not loaded. Returns the range with resolved bounds and the
+    # parts to load. A part consists of a file, the row to seek to (relative to the file as for
+    # row_index.seek_to_row()) and the data index the row sought to is relative to.
+    start, end = rng.start, rng.end
+    if rng.is_relative and (end is None or end < 0):
+        # The last rows are collected backwards from the last file, the data indices are negative
+        parts = []
+        base = 0
+        for filename in reversed(files):
+            if base <= start:
+                break
+            rows = row_index.count_last_rows(filename, base - start)
+            if end is None or base - rows < end:
+                parts.insert(0, (filename, -rows, base))
+            base -= rows
+        return Range(max(start, base), end, rng.divider), parts
+
+    if start in (None, 0) and end is None and rng.divider == 1:
+        # All rows are selected, so the data indices of the rows do not matter
+        return rng, [(filename, None, 0) for filename in files]
+
+    # The data index of the first row of each file is the number of rows of all preceding files. Negative bounds need
+    # the number of rows of the last file as well.
+    negative = (start is not None and start < 0) or (end is not None and end < 0)
+    counts = list(_map(executor, _count_rows, files if negative else files[:-1]))
+    if negative:
+        rows = sum(counts)
+        start = max(rows + start, 0) if start is not None and start < 0 else start
+        end = max(rows + end, 0) if end is not None and end < 0 else end
+
+    parts = []
+    first_index = 0
+    for k, filename in enumerate(files):
+        if end is not None and first_index >= end:
+            break
+        rows = counts[k] if k < len(counts) else None
+        if rows is None or start is None or first_index + rows > start:
+            parts.append((filename, start - first_index if start is not None and start > first_index else None,
+                          first_index))
+        if rows is not None:
+            first_index += rows
+    return Range(start, end, rng.divider), parts
+
+
+def _select_columnar_rows(filename, seek_row, base, rng, headers):
+    # Select the rows of the range out of a columnar file, whose first row has a data index depending on the part
+    container = columnar_file.ColumnarFile(filename)
+    first_index = base - container.rows if seek_row is not None and seek_row < 0 else base
+
+    start = first_index if rng.start is None else max(rng.start, first_index)
+    start = int(np.ceil(start / rng.divider)) * rng.divider
+    end = first_index + container.rows if rng.end is None else min(rng.end, first_index + container.rows)
+    selected = slice(start - first_index, max(start, end) - first_index, rng.divider)
+
+    loaded = [container.load_column(h) for h in headers]
+    drop = np.unique(np.concatenate([np.array([], dtype=np.int64)] + [inv for _, inv in loaded]))
+    drop = drop[(drop >= selected.start) & (drop < selected.stop) & ((drop - selected.start) % rng.divider == 0)]
+    drop = (drop - selected.start) // rng.divider
+    return [np.delete(col[selected], drop) for col, _ in loaded]
+
+
+def _load_part(task):
+    # Executed by the loading processes. Returns the selected rows of each column without rows with invalid values.
+    filename, seek_row, base, rng, headers, dtypes, use_index = task
+    if columnar_file.is_columnar_file(filename):
+        return _select_columnar_rows(filename, seek_row, base, rng, headers)
+
+    file_headers = read_headers(filename)
+    column_indices = [file_headers.index(h) for h in headers]
+    blocks = [[] for _ in headers]
+    with decompression.open_binary(filename) as f:
+        f.readline()
+        inferred = csv_parsing.infer_dtypes(f, len(file_headers), column_indices)
+        hints = [dtype if dtype is not None else hint for dtype, hint in zip(dtypes, inferred)]
+        first_index = base + row_index.seek_to_row(f, filename, seek_row, use_index)
+        for columns, invalid, _ in csv_parsing.iter_column_blocks(f, rng, len(file_headers), column_indices,
+                                                                  first_index, hints):
+            drop = csv_parsing.combine_invalid(invalid, len(columns[0]) if len(columns) > 0 else 0)
+            for i, col in enumerate(columns):
+                blocks[i].append(col[~drop] if drop.any() else col)
+    return [data_types.concatenate(b) for b in blocks]
+
+
+def _load_run(task):
+    # Executed by the loading processes. Only the samples are transferred back, not the spare capacity.
+    config, columns = task
+    data_obj = CsvData.from_file(config, columns)
+    for h in data_obj.headers:
+        data_obj.data[h] = data_obj.data[h][:data_obj.size]
+    data_obj.capacity = data_obj.size
+    return data_obj
+
+
+def _get_labels(files):
+    # Runs are labeled by the names of their files, unless these are ambiguous
+    names = [os.path.basename(f) for f in files]
+    return names if len(set(names)) == len(names) else files
+
+
+#
+# Public classes and functions
+#
+
+class OverlayData(object):
+    # Several runs plotted on top of each other. Each run consists of its label, the config it has been loaded with
+    # (which contains the range of its rows) and its data object.
+
+    def __init__(self, runs):
+        self.runs = runs
+
+    @property
+    def size(self):
+        return sum(data_obj.size for _, _, data_obj in self.runs)
+
+    def __repr__(self):
+        return f'OverlayData{{runs={[(label, data_obj.size) for label, _, data_obj in self.runs]!r}}}'
+
+
+def check_headers(files, columns, mode):
+    # Concatenated files have to consist of the same columns, overlaid files have to contain all plotted columns
+    if mode not in INPUT_MODES:
+        raise ValueError(f'Unknown input mode "{mode}", valid modes are: {", ".join(INPUT_MODES)}')
+
+    first_headers = read_headers(files[0])
+    for filename in files:
+        headers = read_headers(filename)
+        if mode == 'concat' and headers != first_headers:
+            raise ValueError(f'The headers of "{filename}" differ from the ones of "{files[0]}"!')
+        missing = [c for c in columns if c not in headers]
+        if len(missing) > 0:
+            raise ValueError(f'Column "{missing[0]}" does not exist in the input file "{filename}"!')
+
+
+def load_concatenated(config, files, columns):
+    # Load the rows of config.range out of the concatenated rows of all files. Returns the data object and the range
+    # with resolved bounds.
+    headers = [h for h in read_headers(files[0]) if h in columns]
+    overrides = get_dtype_overrides(config)
+    dtypes = [overrides.get(h) for h in headers]
+
+    with _create_executor(config.jobs, len(files)) as executor:
+        rng, parts = _plan_parts(files, config.range, executor)
+        print(f'Extract data from {len(parts)} of {len(files)} files: {", ".join(f for f, _, _ in parts)}')
+
+        data_obj = CsvData(headers, overrides)
+        tasks = [(filename, seek_row, base, rng, headers, dtypes, config.use_index)
+                 for filename, seek_row, base in parts]
+        for columns in _map(executor, _load_part, tasks):
+            data_obj.add_columns(columns)
+
+    print(f'Finished: {data_obj.size} samples read')
+    return data_obj, rng
+
+
+def load_overlaid(config, files, columns):
+    # Load the rows of config.range of each file. Relative ranges and ranges of X values are resolved per file.
+    with _create_executor(config.jobs, len(files)) as executor:
+        run_configs = []
+        for filename in files:
+            run_cfg = copy.copy(config)
+            run_cfg.input_file = filename
+            run_cfg.jobs = 1 if executor is not None else config.jobs
+            run_cfg.range = row_index.resolve_range(filename, config.range)
+            if config.x_column is not None:
+                run_cfg.range = value_index.select_rows(run_cfg)
+            run_configs.append(run_cfg)
+
+        data_objs = list(_map(executor, _load_run, [(run_cfg, columns) for run_cfg in run_configs]))
+    return OverlayData(list(zip(_get_labels(files), run_configs, data_objs)))
@@ -0,0 +1,113 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from . import csv_parsing, data_types
+
+
+# Each worker gets several ranges to even out differences in parsing speed
+RANGES_PER_JOB = 4
+
+
+#
+# Private helper functions (executed in the worker processes)
+#
+
+class _ByteRangeReader(object):
+    # Restricts reading of a binary file object to the bytes in front of the given end offset
+
+    def __init__(self, f, end):
+        self.f = f
+        self.end = end
+
+    def read(self, size=-1):
+        remaining = self.end - self.f.tell()
+        if remaining <= 0:
+            return b''
+        if size < 0 or size > remaining:
+            size = remaining
+        return self.f.read(size)
+
+
+def _count_rows(task):
+    filename, start, end = task
+    rows = 0
+    last_byte = b'\n'
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        reader = _ByteRangeReader(f, end)
+        while True:
+            chunk = reader.read(csv_parsing.BLOCK_SIZE)
+            if not chunk:
+                break
+            rows += int(np.count_nonzero(np.frombuffer(chunk, dtype=np.uint8) == ord('\n')))
+            last_byte = chunk[-1:]
+
+    # Only the last range may end with a row without a trailing newline
+    return rows + (1 if last_byte != b'\n' else 0)
+
+
+def _parse_range(task):
+    filename, start, end, first_index, rng, nr_of_columns, column_indices, dtypes = task
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        blocks = list(csv_parsing.iter_column_blocks(_ByteRangeReader(f, end), rng, nr_of_columns, column_indices,
+                                                     first_index, dtypes))
+
+    if len(blocks) == 0:
+        return [np.array([], dtype=np.float32) for _ in column_indices], [np.array([], dtype=bool) for _ in column_indices]
+
+    # Merge the blocks of the range to keep the number of transferred objects small
+    columns = [data_types.concatenate([b[0][i] for b in blocks]) for i in range(len(column_indices))]
+    invalid = [np.concatenate([b[1][i] for b in blocks]) for i in range(len(column_indices))]
+    return columns, invalid
+
+
+def _split_file(filename, nr_of_ranges):
+    # Split the data part of the file into byte ranges which start at the beginning of a row
+    with open(filename, 'rb') as f:
+        data_start = len(f.readline())
+        size = os.fstat(f.fileno()).st_size
+
+        bounds = [data_start]
+        for k in range(1, nr_of_ranges):
+            pos = data_start + (size - data_start) * k // nr_of_ranges
+            if pos <= bounds[-1]:
+                continue
+            # Move to the start of the next row (which is pos itself if the preceding byte is a newline)
+            f.seek(pos - 1)
+            f.readline()
+            pos = f.tell()
+            if bounds[-1] < pos < size:
+                bounds.append(pos)
+        bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+#
+# Public loading function
+#
+
+def iter_column_blocks(filename, rng, nr_of_columns, column_indices, jobs, dtypes=None):
+    # Parallel counterpart to csv_parsing.iter_column_blocks. The rows of each byte range are counted first to get
+    # the global data index of its first row, so range and divider select exactly the same rows as in serial loading.
+    # Ranges which lie completely outside of the requested range are not parsed at all.
+    ranges = _split_file(filename, jobs * RANGES_PER_JOB)
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        row_counts = list(executor.map(_count_rows, [(filename, start, end) for start, end in ranges]))
+
+        tasks = []
+        next_indices = []
+        first_index = 0
+        for (start, end), rows in zip(ranges, row_counts):
+            if rng.end is not None and first_index >= rng.end:
+                break
+            if rng.start is None or first_index + rows > rng.start:
+                tasks.append((filename, start, end, first_index, rng, nr_of_columns, column_indices, dtypes))
+                next_indices.append(first_index + rows)
+            first_index += rows
+
+        for (columns, invalid), next_index in zip(executor.map(_parse_range, tasks), next_indices):
+            yield columns, invalid, next_index
@@ -0,0 +1,117 @@
+import json
+import os
+import socket
+import stat
+import struct
+import tempfile
+
+
+# Clients and the plot server exchange messages over a Unix socket. Each message consists of the lengths of its parts,
+# a JSON object and raw binary data (e.g. the rendered image). A request contains the command and its arguments, the
+# response the output printed while handling the request, the result and an error message if the request failed.
+# Nothing received is ever executed, but the data of the files is only shared with the user who started the server:
+# The socket is located in a directory only accessible by that user, and both sides verify the user of the other one.
+#
+# This module is imported by the clients, so it must stay lightweight: neither numpy nor matplotlib are imported.
+SOCKET_ENV_VAR = 'CSV_PLOTTER_SOCKET'
+SOCKET_NAME = 'csv_plotter.sock'
+
+_MESSAGE_LENGTHS = struct.Struct('<QQ')
+_PEER_CREDENTIALS = struct.Struct('3i')
+
+
+#
+# Private helper functions
+#
+
+def _receive_exactly(conn, count):
+    chunks = []
+    while count > 0:
+        chunk = conn.recv(min(count, 1024 * 1024))
+        if not chunk:
+            raise ConnectionError('Connection closed before the message was complete!')
+        chunks.append(chunk)
+        count -= len(chunk)
+    return b''.join(chunks)
+
+
+def _get_private_dir():
+    # $XDG_RUNTIME_DIR is private to the user by definition, otherwise a directory in the temporary directory is
+    # created. An existing one is only used if nobody else is able to access it.
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir is not None and os.path.isdir(runtime_dir):
+        return runtime_dir
+
+    directory = os.path.join(tempfile.gettempdir(), f'csv_plotter-{os.getuid()}')
+    try:
+        os.mkdir(directory, 0o700)
+    except FileExistsError:
+        pass
+    info = os.lstat(directory)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077 != 0:
+        raise PermissionError(f'Directory "{directory}" of the plot server socket has to be owned by the current user '
+                              'and must not be accessible by others!')
+    return directory
+
+
+#
+# Public functions
+#
+
+def get_default_socket():
+    # Each user has their own server, whose socket is located in a directory private to the user
+    if SOCKET_ENV_VAR in os.environ:
+        return os.environ[SOCKET_ENV_VAR]
+    return os.path.join(_get_private_dir(), SOCKET_NAME)
+
+
+def check_owner(socket_path):
+    # A socket of another user may belong to a server which collects the requests or forges the responses
+    if os.stat(socket_path).st_uid != os.getuid():
+        raise PermissionError(f'Socket "{socket_path}" is owned by another user!')
+
+
+def check_peer(conn):
+    # Verify that the other end of a connection is run by the current user, if the platform tells the user
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return
+    _, uid, _ = _PEER_CREDENTIALS.unpack(conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED,
+                                                         _PEER_CREDENTIALS.size))
+    if uid != os.getuid():
+        raise PermissionError(f'Connection of user {uid} is refused!')
+
+
+def send_message(conn, obj, data=b''):
+    header = json.dumps(obj).encode('utf-8')
+    conn.sendall(_MESSAGE_LENGTHS.pack(len(header), len(data)) + header)
+    if len(data) > 0:
+        conn.sendall(data)
+
+
+def receive_message(conn):
+    # Returns the JSON object and the binary data of a message
+    header_length, data_length = _MESSAGE_LENGTHS.unpack(_receive_exactly(conn, _MESSAGE_LENGTHS.size))
+    obj = json.loads(_receive_exactly(conn, header_length).decode('utf-8'))
+    return obj, _receive_exactly(conn, data_length)
+
+
+def request(socket_path, command, **kwargs):
+    # Send a request to the server and return its response. Raises OSError if no server of the current user listens
+    # on the socket.
+    check_owner(socket_path)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.connect(socket_path)
+        check_peer(conn)
+        send_message(conn, dict(command=command, **kwargs))
+        return receive_message(conn)
+
+
+def handle_response(response):
+    # Print the output of the server and return the result of the request, which is either the binary data or the
+    # result of the JSON object. Failed requests raise a RuntimeError.
+    obj, data = response
+    if len(obj['output']) > 0:
+        print(obj['output'], end='')
+    if obj['error'] is not None:
+        raise RuntimeError(f'Plot server failed: {obj["error"]}')
+    return data if obj['binary'] else obj['result']
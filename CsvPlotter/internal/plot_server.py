@@ -0,0 +1,248 @@
+import contextlib
+import io
+import os
+import signal
+import socket
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from . import batch, column_statistics, csv_handling, instrumentation, plotting, row_index, value_index
+from . import configuration as cfg
+from .plot_client import check_owner, check_peer, receive_message, request, send_message
+from .utils import Range, read_headers
+
+
+# The plot server keeps parsed columns in memory between invocations, so repeated renders of the same files neither
+# pay the startup time of the Python interpreter, numpy and matplotlib nor parse the files again. All rows of a column
+# are kept, so the figures of any region and divider are sliced from the same columns. Requests are handled one after
+# another, since matplotlib is not thread safe.
+DEFAULT_MEMORY_BUDGET = 1024 * 1024**2
+
+
+#
+# Private helper functions
+#
+
+def _get_file_key(filename):
+    # Parsed columns stay valid as long as the size and modification time of their file do not change
+    stat = os.stat(filename)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _remove_stale_socket(socket_path):
+    # A socket file which nobody listens on remains after a server has been killed. Sockets of other users are never
+    # removed or connected to.
+    if not os.path.exists(socket_path):
+        return
+    check_owner(socket_path)
+    try:
+        request(socket_path, 'info')
+    except OSError:
+        os.unlink(socket_path)
+        return
+    raise RuntimeError(f'A plot server is already listening on {socket_path}!')
+
+
+#
+# Public classes
+#
+
+class Dataset(object):
+    # The full length columns of a file which have been loaded so far together with the indices of their invalid rows
+
+    def __init__(self, file_key):
+        self.file_key = file_key
+        self.rows = None
+        self.columns = {}
+
+    @property
+    def nbytes(self):
+        # Memory mapped columns of columnar files are paged in and out by the OS and do not count
+        return sum(col.nbytes + inv.nbytes for col, inv in self.columns.values() if not isinstance(col, np.memmap))
+
+    def has_columns(self, columns):
+        return self.rows is not None and all(c in self.columns for c in columns)
+
+    def load_columns(self, config, columns):
+        # Only columns which have not been loaded before are parsed
+        missing = [c for c in columns if c not in self.columns]
+        headers, self.rows, loaded, invalid = batch.read_full_columns(config, missing)
+        for h, col, inv in zip(headers, loaded, invalid):
+            self.columns[h] = (col, inv)
+
+    def select(self, config, columns):
+        # Construct the data object of the rows in the range of the config, like loading them from the file would
+        headers = [c for c in columns if c in self.columns]
+        return csv_handling.CsvData.from_columns(headers, [self.columns[h][0] for h in headers],
+                                                 [self.columns[h][1] for h in headers], self.rows, config.range,
+                                                 csv_handling.get_dtype_overrides(config))
+
+
+class DatasetCache(object):
+    # Datasets by the real path of their files. Once the datasets exceed the memory budget, the least recently used
+    # ones are evicted. A dataset exceeding the budget on its own is only used by the current request.
+
+    def __init__(self, budget=DEFAULT_MEMORY_BUDGET):
+        self.budget = budget
+        self.datasets = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def nbytes(self):
+        return sum(dataset.nbytes for dataset in self.datasets.values())
+
+    def get(self, config, columns):
+        # Return the dataset of the input file of the config, which contains at least the given columns
+        path = os.path.realpath(config.input_file)
+        file_key = _get_file_key(path)
+        dataset = self.datasets.pop(path, None)
+        if dataset is None or dataset.file_key != file_key:
+            dataset = Dataset(file_key)
+
+        if dataset.has_columns(columns):
+            self.hits += 1
+        else:
+            self.misses += 1
+            print(f'Extract data from file: {config.input_file}')
+            dataset.load_columns(config, columns)
+
+        self.datasets[path] = dataset
+        while self.nbytes > self.budget and len(self.datasets) > 0:
+            self.datasets.popitem(last=False)
+        return dataset
+
+    def describe(self):
+        lines = [f'Plot server cache: {len(self.datasets)} files, {self.nbytes / 1024**2:.1f} MiB of '
+                 f'{self.budget / 1024**2:.1f} MiB, {self.hits} hits, {self.misses} misses']
+        for path, dataset in self.datasets.items():
+            lines.append(f'  {path}: {len(dataset.columns)} columns of {dataset.rows} rows, '
+                         f'{dataset.nbytes / 1024**2:.1f} MiB')
+        return '\n'.join(lines)
+
+
+class PlotServer(object):
+    # Serves requests of clients on a Unix socket until a stop request is received
+
+    def __init__(self, socket_path, budget=DEFAULT_MEMORY_BUDGET):
+        self.socket_path = socket_path
+        self.cache = DatasetCache(budget)
+        self.running = False
+        self.handlers = {
+            'plot': self.__plot,
+            'stats': self.__stats,
+            'info': self.__info,
+            'stop': self.__stop,
+        }
+
+    def serve(self):
+        _remove_stale_socket(self.socket_path)
+        # Terminating the server removes its socket like stopping it does
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            # Only the user running the server may connect, since the responses contain the data of the files
+            umask = os.umask(0o077)
+            try:
+                sock.bind(self.socket_path)
+            finally:
+                os.umask(umask)
+
+            try:
+                sock.listen()
+                print(f'Plot server listening on {self.socket_path} '
+                      f'(memory budget {self.cache.budget / 1024**2:.1f} MiB)')
+                self.running = True
+                while self.running:
+                    conn, _ = sock.accept()
+                    with conn:
+                        try:
+                            check_peer(conn)
+                        except PermissionError as ex:
+                            print(ex)
+                            continue
+                        self.__handle(conn)
+            except KeyboardInterrupt:
+                pass
+            finally:
+                os.unlink(self.socket_path)
+        print('Plot server stopped')
+
+    def __handle(self, conn):
+        start = time.perf_counter()
+        try:
+            req, _ = receive_message(conn)
+        except (OSError, ValueError) as ex:
+            print(f'Failed to receive request: {ex}')
+            return
+
+        if not isinstance(req, dict):
+            print('Failed to receive request: no JSON object')
+            return
+        command = req.pop('command', None)
+        output = io.StringIO()
+        result, error = None, None
+        instrumentation.reset()
+        with contextlib.redirect_stdout(output):
+            try:
+                if command not in self.handlers:
+                    raise ValueError(f'Unknown command "{command}"')
+                result = self.handlers[command](**req)
+            except Exception as ex:
+                error = f'{type(ex).__name__}: {ex}'
+        # Plotting makes Ctrl+C kill the process, the server should remove its socket instead
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+
+        # Images are sent as binary data, all other results as part of the JSON object
+        binary = isinstance(result, bytes)
+        try:
+            send_message(conn, {'output': output.getvalue(), 'result': None if binary else result, 'error': error,
+                                'binary': binary}, result if binary else b'')
+        except OSError as ex:
+            print(f'Failed to send response: {ex}')
+        print(f'{command}: {time.perf_counter() - start:.3f} s' + (f' ({error})' if error is not None else ''))
+
+    def __plot(self, config):
+        # Render the figure of the config (given as by PlotConfig.to_obj()) and return the image, or None if no samples
+        # are selected
+        config = cfg.PlotConfig.from_obj(config)
+        columns = csv_handling.get_needed_columns(config)
+        dataset = self.cache.get(config, columns)
+
+        config.range = row_index.resolve_range(config.input_file, config.range, dataset.rows)
+        if config.x_column is not None:
+            x_values = dataset.columns[config.x_column][0] if config.x_column in dataset.columns else None
+            config.range = value_index.select_rows(config, x_values)
+
+        data_obj = dataset.select(config, columns)
+        if data_obj.size == 0:
+            print('No relevant samples stored!')
+            return None
+        print(f'Finished: {data_obj.size} samples selected')
+
+        output = io.BytesIO()
+        plotting.plot_csv_data(data_obj, config, output=output)
+        return output.getvalue()
+
+    def __stats(self, input_file, columns, rng, percentiles=None):
+        # Return the statistics of the columns (all if None) of the rows in the range (given as start, end and divider)
+        # as formatted by csv_util
+        rng = Range(*rng)
+        file_headers = read_headers(input_file)
+        headers = [file_headers[i] for i in csv_handling.select_columns(file_headers, columns)]
+        dataset = self.cache.get(cfg.PlotConfig.from_obj({'input_file': input_file}), headers)
+
+        rng = row_index.resolve_range(input_file, rng, dataset.rows)
+        stats = column_statistics.compute_column_statistics(headers, [dataset.columns[h][0] for h in headers],
+                                                            [dataset.columns[h][1] for h in headers], dataset.rows,
+                                                            rng)
+        return column_statistics.format_report(rng, stats, percentiles or column_statistics.DEFAULT_PERCENTILES)
+
+    def __info(self):
+        return self.cache.describe()
+
+    def __stop(self):
+        self.running = False
+        return 'Plot server stops'
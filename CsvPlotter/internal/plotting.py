@@ -1,12 +1,25 @@
+import os
 import signal
 from math import ceil, floor
-import matplotlib.pyplot as plt
+import matplotlib
+import matplotlib.lines
+
+from . import data_types, density, downsampling, expressions, instrumentation, level_of_detail
 
 
 #
 # Private helper functions
 #
 
+def __import_pyplot(interactive):
+    # pyplot initializes its backend on import. When only writing to a file, the non-interactive Agg backend is
+    # selected before, so no GUI toolkit is loaded at all.
+    if not interactive:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
 def __get_index_list(rng, nr_of_indices=None):
     start = rng.start if rng.start is not None else 0
 
@@ -21,16 +34,54 @@ def __get_index_list(rng, nr_of_indices=None):
     return range(corr_start_idx, corr_end_idx, rng.divider)
 
 
-def __plot_subplot(data_obj, config, subplot, axis):
+def __get_x(data_obj, config, follower=None):
+    # The X values are either given by a column, provided by the data object or the sample indices
+    if config.x_column is not None:
+        return data_obj.data[config.x_column][:data_obj.size]
+    if getattr(data_obj, 'x', None) is not None:
+        return data_obj.x
+    if follower is not None:
+        return __get_index_list(follower.data_range, data_obj.size)
+    return __get_index_list(config.range, data_obj.size)
+
+
+def __get_series(data_obj, col, evaluator):
+    # Derived columns are only calculated when they are actually plotted. Data objects which already provide a derived
+    # column (e.g. aggregated while streaming) store it under its expression.
+    if col.expr is None:
+        return data_obj.data[col.name][:data_obj.size]
+    if col.expr in data_obj.data:
+        y = data_obj.data[col.expr][:data_obj.size]
+    else:
+        y = evaluator.evaluate(expressions.Expression(col.expr))
+    return y.astype(data_types.get_dtype(col.dtype)) if col.dtype is not None else y
+
+
+def __plot_subplot(runs, config, subplot, axis, lod_controller=None):
+    # Plots all columns of the subplot and returns the created lines together with the configs of their columns.
+    # Each run consists of a label (None for a single run), a data object, its X values and its expression evaluator.
+    # Each column is plotted once per run. Density subplots draw an image per axis instead of lines, so they return
+    # no lines and only proxies of the lines are shown in the legend.
     LINE_STYLE = '.-'
+    # Level of detail handling only pays off if there are a lot more samples than pixels
+    LOD_SAMPLES_PER_PIXEL = 8
+
+    if subplot.render not in density.RENDER_MODES:
+        raise ValueError(f'Unknown render mode "{subplot.render}"! '
+                         f'Valid modes are: {", ".join(density.RENDER_MODES)}')
 
     line_objects = []
     labels = []
+    columns = []
+    # Series of density subplots by the axis they are drawn to
+    density_series = {}
 
-    x = __get_index_list(config.range, data_obj.size)
     alt_axis = None
 
-    for i, col in enumerate(subplot.columns):
+    # The number of points per series depends on the width of the axis in pixels
+    nr_of_pixels = axis.bbox.width
+
+    for col in subplot.columns:
         # Determine the correct axis to plot to
         if not col.alt_y_axis:
             curr_axis = axis
@@ -39,13 +90,35 @@ def __plot_subplot(data_obj, config, subplot, axis):
                 alt_axis = axis.twinx()
             curr_axis = alt_axis
 
-        y = data_obj.data[col.name][:data_obj.size]
-
-        # Plot data and add labels
-        labels.append(col.name if col.label is None else col.label)
-        line_objects.append(curr_axis.plot(
-            x, y, f'C{i}{LINE_STYLE}')[0]
-        )
+        for run_label, data_obj, x, evaluator in runs:
+            y = __get_series(data_obj, col, evaluator)
+            label = col.name if col.label is None else col.label
+            labels.append(label if run_label is None else f'{label} ({run_label})')
+            if subplot.render == 'density':
+                color = f'C{len(line_objects)}'
+                density_series.setdefault(curr_axis, []).append((x, y, color))
+                line_objects.append(matplotlib.lines.Line2D([], [], color=color, marker='s', linestyle='None'))
+                continue
+
+            # An explicitly selected downsampling method takes precedence over the level of detail pyramid
+            pyramid = None
+            if lod_controller is not None and config.downsample == 'none' and \
+                    len(y) > LOD_SAMPLES_PER_PIXEL * nr_of_pixels:
+                pyramid = level_of_detail.LodPyramid(x, y, nr_of_pixels)
+                x_plot, y_plot = pyramid.get_data(x[0], x[-1], nr_of_pixels)
+            else:
+                x_plot, y_plot = downsampling.downsample(config.downsample, x, y, nr_of_pixels)
+
+            # Plot data
+            line_objects.append(curr_axis.plot(
+                x_plot, y_plot, f'C{len(line_objects)}{LINE_STYLE}')[0]
+            )
+            columns.append(col)
+            if pyramid is not None:
+                lod_controller.add_line(line_objects[-1], pyramid)
+
+    for curr_axis, series in density_series.items():
+        density.plot_density(curr_axis, series, subplot.ylim if curr_axis is axis else subplot.alt_ylim)
 
     # Do general axes configuration like legends, labels,
     axis.set_xlabel(subplot.xlabel)
@@ -61,30 +134,115 @@ def __plot_subplot(data_obj, config, subplot, axis):
         alt_axis.set_ylim(subplot.alt_ylim.start, subplot.alt_ylim.end)
     axis.grid()
 
+    if subplot.render == 'density':
+        return []
+    return list(zip(line_objects, columns))
 
-#
-# Public plotting function
-#
 
-def plot_csv_data(data_obj, config):
-    # Make sure Ctrl+C in the terminal closes the plot
-    signal.signal(signal.SIGINT, signal.SIG_DFL)
-
-    # Prepare subplots
-    _, axes = plt.subplots(len(config.subplots), sharex=config.share_x_axis)
+def __plot_figure(fig, data_obj, config, use_lod, follower=None):
+    # Plots all subplots into the (empty) figure and returns the created lines together with the configs of their
+    # columns
+    axes = fig.subplots(len(config.subplots), sharex=config.share_x_axis)
     try:
         axes[0]
     except:
         axes = [axes]
 
+    # Overlaid data objects consist of several runs, which have been loaded with their own configs.
+    # The evaluators are shared by all subplots, so subexpressions of derived columns are calculated only once.
+    runs = getattr(data_obj, 'runs', [(None, config, data_obj)])
+    runs = [(label, run_data, __get_x(run_data, run_cfg, follower),
+             expressions.ExpressionEvaluator(run_data.data, run_data.size)) for label, run_cfg, run_data in runs]
+    lines = []
     for i, subplot in enumerate(config.subplots):
-        __plot_subplot(data_obj, config, subplot, axes[i])
+        with instrumentation.stage(f'plot_subplot_{i}'):
+            lod_controller = level_of_detail.LodController(axes[i]) if use_lod else None
+            lines += __plot_subplot(runs, config, subplot, axes[i], lod_controller)
+
+    with instrumentation.stage('tight_layout'):
+        fig.tight_layout()
+    return lines
+
+
+def __refresh_lines(follower, config, lines):
+    # Append new rows of a followed file and update the existing lines instead of recreating the plot
+    if follower.poll() == 0:
+        return
+
+    data_obj = follower.data_obj
+    x = __get_x(data_obj, config, follower)
+    evaluator = expressions.ExpressionEvaluator(data_obj.data, data_obj.size)
+    for line, col in lines:
+        y = __get_series(data_obj, col, evaluator)
+        line.set_data(*downsampling.downsample(config.downsample, x, y, line.axes.bbox.width))
+
+    for axis in set(line.axes for line, _ in lines):
+        axis.relim()
+        axis.autoscale_view()
+    lines[0][0].figure.canvas.draw_idle()
+
+
+def __refresh_progress(loader, config, fig, lines, timer):
+    # Show the latest snapshot of a file which is loaded in the background. Once loading has finished, the figure is
+    # plotted again from the complete data exactly like without progressive loading.
+    if not loader.finished:
+        if len(lines) > 0:
+            __refresh_lines(loader, config, lines)
+        return
+
+    timer.stop()
+    if loader.error is not None:
+        print(f'Failed to load file "{config.input_file}": {loader.error}')
+        return
+    fig.clear()
+    __plot_figure(fig, loader.result, config, use_lod=True)
+    fig.canvas.draw_idle()
+
+
+#
+# Public plotting functions
+#
+
+def get_nr_of_bins():
+    # Number of X bins needed to render a series at the horizontal resolution of a default figure
+    return int(matplotlib.rcParams['figure.figsize'][0] * matplotlib.rcParams['figure.dpi'])
+
+
+def plot_csv_data(data_obj, config, follower=None, loader=None, output=None):
+    # If a follower is given, its data object is plotted and updated periodically with newly appended rows.
+    # If a progressive loader is given instead, its snapshots are plotted until the complete data is loaded.
+    # If a file object is given as output, the figure is written to it in the format of config.output_file.
+    # Make sure Ctrl+C in the terminal closes the plot
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    # Interactive plots swap in the level of detail matching the visible range when zooming or panning.
+    # This is not possible for followed files whose data changes all the time.
+    interactive = config.output_file is None
+    plt = __import_pyplot(interactive)
+
+    fig = plt.figure()
+    use_lod = interactive and follower is None and loader is None
+    lines = __plot_figure(fig, data_obj, config, use_lod, follower)
 
-    plt.tight_layout()
+    if follower is not None and interactive and len(lines) > 0:
+        timer = fig.canvas.new_timer(interval=int(config.refresh_interval * 1000))
+        timer.add_callback(__refresh_lines, follower, config, lines)
+        timer.start()
+    if loader is not None and interactive:
+        timer = fig.canvas.new_timer(interval=int(config.refresh_interval * 1000))
+        timer.add_callback(__refresh_progress, loader, config, fig, lines, timer)
+        timer.start()
 
     if config.output_file is None:
         print('Plot data...')
-        plt.show()
+        with instrumentation.stage('show'):
+            plt.show()
     else:
         print(f'Plot data to output file {config.output_file}...')
-        plt.savefig(config.output_file)
+        with instrumentation.stage('savefig'):
+            if output is not None:
+                plt.savefig(output, format=os.path.splitext(config.output_file)[1][1:] or None)
+            else:
+                plt.savefig(config.output_file)
+        # Release the figure, since several figures may be rendered by the same process
+        plt.close(fig)
@@ -0,0 +1,206 @@
+import os
+import zipfile
+
+import numpy as np
+
+from . import columnar_file, decompression
+from .csv_parsing import BLOCK_SIZE
+from .utils import INDEX_SUFFIX, Range
+
+
+INDEX_STRIDE = 100000
+# Size of the blocks read backwards from the end of a file to find its last rows
+REVERSE_BLOCK_SIZE = 1024 * 1024
+
+
+def get_index_file(filename):
+    # The index is stored beside the CSV file
+    return filename + INDEX_SUFFIX
+
+
+class RowIndex(object):
+    # Sparse index which stores the byte offset of every stride-th data row (excluding the header)
+
+    def __init__(self, offsets, stride, rows, size, mtime_ns):
+        self.offsets = offsets
+        self.stride = stride
+        self.rows = rows
+        self.size = size
+        self.mtime_ns = mtime_ns
+
+    def lookup(self, row):
+        # Return the index and byte offset of the nearest indexed row which is not behind the given row
+        k = min(max(row, 0) // self.stride, len(self.offsets) - 1)
+        return k * self.stride, int(self.offsets[k])
+
+    def is_valid_for(self, filename):
+        st = os.stat(filename)
+        return st.st_size == self.size and st.st_mtime_ns == self.mtime_ns
+
+    def save(self, filename):
+        # The index is written to a temporary file first, so an interrupted write never leaves a truncated index
+        index_file = get_index_file(filename)
+        with open(index_file + '.tmp', 'wb') as f:
+            np.savez(f, offsets=self.offsets,
+                     meta=np.array([self.stride, self.rows, self.size, self.mtime_ns], dtype=np.int64))
+        os.replace(index_file + '.tmp', index_file)
+
+    @classmethod
+    def load(cls, filename):
+        # Returns None if no index exists, it is unreadable (e.g. truncated) or does not match the file anymore
+        try:
+            with np.load(get_index_file(filename)) as index_file:
+                stride, rows, size, mtime_ns = (int(v) for v in index_file['meta'])
+                index = cls(index_file['offsets'], stride, rows, size, mtime_ns)
+        except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+            return None
+        return index if index.is_valid_for(filename) else None
+
+    @classmethod
+    def build(cls, filename, stride=INDEX_STRIDE):
+        st = os.stat(filename)
+        offsets = []
+        with open(filename, 'rb') as f:
+            data_start = len(f.readline())
+            offsets.append(data_start)
+
+            chunk_start = data_start
+            newline_count = 0
+            last_byte = b'\n'
+            while True:
+                chunk = f.read(BLOCK_SIZE)
+                if not chunk:
+                    break
+
+                # The n-th newline (counted from 0) terminates row n, so row n+1 starts right after it
+                newlines = np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8) == ord('\n'))
+                first = (-(newline_count + 1)) % stride
+                offsets.extend(newlines[first::stride] + chunk_start + 1)
+
+                newline_count += len(newlines)
+                chunk_start += len(chunk)
+                last_byte = chunk[-1:]
+
+        # A last line without a trailing newline is a row as well
+        rows = newline_count + (1 if last_byte != b'\n' else 0)
+        return cls(np.array(offsets, dtype=np.int64), stride, rows, st.st_size, st.st_mtime_ns)
+
+
+def get_index(filename, build=False):
+    # Load the index of the given file. If no valid index exists and build is set, a new index is created and stored.
+    index = RowIndex.load(filename)
+    if index is None and build:
+        print(f'Build row index for file: {filename}')
+        index = RowIndex.build(filename)
+        try:
+            index.save(filename)
+        except OSError as ex:
+            print(f'Failed to store row index: {ex}')
+    return index
+
+
+def seek_to_tail(f, count):
+    # Position the binary file object, which has to be located at the start of the data rows, in front of the count-th
+    # last row by reading blocks backwards from the end of the file. Returns the (negative) data index of that row,
+    # which is larger than -count if the file contains fewer rows.
+    data_start = f.tell()
+    end = f.seek(0, os.SEEK_END)
+    if end == data_start or count <= 0:
+        return 0
+
+    # The newline in front of the wanted row is searched. A trailing newline terminates the last row, whereas a last
+    # line without a newline is a row as well.
+    f.seek(end - 1)
+    needed = count + (1 if f.read(1) == b'\n' else 0)
+    found = 0
+    block_end = end
+    while block_end > data_start:
+        block_start = max(block_end - REVERSE_BLOCK_SIZE, data_start)
+        f.seek(block_start)
+        newlines = np.flatnonzero(np.frombuffer(f.read(block_end - block_start), dtype=np.uint8) == ord('\n'))
+        if found + len(newlines) >= needed:
+            f.seek(block_start + int(newlines[len(newlines) - (needed - found)]) + 1)
+            return -count
+        found += len(newlines)
+        block_end = block_start
+
+    # The file contains fewer rows than requested
+    f.seek(data_start)
+    return -(found + count + 1 - needed)
+
+
+def seek_to_row(f, filename, row, build=False):
+    # Use the row index (if available) to position the binary file object in front of the given data row.
+    # Negative rows are relative to the end of the file and located by reading it backwards.
+    # Returns the data index of the row the file object is positioned at, which is negative for negative rows.
+    if row is not None and row < 0:
+        if not f.seekable():
+            # Streams which cannot be read backwards have to be scanned completely to know their number of rows
+            return -count_rows(filename)
+        return seek_to_tail(f, -row)
+    if row is None or row <= 0 or not f.seekable():
+        return 0
+
+    index = get_index(filename, build=build)
+    if index is None:
+        return 0
+
+    first_index, offset = index.lookup(row)
+    f.seek(offset)
+    return first_index
+
+
+def count_rows(filename, limit=None):
+    # Count the data rows of a file. A valid index already knows the number of rows, otherwise the file is scanned.
+    # If a limit is given, the scan stops as soon as the file is known to contain at least limit rows.
+    index = RowIndex.load(filename)
+    if index is not None:
+        return index.rows if limit is None else min(index.rows, limit)
+
+    with decompression.open_binary(filename) as f:
+        f.readline()
+        rows = 0
+        last_byte = b'\n'
+        while True:
+            chunk = f.read(BLOCK_SIZE)
+            if not chunk:
+                break
+            rows += int(np.count_nonzero(np.frombuffer(chunk, dtype=np.uint8) == ord('\n')))
+            last_byte = chunk[-1:]
+            if limit is not None and rows >= limit:
+                return limit
+    return rows + (1 if last_byte != b'\n' else 0)
+
+
+def count_last_rows(filename, count):
+    # Return how many of the last count rows the file contains, which only requires reading it backwards
+    if columnar_file.is_columnar_file(filename):
+        return min(columnar_file.ColumnarFile(filename).rows, count)
+    if decompression.is_compressed(filename):
+        return min(count_rows(filename), count)
+    with open(filename, 'rb') as f:
+        f.readline()
+        return -seek_to_tail(f, count)
+
+
+def resolve_range(filename, rng, rows=None):
+    # Negative bounds of a range count from the end of the file like Python slices. Ranges of the last rows (i.e. with
+    # a negative start and a negative or open end) stay relative to the end, so they can be read without knowing the
+    # number of rows. Their start is clamped to the first row, since it denotes the data index of the first sample.
+    # Ranges mixing both signs are converted to absolute rows.
+    # If the number of rows of the file is already known (e.g. of columns loaded before), the file is not read.
+    if (rng.start is None or rng.start >= 0) and (rng.end is None or rng.end >= 0):
+        return rng
+
+    last_rows = rng.is_relative and (rng.end is None or rng.end < 0)
+    if rows is None and last_rows:
+        rows = count_last_rows(filename, -rng.start)
+    elif rows is None:
+        rows = columnar_file.ColumnarFile(filename).rows if columnar_file.is_columnar_file(filename) \
+            else count_rows(filename)
+
+    if last_rows:
+        return Range(max(rng.start, -rows), rng.end, rng.divider)
+    start = max(rows + rng.start, 0) if rng.start is not None and rng.start < 0 else rng.start
+    end = max(rows + rng.end, 0) if rng.end is not None and rng.end < 0 else rng.end
+    return Range(start, end, rng.divider)
@@ -0,0 +1,135 @@
+from math import ceil
+
+import numpy as np
+
+from . import csv_parsing, decompression, expressions, instrumentation, row_index
+from .csv_handling import read_headers, select_columns
+
+
+class BinnedData(object):
+    # Constant memory representation of a CSV file for plotting. The samples are streamed through per X bin
+    # aggregators which keep the first, minimum, maximum and last value of each bin and column, so the raw rows can be
+    # thrown away. Rendering these four values per pixel column looks the same as rendering all samples.
+    #
+    # After finish() has been called, the object provides the same attributes as CsvData (headers, size, data) and
+    # additionally the X values in x.
+
+    def __init__(self, headers, x_start, x_step, nr_of_samples, nr_of_bins):
+        self.headers = headers
+        self.x_start = x_start
+        self.x_step = x_step
+        self.nr_of_samples = max(nr_of_samples, 1)
+        self.nr_of_bins = max(1, min(nr_of_bins, self.nr_of_samples))
+
+        self.samples_seen = 0
+        self.count = np.zeros(self.nr_of_bins, dtype=np.int64)
+        self.first_x = np.full(self.nr_of_bins, np.nan)
+        self.last_x = np.full(self.nr_of_bins, np.nan)
+        self.aggregates = {h: {
+            'first': np.full(self.nr_of_bins, np.nan),
+            'min': np.full(self.nr_of_bins, np.nan),
+            'max': np.full(self.nr_of_bins, np.nan),
+            'last': np.full(self.nr_of_bins, np.nan),
+        } for h in headers}
+
+        self.size = 0
+        self.x = None
+        self.data = None
+
+    def add_columns(self, columns):
+        # Feed a block of consecutive samples given as one array per header
+        count = len(columns[0]) if len(columns) > 0 else 0
+        if count == 0:
+            return
+
+        sample_idx = np.arange(self.samples_seen, self.samples_seen + count)
+        self.samples_seen += count
+        bins = np.minimum(sample_idx * self.nr_of_bins // self.nr_of_samples, self.nr_of_bins - 1)
+        x = self.x_start + sample_idx * self.x_step
+
+        # Samples arrive in order, so each bin forms a contiguous segment of the block
+        starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+        ends = np.r_[starts[1:], count] - 1
+        seg_bins = bins[starts]
+        new_bins = self.count[seg_bins] == 0
+
+        self.count[seg_bins] += np.diff(np.r_[starts, count])
+        self.first_x[seg_bins[new_bins]] = x[starts[new_bins]]
+        self.last_x[seg_bins] = x[ends]
+
+        for h, col in zip(self.headers, columns):
+            agg = self.aggregates[h]
+            col = col.astype(np.float64)
+            agg['first'][seg_bins[new_bins]] = col[starts[new_bins]]
+            agg['last'][seg_bins] = col[ends]
+            agg['min'][seg_bins] = np.fmin(agg['min'][seg_bins], np.fmin.reduceat(col, starts))
+            agg['max'][seg_bins] = np.fmax(agg['max'][seg_bins], np.fmax.reduceat(col, starts))
+
+    def finish(self):
+        # Interleave the aggregates of all non-empty bins to series with four points per bin
+        used = self.count > 0
+        centers = (self.first_x[used] + self.last_x[used]) / 2
+        self.x = np.stack((self.first_x[used], centers, centers, self.last_x[used]), axis=1).ravel()
+        self.data = {}
+        for h in self.headers:
+            agg = self.aggregates[h]
+            self.data[h] = np.stack((agg['first'][used], agg['min'][used], agg['max'][used], agg['last'][used]),
+                                    axis=1).ravel()
+        self.size = len(self.x)
+        self.aggregates = None
+
+    @classmethod
+    def __get_derived_columns(cls, config, headers):
+        # Derived columns are calculated block by block and aggregated like the other columns. This is only possible
+        # for expressions which do not depend on preceding samples. Derived columns are stored under their expression.
+        derived = []
+        for subplot in config.subplots:
+            for col in subplot.columns:
+                if col.expr is None or col.expr in headers or col.expr in [e.source for e in derived]:
+                    continue
+                expression = expressions.Expression(col.expr)
+                if not expression.is_elementwise:
+                    raise ValueError(f'The derived column "{col.name}" depends on preceding samples and cannot be '
+                                     'calculated when streaming!')
+                derived.append(expression)
+        return derived
+
+    @classmethod
+    def from_file(cls, config, columns, nr_of_bins):
+        print(f'Stream data from file: {config.input_file}')
+
+        rng = config.range
+        file_headers = read_headers(config.input_file)
+        column_indices = select_columns(file_headers, columns)
+        headers = [file_headers[i] for i in column_indices]
+        derived = cls.__get_derived_columns(config, headers)
+
+        # The number of samples has to be known in advance to map samples to bins. Without a row index, this takes a
+        # first pass over the file, which stops at the end of the range. Ranges relative to the end of the file do not
+        # need to count the rows, since their start is clamped to the first row already.
+        start = rng.start if rng.start is not None else 0
+        start = int(ceil(float(start) / rng.divider) * rng.divider)
+        end = row_index.count_rows(config.input_file, rng.end) if not rng.is_relative else 0
+        nr_of_samples = len(range(start, end, rng.divider))
+
+        binned = cls(headers + [e.source for e in derived], start, rng.divider, nr_of_samples, nr_of_bins)
+        with instrumentation.stage('load_data') as record, decompression.open_binary(config.input_file) as f:
+            f.readline()
+            first_index = row_index.seek_to_row(f, config.input_file, rng.start, config.use_index)
+            start_offset = f.tell()
+            for columns, invalid, _ in csv_parsing.iter_column_blocks(f, rng, len(file_headers), column_indices,
+                                                                      first_index):
+                drop = csv_parsing.combine_invalid(invalid, len(columns[0]) if len(columns) > 0 else 0)
+                if drop.any():
+                    columns = [col[~drop] for col in columns]
+                if len(derived) > 0:
+                    evaluator = expressions.ExpressionEvaluator(dict(zip(headers, columns)), len(columns[0]))
+                    columns = columns + [evaluator.evaluate(e) for e in derived]
+                binned.add_columns(columns)
+
+            record['rows'] = binned.samples_seen
+            record['bytes'] = f.tell() - start_offset
+
+        binned.finish()
+        print(f'Finished: {binned.samples_seen} samples aggregated into {binned.nr_of_bins} bins')
+        return binned
@@ -0,0 +1,161 @@
+import csv
+import io
+import os
+from itertools import repeat
+from math import ceil
+
+import numpy as np
+
+from . import columnar_file, csv_parsing, decompression, row_index
+from .utils import Range
+
+
+# A transformation streams a CSV file block by block through a pipeline of generators, so its memory usage does not
+# depend on the size of the file: leading and trailing lines are cut off, the rows of the region are selected and the
+# selected fields are joined with the output delimiter. Regular blocks are split and joined as a whole, only blocks
+# with quoted fields or rows with a differing number of fields are processed row by row by the csv module.
+# The result is written either as CSV file or (for the extension columnar_file.FILE_EXTENSION) as columnar file.
+
+
+#
+# Private helper functions
+#
+
+def _split_header(line, delimiter):
+    row = next(csv.reader([line.decode('utf-8').rstrip('\r\n')], delimiter=delimiter), [])
+    return [str(head).strip() for head in row]
+
+
+def _format_rows(rows, output_delimiter):
+    text = io.StringIO()
+    csv.writer(text, delimiter=output_delimiter, lineterminator='\n').writerows(rows)
+    return text.getvalue()
+
+
+def _get_selected_rows(filename, rng, skip_lines, drop_lines):
+    # Return the slice of data rows selected by the range. Negative bounds need the number of data rows of the file.
+    if (rng.start is not None and rng.start < 0) or (rng.end is not None and rng.end < 0):
+        rows = row_index.count_rows(filename) - skip_lines - drop_lines
+        return rng.to_slice(max(rows, 0))
+    start = rng.start if rng.start is not None else 0
+    return slice(int(ceil(float(start) / rng.divider) * rng.divider), rng.end, rng.divider)
+
+
+#
+# Stages of the pipeline, each of them consumes and yields blocks
+#
+
+def _drop_last_lines(blocks, count):
+    # The last count lines are held back, since only the end of the file tells which lines are the last ones
+    held = []
+    for lines in blocks:
+        held += lines
+        if len(held) > count:
+            yield held[:len(held) - count]
+            held = held[len(held) - count:]
+
+
+def _select_rows(blocks, selected):
+    # Data indices are shifted by the start of the slice, so the divider applies relative to it
+    rng = Range(0, selected.stop - selected.start if selected.stop is not None else None, selected.step)
+    data_index = -selected.start
+    for lines in blocks:
+        selected_lines, finished = csv_parsing.select_lines(lines, data_index, rng)
+        data_index += len(lines)
+        if len(selected_lines) > 0:
+            yield selected_lines
+        if finished:
+            break
+
+
+def _select_fields(blocks, nr_of_columns, column_indices, delimiter, output_delimiter):
+    # Yield the text of each block consisting of the selected fields of its rows
+    for lines in blocks:
+        text = '\n'.join(lines)
+        field_counts = np.fromiter(map(str.count, lines, repeat(delimiter)), dtype=np.int64, count=len(lines)) + 1
+        if '"' in text or not np.all(field_counts == nr_of_columns):
+            rows = csv.reader(lines, delimiter=delimiter)
+            # Empty lines stay empty instead of becoming rows of empty fields
+            yield _format_rows(([row[c] if c < len(row) else '' for c in column_indices] if len(row) > 0 else []
+                                for row in rows), output_delimiter)
+        elif column_indices == list(range(nr_of_columns)):
+            yield (text if delimiter == output_delimiter else text.replace(delimiter, output_delimiter)) + '\n'
+        else:
+            # The fields of all rows are interleaved with the delimiters and newlines following them
+            fields = text.replace('\n', delimiter).split(delimiter)
+            parts = [None] * (2 * len(column_indices) * len(lines))
+            for j, c in enumerate(column_indices):
+                parts[2*j::2*len(column_indices)] = fields[c::nr_of_columns]
+                parts[2*j+1::2*len(column_indices)] = \
+                    repeat(output_delimiter if j < len(column_indices) - 1 else '\n', len(lines))
+            yield ''.join(parts)
+
+
+#
+# Sinks writing the text blocks, which return the number of written rows
+#
+
+def _write_csv(filename, header, texts):
+    rows = 0
+    tmp_file = filename + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8', newline='') as f:
+        f.write(header)
+        for text in texts:
+            f.write(text)
+            rows += text.count('\n')
+    os.replace(tmp_file, filename)
+    return rows
+
+
+def _write_columnar(filename, headers, blocks, nr_of_columns, column_indices):
+    # Written from blocks of comma separated lines, whose selected columns are parsed
+    writer = columnar_file.ColumnarWriter(filename, headers)
+    for lines in blocks:
+        columns, invalid = csv_parsing.parse_lines(lines, nr_of_columns, column_indices, writer.get_dtypes())
+        writer.add_block(columns, invalid)
+    writer.close()
+    return writer.rows
+
+
+#
+# Public functions
+#
+
+def read_headers(filename, skip_lines=0, delimiter=','):
+    # Headers of a file whose header line follows skip_lines leading lines
+    with decompression.open_binary(filename) as f:
+        for _ in range(skip_lines):
+            f.readline()
+        return _split_header(f.readline(), delimiter)
+
+
+def transform(input_file, output_file, column_indices=None, rng=None, skip_lines=0, drop_lines=0, delimiter=',',
+              output_delimiter=','):
+    # Write the selected columns (all if no indices are given) of the rows in the range to the output file. The
+    # header line follows skip_lines leading lines, the last drop_lines lines of the file are ignored.
+    # Returns the headers and number of rows of the output file.
+    selected = _get_selected_rows(input_file, rng if rng is not None else Range(), skip_lines, drop_lines)
+
+    with decompression.open_binary(input_file) as f:
+        for _ in range(skip_lines):
+            f.readline()
+        file_headers = _split_header(f.readline(), delimiter)
+        if column_indices is None:
+            column_indices = list(range(len(file_headers)))
+        headers = [file_headers[c] for c in column_indices]
+
+        blocks = csv_parsing.iter_line_blocks(f)
+        if drop_lines > 0:
+            blocks = _drop_last_lines(blocks, drop_lines)
+        blocks = _select_rows(blocks, selected)
+
+        if output_file.endswith(columnar_file.FILE_EXTENSION):
+            if delimiter == ',':
+                return headers, _write_columnar(output_file, headers, blocks, len(file_headers), column_indices)
+            # The selected fields are separated by commas for parsing first
+            texts = _select_fields(blocks, len(file_headers), column_indices, delimiter, ',')
+            return headers, _write_columnar(output_file, headers, (text[:-1].split('\n') for text in texts),
+                                            len(headers), None)
+
+        texts = _select_fields(blocks, len(file_headers), column_indices, delimiter, output_delimiter)
+        return headers, _write_csv(output_file, _format_rows([headers], output_delimiter), texts)
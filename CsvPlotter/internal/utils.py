@@ -1,6 +1,28 @@
+import csv
+import glob
+import os
+import re
+from math import ceil
+
+from . import columnar_file
+
+# Suffixes of the indices stored beside the input files, which are never input files themselves
+INDEX_SUFFIX = '.rowidx.npz'
+VALUE_INDEX_SUFFIX = '.validx.npz'
+__sidecar_suffixes = (INDEX_SUFFIX, VALUE_INDEX_SUFFIX, '.tmp')
+
 __true_map = ['true', 't', '1', 'y', 'yes']
 __false_map = ['false', 'f', '0', 'n', 'no']
 
+# Magic bytes of the formats supported by the decompression module. They are defined here, since the decompression
+# module pulls in the compression libraries and threading and is therefore only imported for compressed files.
+COMPRESSION_MAGICS = {
+    'gzip': b'\x1f\x8b',
+    'bz2': b'BZh',
+    'xz': b'\xfd7zXZ\x00',
+    'zstd': b'\x28\xb5\x2f\xfd',
+}
+
 
 def str2bool(s):
     if s.lower() in __true_map:
@@ -10,6 +32,44 @@ def str2bool(s):
     raise ValueError(f'"{s}" is not a valid boolean value!')
 
 
+def read_headers(filename):
+    # Kept free of heavy dependencies, since listing the headers should not pay for importing numpy or matplotlib
+    if columnar_file.is_columnar_file(filename):
+        return columnar_file.read_headers(filename)
+    with open(filename, 'rb') as f:
+        head = f.read(max(len(magic) for magic in COMPRESSION_MAGICS.values()))
+    if head.startswith(tuple(COMPRESSION_MAGICS.values())):
+        from . import decompression
+        opened = decompression.open_text(filename)
+    else:
+        opened = open(filename, 'r')
+    with opened as f:
+        plots = csv.reader(f, delimiter=',')
+        return [str(head).strip() for head in next(plots)]
+
+
+def natural_key(filename):
+    # Sort numbered files like rotated logs by the value of their numbers, e.g. run.csv.2 before run.csv.10
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', filename)]
+
+
+def expand_input_files(input_file):
+    # input_file is a file name or glob pattern or a list of them. The matches of a pattern are sorted naturally,
+    # otherwise the given order is kept.
+    patterns = input_file if isinstance(input_file, list) else [input_file]
+    files = []
+    for pattern in patterns:
+        if os.path.exists(pattern) or not any(c in pattern for c in '*?['):
+            matches = [pattern]
+        else:
+            matches = sorted([f for f in glob.glob(pattern) if os.path.isfile(f) and not f.endswith(__sidecar_suffixes)],
+                             key=natural_key)
+            if len(matches) == 0:
+                raise ValueError(f'No input file matches "{pattern}"!')
+        files += [f for f in matches if f not in files]
+    return files
+
+
 class Range(object):
     def __init__(self, start=None, end=None, divider=1):
         self.start = start
@@ -25,5 +85,26 @@ class Range(object):
             return False
         return True
 
+    @property
+    def is_relative(self):
+        # Ranges starting at a negative row are relative to the end of the file, their data indices are negative
+        return self.start is not None and self.start < 0
+
+    def to_slice(self, rows):
+        # Return the slice selecting the rows in this range out of the given number of rows. Negative bounds count
+        # from the end like Python slices. The divider applies to the data indices, which are negative for ranges
+        # relative to the end.
+        start = self.start if self.start is not None else 0
+        start = int(ceil(float(start) / self.divider) * self.divider)
+        if start < 0:
+            start += rows
+            if start < 0:
+                start += int(ceil(float(-start) / self.divider)) * self.divider
+
+        end = self.end
+        end = rows if end is None else (rows + end if end < 0 else end)
+        end = min(max(end, start), rows)
+        return slice(start, end, self.divider)
+
     def __repr__(self):
         return f'Range{{start={self.start!r}, end={self.end!r}, divider={self.divider!r}}}'
@@ -0,0 +1,183 @@
+import hashlib
+import os
+import zipfile
+
+import numpy as np
+
+from . import column_cache, columnar_file, csv_parsing, decompression, row_index
+from .utils import VALUE_INDEX_SUFFIX, Range, read_headers
+
+
+X_DTYPE = np.dtype(np.float64)
+
+
+def get_value_index_file(filename, column):
+    # Each indexed column gets its own file beside the CSV file
+    return f'{filename}.{hashlib.sha1(column.encode("utf-8")).hexdigest()[:8]}{VALUE_INDEX_SUFFIX}'
+
+
+#
+# Private helper functions
+#
+
+def _read_column(f, rng, nr_of_columns, column_index, first_index=0):
+    # Parse a single column of the rows in the given range, starting at the current position of the file object.
+    # The values are parsed as float64, since a narrower type inferred from only a few rows may round them.
+    blocks = [columns[0] for columns, _, _ in csv_parsing.iter_column_blocks(f, rng, nr_of_columns, [column_index],
+                                                                             first_index, [X_DTYPE])]
+    return np.concatenate(blocks) if len(blocks) > 0 else np.array([], dtype=np.float64)
+
+
+def _search(column, value, side):
+    # Returns None if the value is behind the last row, since further rows may still be appended to the file.
+    # Only used for the end of ranges, an open end includes all these rows.
+    row = int(np.searchsorted(column, value, side=side))
+    return row if row < len(column) else None
+
+
+def _find_rows_in_column(column, x_range):
+    start = int(np.searchsorted(column, x_range.start, side='left')) if x_range.start is not None else None
+    end = _search(column, x_range.end, 'right') if x_range.end is not None else None
+    return start, end
+
+
+def _find_rows_in_csv_file(config, x_range):
+    # Use the value index of the X column if available, otherwise parse the whole X column
+    file_headers = read_headers(config.input_file)
+    column_index = file_headers.index(config.x_column)
+
+    with decompression.open_binary(config.input_file) as f:
+        index = None
+        if f.seekable():
+            index = get_value_index(config.input_file, len(file_headers), column_index, config.x_column,
+                                    build=config.use_index)
+        if index is None:
+            # Without an index, the X column (and only this column) has to be parsed completely
+            if f.seekable():
+                print('Use --index to locate X values without parsing the whole X column!')
+            f.readline()
+            return _find_rows_in_column(_read_column(f, Range(), len(file_headers), column_index), x_range)
+
+        start = None
+        if x_range.start is not None:
+            start = index.find_row(f, len(file_headers), column_index, x_range.start, 'left')
+            start = start if start is not None else index.rows.rows
+        end = index.find_row(f, len(file_headers), column_index, x_range.end, 'right') \
+            if x_range.end is not None else None
+        return start, end
+
+
+class ValueIndex(object):
+    # Sparse index of a monotonically increasing column, which stores its value at every row of the row index.
+    # Rows are located by a binary search over the indexed values followed by a binary search over the rows of the
+    # single row index stride which contains the wanted value, so only that stride is parsed.
+
+    def __init__(self, rows, values):
+        self.rows = rows
+        self.values = values
+
+    def save(self, filename, column):
+        # Written to a temporary file first like the row index, so an interrupted write never leaves a truncated index
+        index_file = get_value_index_file(filename, column)
+        with open(index_file + '.tmp', 'wb') as f:
+            np.savez(f, values=self.values, meta=np.array([self.rows.size, self.rows.mtime_ns], dtype=np.int64))
+        os.replace(index_file + '.tmp', index_file)
+
+    @classmethod
+    def load(cls, filename, column, rows):
+        # Returns None if no index exists, it is unreadable (e.g. truncated) or does not belong to the given (valid) row
+        # index anymore
+        try:
+            with np.load(get_value_index_file(filename, column)) as index_file:
+                values = index_file['values']
+                size, mtime_ns = (int(v) for v in index_file['meta'])
+        except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+            return None
+        if len(values) != len(rows.offsets) or size != rows.size or mtime_ns != rows.mtime_ns:
+            return None
+        return cls(rows, values)
+
+    @classmethod
+    def build(cls, filename, nr_of_columns, column_index, rows):
+        # Only the single rows at the offsets of the row index are parsed
+        values = np.empty(len(rows.offsets), dtype=np.float64)
+        with open(filename, 'rb') as f:
+            for k, offset in enumerate(rows.offsets):
+                f.seek(offset)
+                line = f.readline().decode('utf-8').rstrip('\r\n')
+                columns, invalid = csv_parsing.parse_lines([line], nr_of_columns, [column_index], [X_DTYPE])
+                values[k] = columns[0][0] if not invalid[0][0] else np.nan
+        return cls(rows, values)
+
+    def find_row(self, f, nr_of_columns, column_index, value, side='left'):
+        # Return the first row whose value is not smaller (side='left') resp. larger (side='right') than the given
+        # one, or None if there is no such row
+        k = int(np.searchsorted(self.values, value, side=side))
+        if k == 0:
+            return 0
+
+        # The row lies in the stride of the last indexed row which precedes the value
+        first_index, offset = self.rows.lookup((k - 1) * self.rows.stride)
+        f.seek(offset)
+        column = _read_column(f, Range(first_index, first_index + self.rows.stride), nr_of_columns, column_index,
+                              first_index)
+        row = _search(column, value, side)
+        if row is not None:
+            return first_index + row
+        # Otherwise the row is the first one of the next stride, if there is such a row
+        return first_index + len(column) if first_index + len(column) < self.rows.rows else None
+
+
+def get_value_index(filename, nr_of_columns, column_index, column, build=False):
+    # Load the value index of the given column. If no valid index exists and build is set, a new one (as well as the
+    # row index it relies on) is created and stored.
+    rows = row_index.get_index(filename, build=build)
+    if rows is None:
+        return None
+
+    index = ValueIndex.load(filename, column, rows)
+    if index is None and build:
+        print(f'Build value index of column "{column}" for file: {filename}')
+        index = ValueIndex.build(filename, nr_of_columns, column_index, rows)
+        try:
+            index.save(filename, column)
+        except OSError as ex:
+            print(f'Failed to store value index: {ex}')
+    return index
+
+
+def find_rows(config, x_values=None):
+    # Translate the range of X values config.x_range into a range of rows by binary searches over the (monotonically
+    # increasing) X column config.x_column. Returns the start and end row, where None represents an open range.
+    # If the values of the X column are already loaded, they are searched instead of the file.
+    x_range = config.x_range
+    if x_range.start is None and x_range.end is None:
+        return None, None
+
+    if config.x_column not in read_headers(config.input_file):
+        raise ValueError(f'X column "{config.x_column}" does not exist in the input file!')
+
+    if x_values is not None:
+        return _find_rows_in_column(x_values, x_range)
+    if columnar_file.is_columnar_file(config.input_file):
+        column, _ = columnar_file.ColumnarFile(config.input_file).load_column(config.x_column)
+        return _find_rows_in_column(column, x_range)
+    if config.use_cache:
+        cache = column_cache.ColumnCache(config.input_file)
+        if cache.has_column(config.x_column):
+            column, _ = cache.load_column(config.x_column)
+            return _find_rows_in_column(column, x_range)
+    return _find_rows_in_csv_file(config, x_range)
+
+
+def select_rows(config, x_values=None):
+    # Return the row range of the config restricted to the rows whose X values lie in config.x_range
+    rng = config.range
+    if rng.is_relative:
+        raise ValueError('A range of X values cannot be combined with a region relative to the end of the file!')
+    start, end = find_rows(config, x_values)
+    if start is not None and (rng.start is None or start > rng.start):
+        rng = Range(start, rng.end, rng.divider)
+    if end is not None and (rng.end is None or end < rng.end):
+        rng = Range(rng.start, end, rng.divider)
+    return rng
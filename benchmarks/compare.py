@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+
+#
+# Compares two benchmark reports and fails if a case got slower than the given tolerance
+#
+
+import argparse
+import json
+import sys
+
+
+def compare(baseline, current, tolerance):
+    baseline_results = {r['name']: r for r in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        base = baseline_results.get(result['name'])
+        if base is None:
+            continue
+        ratio = result['seconds'] / base['seconds']
+        # Peak memory usage is not recorded on all platforms
+        rss_ratio = result['peak_rss_mb'] / base['peak_rss_mb'] \
+            if result['peak_rss_mb'] is not None and base['peak_rss_mb'] is not None else float('nan')
+        marker = ''
+        if ratio > 1 + tolerance:
+            marker = '  <-- REGRESSION'
+            regressions.append(result['name'])
+        print(f'{result["name"]:20}: time x{ratio:5.2f}  peak RSS x{rss_ratio:5.2f}{marker}')
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare two benchmark reports.')
+    parser.add_argument('baseline', help='JSON report of the reference run')
+    parser.add_argument('current', help='JSON report of the run to check')
+    parser.add_argument('-t', '--tolerance', type=float, default=0.1,
+                        help='Allowed relative slowdown before a case counts as regression (Default: 0.1)')
+    args = parser.parse_args()
+
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)
+    with open(args.current, 'r') as f:
+        current = json.load(f)
+
+    if len(compare(baseline, current, args.tolerance)) > 0:
+        sys.exit(1)
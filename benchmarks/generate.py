@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+#
+# Generator for large synthetic CSV files used by the benchmarks
+#
+
+import argparse
+
+import numpy as np
+
+
+NUMBER_FORMATS = {
+    'float': '%.17g',
+    'fixed': '%.3f',
+    'sci': '%.6e',
+    'int': '%d',
+}
+CHUNK_ROWS = 100000
+
+
+def __format_column(values, fmt):
+    if fmt == 'bool':
+        return np.where(values > 0.5, 'true', 'false')
+    if fmt == 'int':
+        values = (values * 1e6).astype(np.int64)
+    return np.char.mod(NUMBER_FORMATS[fmt], values)
+
+
+def generate_csv(filename, rows, columns, formats=('float',), bool_columns=0, ragged=0.0, seed=0):
+    # Write a CSV file with the given number of rows and columns. The number columns cycle through the given formats,
+    # the last bool_columns columns contain boolean values. A fraction of ragged rows lack their last column.
+    rng = np.random.default_rng(seed)
+    column_formats = [formats[c % len(formats)] for c in range(columns - bool_columns)] + ['bool'] * bool_columns
+
+    with open(filename, 'w') as f:
+        f.write(','.join(f'col{c}' for c in range(columns)) + '\n')
+
+        written = 0
+        while written < rows:
+            count = min(CHUNK_ROWS, rows - written)
+            cells = [__format_column(rng.random(count), fmt) for fmt in column_formats]
+            line_arr = cells[0]
+            for col in cells[1:]:
+                line_arr = np.char.add(np.char.add(line_arr, ','), col)
+            lines = line_arr.tolist()
+
+            if ragged > 0:
+                for i in np.flatnonzero(rng.random(count) < ragged):
+                    lines[i] = lines[i].rsplit(',', 1)[0]
+
+            f.write('\n'.join(lines) + '\n')
+            written += count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a synthetic CSV file for benchmarking.')
+    parser.add_argument('output_file', help='CSV file to write')
+    parser.add_argument('-r', '--rows', type=int, default=1000000, help='Number of data rows (Default: 1000000)')
+    parser.add_argument('-c', '--columns', type=int, default=8, help='Number of columns (Default: 8)')
+    parser.add_argument('-f', '--formats', nargs='+', choices=list(NUMBER_FORMATS), default=['float'],
+                        help='Number formats used for the numeric columns (Default: float)')
+    parser.add_argument('-b', '--bool-columns', type=int, default=0, help='Number of boolean columns (Default: 0)')
+    parser.add_argument('--ragged', type=float, default=0.0,
+                        help='Fraction of rows which lack their last column (Default: 0)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random number generator (Default: 0)')
+    args = parser.parse_args()
+
+    generate_csv(args.output_file, args.rows, args.columns, args.formats, args.bool_columns, args.ragged, args.seed)
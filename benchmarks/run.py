@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+
+#
+# Runs the benchmarks on a (generated) CSV file and reports the results as JSON
+#
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, where no memory statistics are recorded
+    resource = None
+
+from .generate import generate_csv
+
+
+#
+# Benchmark cases (each case is executed in a fresh process to measure its peak memory usage)
+#
+
+def __bench_read_headers(filename):
+    from CsvPlotter.internal import csv_handling
+    csv_handling.read_headers(filename)
+    return None
+
+
+def __bench_load(filename, region=None, divider=1, columns=None):
+    from CsvPlotter.internal import configuration as cfg
+    from CsvPlotter.internal import csv_handling
+    config = cfg.PlotConfig.from_obj({'input_file': filename, 'xlim': list(region or []), 'divider': divider})
+    return csv_handling.CsvData.from_file(config, columns).size
+
+
+def __convert_columnar(filename):
+    # Convert the CSV file once, so the columnar cases only measure loading
+    from CsvPlotter.internal import configuration as cfg
+    from CsvPlotter.internal import columnar_file, csv_handling
+    columnar_filename = os.path.join(tempfile.mkdtemp(), 'bench' + columnar_file.FILE_EXTENSION)
+    config = cfg.PlotConfig.from_obj({'input_file': filename})
+    # The progress output must not end up in the JSON report on stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        columnar_file.write(columnar_filename, *csv_handling.CsvData.read_full_columns(config))
+    return columnar_filename
+
+
+def __bench_plot(filename, columns, downsample='none'):
+    import matplotlib
+    matplotlib.use('Agg')
+    from CsvPlotter.internal import configuration as cfg
+    from CsvPlotter.internal import csv_handling, plotting
+
+    output_file = os.path.join(tempfile.mkdtemp(), 'plot.png')
+    config = cfg.PlotConfig.from_obj({
+        'input_file': filename,
+        'output_file': output_file,
+        'downsample': downsample,
+        'plots': [{'columns': [{'name': c} for c in columns]}],
+    })
+    data_obj = csv_handling.CsvData.from_file(config, columns)
+    plotting.plot_csv_data(data_obj, config)
+    os.remove(output_file)
+    return data_obj.size
+
+
+def __bench_startup(filename, command):
+    # Startup cost of a command line invocation, i.e. interpreter start, imports and argument parsing
+    tmp_dir = tempfile.mkdtemp()
+    entrypoint = command[0]
+    subprocess.run([sys.executable, '-c', f'from CsvPlotter.entrypoints import {entrypoint}; {entrypoint}()',
+                    *[arg.format(filename=filename, tmp_dir=tmp_dir) for arg in command[1:]]],
+                   check=True, stdout=subprocess.DEVNULL)
+    shutil.rmtree(tmp_dir)
+    return None
+
+
+def __run_case(conn, func, kwargs):
+    # Silence the progress output of the package
+    sys.stdout = open(os.devnull, 'w')
+    start = time.perf_counter()
+    rows = func(**kwargs)
+    seconds = time.perf_counter() - start
+    # Cases which start subprocesses are reported with the peak memory usage of their largest child
+    peak_rss_kib = None
+    if resource is not None:
+        peak_rss_kib = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                           resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    conn.send((seconds, rows, peak_rss_kib))
+    conn.close()
+
+
+def __measure(name, func, file_size, total_rows, processed_rows, **kwargs):
+    ctx = multiprocessing.get_context('spawn')
+    parent_conn, child_conn = ctx.Pipe()
+    proc = ctx.Process(target=__run_case, args=(child_conn, func, kwargs))
+    proc.start()
+    seconds, rows, peak_rss_kib = parent_conn.recv()
+    proc.join()
+
+    # Throughput is given relative to the rows the case processes (e.g. all rows of a region, including the ones
+    # skipped by a divider) and the corresponding share of the file. Cases without rows report no throughput.
+    processed_mb = file_size / 1024**2 * processed_rows / total_rows if total_rows > 0 else 0
+    return {
+        'name': name,
+        'seconds': seconds,
+        'rows': rows,
+        'rows_per_sec': processed_rows / seconds if processed_rows > 0 else None,
+        'mb_per_sec': processed_mb / seconds if processed_rows > 0 else None,
+        'peak_rss_mb': peak_rss_kib / 1024 if peak_rss_kib is not None else None,
+    }
+
+
+def __format_value(value, fmt, unit):
+    return f'{value:{fmt}} {unit}' if value is not None else f'{"-":>{len(format(0, fmt))}} {unit}'
+
+
+#
+# Public functions
+#
+
+def run_benchmarks(filename, rows, columns):
+    file_size = os.path.getsize(filename)
+    plot_columns = ['col0', 'col1']
+    columnar_filename = __convert_columnar(filename)
+
+    # Each case consists of its name, function, arguments and the number of rows it processes
+    cases = [
+        ('read_headers', __bench_read_headers, {}, 0),
+        ('load_all', __bench_load, {}, rows),
+        ('load_projected', __bench_load, {'columns': plot_columns}, rows),
+        ('load_region_middle', __bench_load, {'region': (rows * 4 // 10, rows * 6 // 10)},
+         rows * 6 // 10 - rows * 4 // 10),
+        ('load_region_end', __bench_load, {'region': (rows * 9 // 10, None)}, rows - rows * 9 // 10),
+        ('load_divider_10', __bench_load, {'divider': 10}, rows),
+        ('load_columnar', __bench_load, {'filename': columnar_filename}, rows),
+        ('load_columnar_div_10', __bench_load, {'filename': columnar_filename, 'divider': 10}, rows),
+        ('plot_agg', __bench_plot, {'columns': plot_columns}, rows),
+        ('plot_agg_minmax', __bench_plot, {'columns': plot_columns, 'downsample': 'minmax'}, rows),
+        ('startup_util_list', __bench_startup, {'command': ['util', '-l', '{filename}']}, 0),
+        ('startup_plot_file', __bench_startup, {'command': ['plot', '-i', '{filename}', '-o',
+                                                            '{tmp_dir}/startup.png', '-r', '0:1000', 'col0']}, 0),
+    ]
+
+    results = []
+    for name, func, kwargs, processed_rows in cases:
+        result = __measure(name, func, file_size, rows, processed_rows, **{'filename': filename, **kwargs})
+        print(f'{name:20}: {result["seconds"]:8.3f} s  {__format_value(result["rows_per_sec"], "12.0f", "rows/s")}  '
+              f'{__format_value(result["mb_per_sec"], "8.1f", "MB/s")}  '
+              f'{__format_value(result["peak_rss_mb"], "8.1f", "MB peak RSS")}', file=sys.stderr)
+        results.append(result)
+    os.remove(columnar_filename)
+    os.rmdir(os.path.dirname(columnar_filename))
+
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'dataset': {
+            'file': os.path.abspath(filename),
+            'size_bytes': file_size,
+            'rows': rows,
+            'columns': columns,
+        },
+        'results': results,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark loading and plotting of CSV files.')
+    parser.add_argument('-i', '--input-file', help='Existing CSV file generated by benchmarks.generate. If omitted, '
+                                                   'a temporary file is generated.')
+    parser.add_argument('-r', '--rows', type=int, default=1000000,
+                        help='Number of rows to generate (Default: 1000000). Ignored for an existing input file.')
+    parser.add_argument('-c', '--columns', type=int, default=8,
+                        help='Number of columns to generate (Default: 8). Ignored for an existing input file.')
+    parser.add_argument('-o', '--output-file', help='Write the results as JSON to this file instead of stdout')
+    args = parser.parse_args()
+
+    if args.input_file is None:
+        tmp_dir = tempfile.mkdtemp()
+        input_file = os.path.join(tmp_dir, 'bench.csv')
+        print(f'Generate {args.rows} rows with {args.columns} columns in {input_file}', file=sys.stderr)
+        generate_csv(input_file, args.rows, args.columns, formats=('float', 'fixed', 'int'), bool_columns=1)
+        rows, columns = args.rows, args.columns
+    else:
+        # The regions and throughputs refer to the actual size of an existing file
+        from CsvPlotter.internal import row_index
+        from CsvPlotter.internal.utils import read_headers
+        input_file = args.input_file
+        rows, columns = row_index.count_rows(input_file), len(read_headers(input_file))
+
+    report = run_benchmarks(input_file, rows, columns)
+
+    if args.output_file is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output_file, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.input_file is None:
+        os.remove(input_file)
+        os.rmdir(tmp_dir)
@@ -12,18 +12,19 @@ setuptools.setup(
     long_description=long_description,
     long_description_content_type='text/markdown',
     url='https://github.com/skaupper/CsvPlotter',
-    packages=setuptools.find_packages(),
+    packages=setuptools.find_packages(exclude=['benchmarks', 'benchmarks.*']),
     classifiers=[
         'Programming Language :: Python :: 3',
         'License :: OSI Approved :: MIT License',
         'Operating System :: OS Independent',
     ],
-    python_requires='>=3.6',
+    python_requires='>=3.8',
 
     entry_points={
         'console_scripts': [
             'csv_plot=CsvPlotter.entrypoints:plot',
-            'csv_util=CsvPlotter.entrypoints:util'
+            'csv_util=CsvPlotter.entrypoints:util',
+            'csv_plot_server=CsvPlotter.entrypoints:server'
         ]
     },
     install_requires=[
@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from CsvPlotter.internal import column_statistics, columnar_file, csv_handling
+from CsvPlotter.internal import configuration as cfg
+from CsvPlotter.internal.utils import Range
+
+
+ROWS = 3000
+PERCENTILES = column_statistics.DEFAULT_PERCENTILES
+
+
+#
+# Private helper functions
+#
+
+def _values():
+    return np.random.default_rng(1).normal(10.0, 3.0, ROWS)
+
+
+def _assert_statistics(stats, values):
+    # Float columns of files may be stored as float32 if its resolution suffices
+    assert stats.count == len(values)
+    assert stats.min == pytest.approx(values.min(), rel=1e-6) and stats.max == pytest.approx(values.max(), rel=1e-6)
+    assert stats.mean == pytest.approx(values.mean(), rel=1e-6)
+    assert stats.std == pytest.approx(values.std(), rel=1e-6)
+
+
+#
+# Fixtures
+#
+
+@pytest.fixture(scope='module')
+def csv_file(tmp_path_factory):
+    filename = str(tmp_path_factory.mktemp('data') / 'data.csv')
+    with open(filename, 'w') as f:
+        f.write('i,v\n')
+        f.write(''.join(f'{i},{v!r}\n' for i, v in enumerate(_values().tolist())))
+    return filename
+
+
+#
+# Tests
+#
+
+def test_small_columns_have_exact_percentiles():
+    # The sample contains all values as long as they fit into it
+    values = _values()
+    stats = column_statistics.ColumnStatistics('v')
+    for block in np.array_split(values, 7):
+        stats.add(block, np.zeros(len(block), dtype=bool))
+    _assert_statistics(stats, values)
+    np.testing.assert_allclose(stats.get_percentiles(PERCENTILES), np.percentile(values, PERCENTILES))
+
+
+def test_large_columns_have_estimated_percentiles():
+    # Percentiles of the uniformly sampled values deviate little from the ones of all values, also if the blocks
+    # are sorted
+    values = np.arange(200000, dtype=np.float64)
+    stats = column_statistics.ColumnStatistics('v')
+    for block in np.array_split(values, 13):
+        stats.add(block, np.zeros(len(block), dtype=bool))
+    assert len(stats.sample) == stats.SAMPLE_SIZE
+    _assert_statistics(stats, values)
+    np.testing.assert_allclose(stats.get_percentiles(PERCENTILES), np.percentile(values, PERCENTILES),
+                               atol=0.01 * len(values))
+
+
+def test_nan_and_invalid_values_are_counted():
+    stats = column_statistics.ColumnStatistics('v')
+    stats.add(np.array([1.0, np.nan, 3.0, 100.0]), np.array([False, False, False, True]))
+    assert (stats.count, stats.nan_count, stats.invalid_count) == (2, 1, 1)
+    assert stats.get_percentiles([0, 50, 100]) == [1.0, 2.0, 3.0]
+    assert column_statistics.ColumnStatistics('empty').get_percentiles([50]) == [None]
+
+
+@pytest.mark.parametrize('rng', [Range(), Range(100, 2000, 3), Range(-500, None, 2)], ids=repr)
+def test_file_region(csv_file, rng):
+    selected = _values()[rng.to_slice(ROWS)]
+    stats = column_statistics.compute_statistics(csv_file, rng, ['v'])
+    _assert_statistics(stats[0], selected)
+    np.testing.assert_allclose(stats[0].get_percentiles(PERCENTILES), np.percentile(selected, PERCENTILES),
+                               rtol=1e-6)
+
+    # Columnar files are processed from memory maps instead
+    columnar = csv_file + 'c'
+    columnar_file.write(columnar, *csv_handling.CsvData.read_full_columns(cfg.PlotConfig.from_obj(
+        {'input_file': csv_file})))
+    stats = column_statistics.compute_statistics(columnar, rng, ['v'])
+    _assert_statistics(stats[0], selected)
+
+    report = column_statistics.format_report(rng, stats)
+    assert ' p50 ' in report.splitlines()[1] and report.splitlines()[2].split()[0] == 'v'
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from CsvPlotter.internal import csv_handling, data_types, row_index
+from CsvPlotter.internal import configuration as cfg
+from CsvPlotter.internal.utils import Range
+
+
+# Columns get the narrowest type representing their values exactly. Counters must stay exact even if a later block
+# turns a narrow integer column into a float column (e.g. because of a missing value).
+COUNTERS = [2**30 + i for i in range(5)]
+
+
+#
+# Private helper functions
+#
+
+def _load(filename, rng=Range(), **options):
+    config = cfg.PlotConfig.from_obj(dict(input_file=filename, **options))
+    config.range = row_index.resolve_range(filename, rng)
+    data_obj = csv_handling.CsvData.from_file(config, ['a'])
+    return data_obj.data['a'][:data_obj.size]
+
+
+#
+# Fixtures
+#
+
+@pytest.fixture(scope='module')
+def counter_file(tmp_path_factory):
+    # The sample the types are inferred from only contains small integers
+    filename = str(tmp_path_factory.mktemp('data') / 'counters.csv')
+    with open(filename, 'w') as f:
+        f.write('a\n')
+        f.write(''.join(f'{i % 100}\n' for i in range(400000)))
+        f.write('nan\n')
+        f.write(''.join(f'{value}\n' for value in COUNTERS))
+    return filename
+
+
+#
+# Tests
+#
+
+@pytest.mark.parametrize('hint', [None, np.dtype(np.int8), np.dtype(np.int16), np.dtype(np.float32)], ids=str)
+def test_fit_floats_keeps_large_integers_exact(hint):
+    for values in ([np.nan] + COUNTERS, [1000, 2.5, 2**40 + 1]):
+        values = np.array(values, dtype=np.float64)
+        fitted = data_types.fit_floats(values, hint)
+        assert fitted.dtype == np.float64
+        np.testing.assert_array_equal(fitted, values)
+
+
+def test_fit_floats_narrows_small_values():
+    assert data_types.fit_floats(np.array([np.nan, 1.0, 2**24]), np.dtype(np.int8)).dtype == np.float32
+    assert data_types.fit_floats(np.array([0.5, 1.25, -3.0]), None).dtype == np.float32
+
+
+@pytest.mark.parametrize('options, rng', [
+    ({}, Range()),
+    ({'cache': True}, Range()),
+    ({'jobs': 3}, Range()),
+    ({}, Range(-10, None)),
+], ids=['serial', 'cache', 'parallel', 'tail'])
+def test_counters_stay_exact(counter_file, options, rng):
+    loaded = _load(counter_file, rng, **options)
+    assert loaded.dtype == np.float64
+    np.testing.assert_array_equal(loaded[-len(COUNTERS):], COUNTERS)
+    assert np.isnan(loaded[-len(COUNTERS) - 1])
@@ -0,0 +1,35 @@
+import sys
+
+import numpy as np
+import pytest
+
+from CsvPlotter.internal import instrumentation
+
+
+#
+# Tests
+#
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='the current RSS is only available on Linux')
+def test_stage_records_its_own_growth():
+    stats = instrumentation.Instrumentation()
+    with stats.stage('allocate'):
+        data = np.ones(64 * 1024**2 // 8)
+    with stats.stage('idle'):
+        pass
+    allocate, idle = stats.stages
+    assert allocate['rss_growth_mb'] > 32
+    assert abs(idle['rss_growth_mb']) < 16
+    # The process-wide high-water mark is repeated by the later stage
+    assert idle['process_peak_rss_mb'] >= allocate['process_peak_rss_mb'] > 64
+    assert 'RSS growth' in stats.summary()
+    del data
+
+
+def test_throughput():
+    stats = instrumentation.Instrumentation()
+    with stats.stage('load') as record:
+        record['rows'] = 10
+        record['bytes'] = 100
+    assert stats.stages[0]['rows_per_sec'] > 0
+    assert 'rows/s' in stats.summary()
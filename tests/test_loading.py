@@ -0,0 +1,156 @@
+import csv
+import math
+import os
+import random
+
+import numpy as np
+import pytest
+
+from CsvPlotter.internal import columnar_file, csv_handling, row_index
+from CsvPlotter.internal import configuration as cfg
+from CsvPlotter.internal.utils import Range
+
+
+# Each way of loading a file (block parsing, parallel parsing, row index, column cache and columnar files) has to
+# select exactly the same samples as a straightforward reference loader built on the csv module.
+HEADERS = ['a', 'b', 'c']
+ROWS = 3000
+
+RANGES = [
+    Range(),
+    Range(100, 900),
+    Range(5, 2000, 7),
+    Range(2990, None, 2),
+    Range(-300, None),
+    Range(-250, -10, 3),
+    Range(-5000, None, 4),
+    Range(5000, 6000),
+]
+
+
+#
+# Private helper functions
+#
+
+def _write_file(filename):
+    # Integers, floats and booleans mixed with blank lines, missing cells and invalid values
+    rnd = random.Random(42)
+    with open(filename, 'w') as f:
+        f.write(', '.join(HEADERS) + '\n')
+        for i in range(ROWS):
+            if i % 251 == 7:
+                f.write('\n')
+            elif i % 173 == 3:
+                f.write(f'{i}\n')
+            elif i % 97 == 5:
+                f.write(f'{i},x,true\n')
+            elif i % 331 == 11:
+                f.write(f'{i},1.0,false,1\n')
+            else:
+                f.write(f'{i}, {rnd.uniform(-1e3, 1e3)!r},{rnd.choice(["true", "false", "1", "0"])}\n')
+
+
+def _parse_reference_value(val_str):
+    val_str = val_str.strip().lower()
+    if val_str in ('true', 't', '1', 'y', 'yes'):
+        return 1.0
+    if val_str in ('false', 'f', '0', 'n', 'no'):
+        return 0.0
+    return float(val_str)
+
+
+def _load_reference(filename, rng):
+    # Rows with more fields than headers or with invalid values are dropped, missing cells are NaN
+    with open(filename, 'r', newline='') as f:
+        rows = list(csv.reader(f))[1:]
+
+    columns = {h: [] for h in HEADERS}
+    for i, row in enumerate(rows):
+        data_index = i - len(rows) if rng.is_relative else i
+        if data_index not in rng or len(row) > len(HEADERS):
+            continue
+        try:
+            values = [_parse_reference_value(val) for val in row] + [math.nan] * (len(HEADERS) - len(row))
+        except ValueError:
+            continue
+        for h, val in zip(HEADERS, values):
+            columns[h].append(val)
+    return {h: np.array(values, dtype=np.float64) for h, values in columns.items()}
+
+
+def _load(filename, rng, columns=HEADERS, **options):
+    config = cfg.PlotConfig.from_obj(dict(input_file=filename, **options))
+    config.range = row_index.resolve_range(filename, rng)
+    data_obj = csv_handling.CsvData.from_file(config, columns)
+    return {h: data_obj.data[h][:data_obj.size].astype(np.float64) for h in data_obj.headers}
+
+
+def _assert_same(loaded, expected):
+    # Float columns may be stored as float32 if its resolution suffices
+    assert list(loaded) == HEADERS
+    for h in HEADERS:
+        np.testing.assert_allclose(loaded[h], expected[h], rtol=1e-6, err_msg=f'column {h}')
+
+
+#
+# Fixtures
+#
+
+@pytest.fixture(scope='module')
+def csv_file(tmp_path_factory):
+    filename = str(tmp_path_factory.mktemp('data') / 'data.csv')
+    _write_file(filename)
+    return filename
+
+
+@pytest.fixture(scope='module')
+def columnar(csv_file):
+    filename = csv_file + 'c'
+    config = cfg.PlotConfig.from_obj({'input_file': csv_file})
+    columnar_file.write(filename, *csv_handling.CsvData.read_full_columns(config))
+    return filename
+
+
+#
+# Tests
+#
+
+@pytest.mark.parametrize('rng', RANGES, ids=repr)
+def test_block_parsing(csv_file, rng):
+    _assert_same(_load(csv_file, rng), _load_reference(csv_file, rng))
+
+
+@pytest.mark.parametrize('rng', RANGES, ids=repr)
+def test_parallel_parsing(csv_file, rng):
+    _assert_same(_load(csv_file, rng, jobs=3), _load_reference(csv_file, rng))
+
+
+@pytest.mark.parametrize('rng', RANGES, ids=repr)
+def test_row_index(csv_file, rng):
+    # A small stride makes the index point into the middle of the file
+    row_index.RowIndex.build(csv_file, stride=97).save(csv_file)
+    try:
+        _assert_same(_load(csv_file, rng, index=True), _load_reference(csv_file, rng))
+    finally:
+        os.remove(row_index.get_index_file(csv_file))
+
+
+@pytest.mark.parametrize('rng', RANGES, ids=repr)
+def test_column_cache(csv_file, rng):
+    # The first load fills the cache (unless another test did already), the second one is served from it
+    expected = _load_reference(csv_file, rng)
+    _assert_same(_load(csv_file, rng, cache=True), expected)
+    _assert_same(_load(csv_file, rng, cache=True), expected)
+
+
+@pytest.mark.parametrize('rng', RANGES, ids=repr)
+def test_columnar_file(columnar, csv_file, rng):
+    _assert_same(_load(columnar, rng), _load_reference(csv_file, rng))
+
+
+def test_blank_lines_are_missing_values(tmp_path):
+    filename = str(tmp_path / 'blank.csv')
+    with open(filename, 'w') as f:
+        f.write('a\n1\n\n3\n')
+    loaded = _load(filename, Range(), ['a'])
+    np.testing.assert_array_equal(loaded['a'], [1.0, math.nan, 3.0])
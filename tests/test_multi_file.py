@@ -0,0 +1,96 @@
+import gzip
+
+import numpy as np
+import pytest
+
+from CsvPlotter.internal import columnar_file, csv_handling, multi_file
+from CsvPlotter.internal import configuration as cfg
+from CsvPlotter.internal.utils import Range
+
+
+# Concatenated files have to select the same rows as slicing the rows of all files joined in memory, also for ranges
+# spanning several files or lying within a single one
+FILE_ROWS = [400, 250, 600]
+
+RANGES = [
+    Range(),
+    Range(100, 300),
+    Range(350, 700, 3),
+    Range(420, 600),
+    Range(640, None, 5),
+    Range(-700, None),
+    Range(-900, -100, 4),
+    Range(-50, None),
+    Range(5000, None),
+]
+
+
+#
+# Private helper functions
+#
+
+def _values():
+    return np.arange(sum(FILE_ROWS)) * 3 % 1000
+
+
+def _load(files, rng, **options):
+    config = cfg.PlotConfig.from_obj(dict(input_file=files[0], **options))
+    config.range = rng
+    data_obj, resolved = multi_file.load_concatenated(config, files, ['a', 'b'])
+    return {h: data_obj.data[h][:data_obj.size] for h in data_obj.headers}, resolved
+
+
+#
+# Fixtures
+#
+
+@pytest.fixture(scope='module', params=['csv', 'mixed'])
+def files(request, tmp_path_factory):
+    # The mixed files consist of a gzip compressed, a columnar and a plain file
+    directory = tmp_path_factory.mktemp('data')
+    values = _values()
+    files = []
+    start = 0
+    for k, rows in enumerate(FILE_ROWS):
+        filename = str(directory / f'part{k}.csv')
+        opener = gzip.open if request.param == 'mixed' and k == 0 else open
+        with opener(filename, 'wt') as f:
+            f.write('i,a,b\n')
+            f.write(''.join(f'{i},{values[i]},{values[i] * 0.5}\n' for i in range(start, start + rows)))
+        if request.param == 'mixed' and k == 1:
+            config = cfg.PlotConfig.from_obj({'input_file': filename})
+            columnar_file.write(filename + 'c', *csv_handling.CsvData.read_full_columns(config))
+            filename += 'c'
+        files.append(filename)
+        start += rows
+    return files
+
+
+#
+# Tests
+#
+
+@pytest.mark.parametrize('jobs', [1, 2])
+@pytest.mark.parametrize('rng', RANGES, ids=repr)
+def test_concatenated_range(files, rng, jobs):
+    values = _values()
+    selected = rng.to_slice(len(values))
+    loaded, resolved = _load(files, rng, jobs=jobs)
+    np.testing.assert_array_equal(loaded['a'], values[selected])
+    np.testing.assert_array_equal(loaded['b'], values[selected] * 0.5)
+
+    # The data indices of the resolved range address the selected rows
+    if len(loaded['a']) > 0:
+        start = resolved.start if resolved.start is not None else 0
+        start += -start % resolved.divider
+        assert start + (len(values) if rng.is_relative else 0) == selected.start
+
+
+def test_different_headers(files, tmp_path):
+    other = str(tmp_path / 'other.csv')
+    with open(other, 'w') as f:
+        f.write('i,b,a\n0,1,2\n')
+    multi_file.check_headers(files, ['a', 'b'], 'concat')
+    multi_file.check_headers(files + [other], ['a', 'b'], 'overlay')
+    with pytest.raises(ValueError):
+        multi_file.check_headers(files + [other], ['a', 'b'], 'concat')
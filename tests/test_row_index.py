@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+from CsvPlotter.internal import row_index
+
+
+ROWS = 1000
+
+
+#
+# Fixtures
+#
+
+@pytest.fixture
+def csv_file(tmp_path):
+    filename = str(tmp_path / 'data.csv')
+    with open(filename, 'w') as f:
+        f.write('a,b\n')
+        f.write(''.join(f'{i},{i * 2}\n' for i in range(ROWS)))
+    return filename
+
+
+#
+# Tests
+#
+
+def test_lookup_points_to_row_start(csv_file):
+    index = row_index.RowIndex.build(csv_file, stride=97)
+    assert index.rows == ROWS
+    with open(csv_file, 'rb') as f:
+        for row in (0, 96, 97, 500, ROWS - 1):
+            first_index, offset = index.lookup(row)
+            assert first_index <= row < first_index + 97
+            f.seek(offset)
+            assert f.readline() == f'{first_index},{first_index * 2}\n'.encode()
+
+
+def test_save_replaces_index(csv_file):
+    row_index.RowIndex.build(csv_file, stride=97).save(csv_file)
+    assert not os.path.exists(row_index.get_index_file(csv_file) + '.tmp')
+    loaded = row_index.RowIndex.load(csv_file)
+    assert loaded is not None and loaded.rows == ROWS and loaded.stride == 97
+
+
+@pytest.mark.parametrize('content', [b'', b'PK\x03\x04truncated'], ids=['empty', 'truncated'])
+def test_unreadable_index_is_missing(csv_file, content):
+    with open(row_index.get_index_file(csv_file), 'wb') as f:
+        f.write(content)
+    assert row_index.RowIndex.load(csv_file) is None
+    assert row_index.count_rows(csv_file) == ROWS
+
+    # Building the index replaces the unreadable one
+    with open(csv_file, 'rb') as f:
+        f.readline()
+        assert row_index.seek_to_row(f, csv_file, 500, build=True) <= 500
+    assert row_index.RowIndex.load(csv_file) is not None
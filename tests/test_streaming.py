@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from CsvPlotter.internal import row_index, streaming
+from CsvPlotter.internal import configuration as cfg
+from CsvPlotter.internal.utils import Range
+
+
+ROWS = 10000
+
+
+#
+# Fixtures
+#
+
+@pytest.fixture
+def csv_file(tmp_path):
+    filename = str(tmp_path / 'data.csv')
+    with open(filename, 'w') as f:
+        f.write('a\n')
+        f.write(''.join(f'{(i * 7919) % 1000}\n' for i in range(ROWS)))
+    return filename
+
+
+#
+# Tests
+#
+
+def test_count_rows_stops_at_limit(csv_file, monkeypatch):
+    # Small blocks make the scan stop long before the end of the file
+    monkeypatch.setattr(row_index, 'BLOCK_SIZE', 64)
+    reads = []
+    original = row_index.decompression.open_binary
+
+    def open_binary(filename):
+        f = original(filename)
+        read = f.read
+        f.read = lambda size=-1: reads.append(size) or read(size)
+        return f
+
+    monkeypatch.setattr(row_index.decompression, 'open_binary', open_binary)
+    assert row_index.count_rows(csv_file, 100) == 100
+    assert len(reads) < 20
+    assert row_index.count_rows(csv_file, 10 * ROWS) == ROWS
+    assert row_index.count_rows(csv_file) == ROWS
+
+
+@pytest.mark.parametrize('rng', [Range(), Range(100, 1000), Range(50, 5000, 3), Range(9000, 20000)], ids=repr)
+def test_binned_region(csv_file, rng):
+    values = np.array([(i * 7919) % 1000 for i in range(ROWS)], dtype=np.float64)
+    selected = values[rng.to_slice(ROWS)]
+
+    config = cfg.PlotConfig.from_obj({'input_file': csv_file, 'streaming': True})
+    config.range = rng
+    binned = streaming.BinnedData.from_file(config, ['a'], 50)
+    assert binned.samples_seen == len(selected)
+    assert binned.data['a'].min() == selected.min()
+    assert binned.data['a'].max() == selected.max()
+    assert binned.x[0] == rng.to_slice(ROWS).start
+    assert binned.x[-1] == rng.to_slice(ROWS).start + (len(selected) - 1) * rng.divider
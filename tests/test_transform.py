@@ -0,0 +1,117 @@
+import csv
+import functools
+
+import numpy as np
+import pytest
+
+from CsvPlotter.internal import columnar_file, csv_parsing, transform
+from CsvPlotter.internal.utils import Range
+
+
+# A transformation has to write the same rows as slicing the data lines of the file in memory, also if the region,
+# the skipped leading and the dropped trailing lines span several blocks
+ROWS = 500
+SKIP_LINES = 3
+DROP_LINES = 4
+
+RANGES = [
+    Range(),
+    Range(10, 100),
+    Range(5, 400, 7),
+    Range(490, None),
+    Range(-50, None),
+    Range(-200, -20, 3),
+    Range(1000, 2000),
+]
+
+
+#
+# Private helper functions
+#
+
+def _write_file(filename, delimiter=','):
+    # Some rows contain quoted fields with delimiters or have missing fields
+    with open(filename, 'w', newline='') as f:
+        f.write(''.join(f'# comment {i}\n' for i in range(SKIP_LINES)))
+        writer = csv.writer(f, delimiter=delimiter, lineterminator='\n')
+        writer.writerow(['a', 'b', 'c'])
+        for i in range(ROWS):
+            if i % 61 == 2:
+                writer.writerow([i, f'x{delimiter}y', i * 3])
+            elif i % 89 == 5:
+                writer.writerow([i])
+            else:
+                writer.writerow([i, i * 2, i * 3])
+        f.write(''.join(f'# trailer {i}\n' for i in range(DROP_LINES)))
+
+
+def _expected_rows(filename, rng, column_indices, delimiter=','):
+    with open(filename, 'r', newline='') as f:
+        rows = list(csv.reader(f, delimiter=delimiter))[SKIP_LINES + 1:-DROP_LINES]
+    return [[row[c] if c < len(row) else '' for c in column_indices] for row in rows[rng.to_slice(len(rows))]]
+
+
+def _read_output(filename, delimiter=','):
+    with open(filename, 'r', newline='') as f:
+        rows = list(csv.reader(f, delimiter=delimiter))
+    return rows[0], rows[1:]
+
+
+#
+# Fixtures
+#
+
+@pytest.fixture(autouse=True)
+def small_blocks(monkeypatch):
+    monkeypatch.setattr(transform.csv_parsing, 'iter_line_blocks',
+                        functools.partial(csv_parsing.iter_line_blocks, block_size=256))
+
+
+@pytest.fixture(scope='module')
+def csv_file(tmp_path_factory):
+    filename = str(tmp_path_factory.mktemp('data') / 'data.csv')
+    _write_file(filename)
+    return filename
+
+
+#
+# Tests
+#
+
+@pytest.mark.parametrize('rng', RANGES, ids=repr)
+@pytest.mark.parametrize('column_indices', [None, [2, 0]], ids=['all', 'selected'])
+def test_region(csv_file, tmp_path, rng, column_indices):
+    output_file = str(tmp_path / 'out.csv')
+    headers, rows = transform.transform(csv_file, output_file, column_indices, rng, SKIP_LINES, DROP_LINES)
+    column_indices = column_indices if column_indices is not None else [0, 1, 2]
+    expected = _expected_rows(csv_file, rng, column_indices)
+    assert headers == [['a', 'b', 'c'][c] for c in column_indices]
+    assert rows == len(expected)
+    assert _read_output(output_file) == (headers, expected)
+
+
+def test_delimiters(tmp_path):
+    input_file = str(tmp_path / 'data.csv')
+    output_file = str(tmp_path / 'out.csv')
+    _write_file(input_file, ';')
+    rng = Range(0, 200, 2)
+    assert transform.read_headers(input_file, SKIP_LINES, ';') == ['a', 'b', 'c']
+    transform.transform(input_file, output_file, [1, 2], rng, SKIP_LINES, DROP_LINES, ';', '\t')
+    assert _read_output(output_file, '\t') == (['b', 'c'], _expected_rows(input_file, rng, [1, 2], ';'))
+
+
+@pytest.mark.parametrize('rng', [Range(), Range(3, 300, 4), Range(-120, None)], ids=repr)
+def test_columnar_output(csv_file, tmp_path, rng):
+    # Rows with quoted fields have too many fields for parsing and are stored as invalid, missing fields as NaN
+    output_file = str(tmp_path / ('out' + columnar_file.FILE_EXTENSION))
+    headers, rows = transform.transform(csv_file, output_file, [0, 2, 1], rng, SKIP_LINES, DROP_LINES)
+    expected = _expected_rows(csv_file, rng, [0, 2, 1])
+    stored = columnar_file.ColumnarFile(output_file)
+    assert stored.headers == headers == ['a', 'c', 'b'] and stored.rows == rows == len(expected)
+    invalid_rows = [i for i, row in enumerate(expected) if ',' in row[2]]
+    valid_rows = [i for i in range(len(expected)) if i not in invalid_rows]
+    for j, name in enumerate(headers):
+        column, invalid = stored.load_column(name)
+        assert list(invalid) == invalid_rows
+        np.testing.assert_array_equal(column[valid_rows],
+                                      [float(expected[i][j]) if expected[i][j] else np.nan for i in valid_rows])
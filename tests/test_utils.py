@@ -0,0 +1,36 @@
+import bz2
+import gzip
+import subprocess
+import sys
+
+import pytest
+
+from CsvPlotter.internal import utils
+
+
+CONTENT = 'a, b,c\n1,2,3\n'
+
+
+#
+# Tests
+#
+
+@pytest.mark.parametrize('opener', [open, gzip.open, bz2.open], ids=['plain', 'gzip', 'bz2'])
+def test_read_headers(tmp_path, opener):
+    # Compressed files are recognized by their magic bytes, not by their extension
+    filename = str(tmp_path / 'data.csv')
+    with opener(filename, 'wt') as f:
+        f.write(CONTENT)
+    assert utils.read_headers(filename) == ['a', 'b', 'c']
+
+
+def test_plain_headers_skip_decompression(tmp_path):
+    filename = str(tmp_path / 'data.csv')
+    with open(filename, 'w') as f:
+        f.write(CONTENT)
+    code = ('import sys\n'
+            'from CsvPlotter.internal import utils\n'
+            f'utils.read_headers({filename!r})\n'
+            'print(sorted(m for m in ("CsvPlotter.internal.decompression", "numpy", "gzip") if m in sys.modules))\n')
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == '[]'
@@ -0,0 +1,70 @@
+import os
+
+import numpy as np
+import pytest
+
+from CsvPlotter.internal import row_index, value_index
+from CsvPlotter.internal import configuration as cfg
+
+
+# Rows located by the value index have to be the same as the ones found by searching the whole X column
+ROWS = 5000
+X_RANGES = [(None, 10.0), (0.0, None), (12.25, 700.5), (1000.0, 1200.0), (2499.5, 9999.0), (-5.0, -1.0)]
+
+
+#
+# Private helper functions
+#
+
+def _x_values():
+    # Monotonically increasing with repeated values
+    return np.arange(ROWS) // 2 * 1.0
+
+
+def _config(filename, x_range, use_index):
+    return cfg.PlotConfig.from_obj({'input_file': filename, 'x_column': 't', 'x_range': list(x_range),
+                                    'index': use_index})
+
+
+#
+# Fixtures
+#
+
+@pytest.fixture
+def csv_file(tmp_path):
+    filename = str(tmp_path / 'data.csv')
+    with open(filename, 'w') as f:
+        f.write('v,t\n')
+        f.write(''.join(f'{i},{float(t)!r}\n' for i, t in enumerate(_x_values())))
+    return filename
+
+
+#
+# Tests
+#
+
+@pytest.mark.parametrize('x_range', X_RANGES, ids=str)
+def test_index_finds_same_rows(csv_file, x_range):
+    # An end behind the last value stays open, since further rows may still be appended
+    x = _x_values()
+    start = int(np.searchsorted(x, x_range[0], 'left')) if x_range[0] is not None else None
+    end = int(np.searchsorted(x, x_range[1], 'right')) if x_range[1] is not None else None
+    expected = (start, end if end != ROWS else None)
+    assert value_index.find_rows(_config(csv_file, x_range, False)) == expected
+    # The first search builds the indices, the second one uses them
+    assert value_index.find_rows(_config(csv_file, x_range, True)) == expected
+    assert value_index.find_rows(_config(csv_file, x_range, True)) == expected
+
+
+@pytest.mark.parametrize('content', [b'', b'PK\x03\x04truncated'], ids=['empty', 'truncated'])
+def test_unreadable_index_is_missing(csv_file, content):
+    rows = row_index.get_index(csv_file, build=True)
+    index_file = value_index.get_value_index_file(csv_file, 't')
+    with open(index_file, 'wb') as f:
+        f.write(content)
+    assert value_index.ValueIndex.load(csv_file, 't', rows) is None
+
+    # Building the index replaces the unreadable one
+    assert value_index.get_value_index(csv_file, 2, 1, 't', build=True) is not None
+    assert value_index.ValueIndex.load(csv_file, 't', rows) is not None
+    assert not os.path.exists(index_file + '.tmp')